@@ -1,13 +1,18 @@
 import streamlit as st
-from datetime import datetime, timedelta
-from PIL import Image
+from datetime import datetime
 import locale
-from math import ceil, floor
-from io import BytesIO
+from urllib.parse import urlencode
 import os
 import subprocess
 import sys
 import re
+import json
+import time
+import hashlib
+import base64
+import threading
+import zlib
+import tempfile
 
 # --- Configuração de Locale ---
 def configure_locale():
@@ -49,464 +54,375 @@ def install_and_import(package, import_name=None):
 # Importa as bibliotecas necessárias
 pd = install_and_import('pandas')
 np = install_and_import('numpy')
-FPDF = install_and_import('fpdf2', 'fpdf').FPDF
 
-# --- Carregamento da Logo (Cacheado) ---
-@st.cache_data(ttl=86400)
-def load_logo():
-    """
-    Carrega e redimensiona a imagem da logo.
-    """
-    try:
-        # Tente carregar a imagem. Se você estiver executando localmente,
-        # certifique-se de que o arquivo 'JMD HAMOA HORIZONTAL - BRANCO.png' está na mesma pasta.
-        logo = Image.open("JMD HAMOA HORIZONTAL - BRANCO.png")
-        logo.thumbnail((300, 300))
-        return logo
-    except Exception as e:
-        st.warning(f"Não foi possível carregar a logo: {str(e)}.")
-        return None
+# Motor de cálculo (motor.py) e tema (tema.py) compartilhados com app2.py; arquivos exportados em exportacao.py
+from motor import (
+    AJUSTES_DIAS_UTEIS, CAMINHO_INDICES, DIRETORIO_APP, DIRETORIO_CRONOGRAMAS, JUROS_MORA_MENSAL, MODALIDADES, MULTA_ATRASO, NOMES_MESES,
+    SISTEMAS_AMORTIZACAO, abrir_cronogramas, aquecer_caches, atualizar_baloes, calcular_entrada_necessaria, canonicalizar_plano, carteira_binaria,
+    conciliar_pagamentos, corrigir_cronograma, cotar_quitacao, formatar_moeda, formatar_moedas, gerar_tabela_precos, gravar_cronogramas_catalogo,
+    importar_catalogo, ler_retorno_bancario, listar_conjuntos_cronogramas, obter_catalogo, obter_feriados, obter_indices, obter_politica_taxas,
+    otimizar_baloes, parse_currency, parse_percentage, renegociar_saldo, resumir_conciliacao, simular_planos, tabela_comparativa, versao_feriados,
+    versao_politica_taxas
+)
+from tema import LARGURA_LOGO, load_logo, set_theme
+from exportacao import COLUNAS_CRONOGRAMA, colunas_cronograma_formatadas, enviar_exportacao, ler_exportacao, status_exportacao
 
 # --- Configuração da Página Streamlit e Tema ---
 st.set_page_config(layout="wide")
 
-def set_theme():
+def preencher_lote_do_catalogo():
     """
-    Aplica estilos CSS personalizados para um tema escuro
-    e aprimora a aparência dos componentes do Streamlit.
-    Inclui estilos para botões com efeitos de hover e clique.
+    Callback do seletor de lotes: preenche quadra, lote, metragem e valor total do formulário.
     """
-    st.markdown("""
-    <style>
-        /* Fundo principal */
-        .stApp {
-            background-color: #1E1E1E;
-        }
-        
-        /* Sidebar */
-        [data-testid="stSidebar"] {
-            background-color: #252526;
-        }
-        
-        /* Títulos */
-        h1, h2, h3, h4, h5, h6, .stMarkdown h1, .stMarkdown h2, .stMarkdown h3 {
-            color: #FFFFFF;
-        }
-        
-        /* Texto geral */
-        .stMarkdown p, .stMarkdown li, .stText, .stNumberInput label, .stSelectbox label {
-            color: #E0E0E0;
-        }
-        
-        /* Inputs */
-        .stTextInput input, .stNumberInput input, .stSelectbox select {
-            background-color: #333333;
-            color: #FFFFFF;
-            border-color: #555555;
-        }
-        
-        /* Botões padrão (não os customizados abaixo) */
-        .stButton button {
-            background-color: #0056b3;
-            color: white;
-            border: none;
-            border-radius: 4px;
-        }
-        
-        .stButton button:hover {
-            background-color: #003d82;
-        }
-        
-        /* Cards/metricas */
-        .stMetric {
-            background-color: #252526;
-            border-radius: 8px;
-            padding: 15px;
-            border-left: 4px solid #4D6BFE; /* Cor da borda alterada para combinar com os botões */
-        }
-        
-        .stMetric label {
-            color: #A0A0A0 !important;
-        }
-        
-        .stMetric div {
-            color: #FFFFFF !important;
-            font-size: 24px !important;
-        }
-        
-        /* Dataframe */
-        .dataframe {
-            background-color: #252526 !important;
-            color: #E0E0E0 !important;
-        }
-        
-        .dataframe th {
-            background-color: #4D6BFE !important; /* Cor da borda alterada */
-            color: white !important;
-        }
-        
-        .dataframe tr:nth-child(even) {
-            background-color: #333333 !important;
-        }
-        
-        .dataframe tr:hover {
-            background-color: #444444 !important;
-        }
-
-        /* ===== LAYOUT ===== */
-        /* Container principal */
-        .main .block-container {
-            padding: 2rem 1rem !important;
-        }
-
-        /* Colunas e alinhamento */
-        [data-testid="column"] {
-            display: flex !important;
-            align-items: center !important;
-            justify-content: flex-start !important;
-            padding: 0 !important;
-        }
-
-        /* Espaçamento entre botões */
-        .stButton:first-of-type {
-            margin-right: 8px !important;
-        }
-
-        /* ===== FLICKERING FIX ===== */
-        [data-testid="stDataFrame-container"] {
-            will-change: transform !important;
-            contain: strict !important;
-            min-height: 400px !important;
-            transform: translate3d(0, 0, 0) !important;
-            backface-visibility: hidden !important;
-            perspective: 1000px !important;
-        }
-
-        .stDataFrame-fullscreen {
-            position: fixed !important;
-            top: 0 !important;
-            left: 0 !important;
-            right: 0 !important;
-            bottom: 0 !important;
-            z-index: 9999 !important;
-            background-color: #0E1117 !important;
-            padding: 2rem !important;
-            overflow: auto !important;
-        }
-
-        /* Títulos específicos para cor branca */
-        h1, h2, h3, h4, h5, h6, 
-        .stMarkdown h1, .stMarkdown h2, .stMarkdown h3,
-        /* Textos de input/labels */
-        .stTextInput label, .stNumberInput label, 
-        .stSelectbox label, .stDateInput label,
-        /* Subtítulos das seções */
-        .stSubheader,
-        /* Botões de exportação (labels) */
-        .stDownloadButton label {
-            color: #FFFFFF !important;
-        }
-        
-        /* Labels específicos que não são capturados pelas regras acima */
-        div[data-testid="stForm"] label,
-        div[data-testid="stVerticalBlock"] > div > div > div > div > label {
-            color: #FFFFFF !important;
-        }
-
-        /* BOTÕES PRINCIPAIS - ESTADO NORMAL (Calcular/Reiniciar/Exportar) */
-        div[data-testid="stForm"] button[kind="secondaryFormSubmit"],
-        div[data-testid="stForm"] button[kind="secondary"],
-        .stDownloadButton button {
-            background-color: #4D6BFE !important; /* Azul vibrante */
-            color: white !important;
-            border: none !important;
-            border-radius: 12px !important; /* Bordas super arredondadas */
-            padding: 10px 24px !important;
-            font-weight: 600 !important;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1) !important;
-            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1) !important;
-        }
-
-        /* EFEITO HOVER - VERMELHO INTENSO */
-        div[data-testid="stForm"] button[kind="secondaryFormSubmit"]:hover,
-        div[data-testid="stForm"] button[kind="secondary"]:hover,
-        .stDownloadButton button:hover {
-            background-color: #FF4D4D !important; /* Vermelho vibrante */
-            transform: translateY(-2px) !important;
-            box-shadow: 0 4px 8px rgba(255, 77, 77, 0.2) !important;
-        }
-
-        /* EFEITO CLIQUE */
-        div[data-testid="stForm"] button[kind="secondaryFormSubmit"]:active,
-        div[data-testid="stForm"] button[kind="secondary"]:active,
-        .stDownloadButton button:active {
-            transform: translateY(0) !important;
-            background-color: #E04444 !important; /* Vermelho mais escuro */
-        }
-
-        /* TEXTO DOS BOTÕES */
-        div[data-testid="stForm"] button > div > p,
-        .stDownloadButton button > div > p {
-            color: white !important;
-            font-size: 14px !important;
-            margin: 0 !important;
-        }
-    </style>
-    """, unsafe_allow_html=True)
-    
-
-# --- Funções de Cálculo Financeiro ---
-
-def parse_currency(value_str: str) -> float:
+    selecionado = st.session_state.get("lote_catalogo")
+    catalogo = obter_catalogo()
+    if not selecionado or catalogo is None: return
+    quadra, lote = selecionado
+    linha = catalogo.loc[(quadra, lote)]
+    st.session_state.quadra, st.session_state.lote = quadra, lote
+    st.session_state.metragem = f"{linha['metragem']:g}".replace('.', ',')
+    st.session_state.valor_total_str = formatar_moeda(linha['valor_total'], simbolo=False)
+
+def exibir_exportacoes(itens):
     """
-    Converte uma string de valor monetário para float.
-    Aceita formatos como "R$ 150.000,50", "150.000,50", "150000,50", etc.
+    Mostra o andamento das exportações (rótulo, job_id, nome do arquivo) e, quando prontas,
+    os botões de download. Enquanto houver tarefa em andamento, apenas esta seção é
+    atualizada a cada segundo, sem bloquear o restante da página.
     """
-    if not isinstance(value_str, str) or not value_str.strip():
-        return 0.0
-    try:
-        # Remove símbolos de moeda, espaços e pontos de milhar
-        cleaned_value = re.sub(r'[R$\s\.]', '', value_str.strip())
-        # Substitui vírgula decimal por ponto
-        cleaned_value = cleaned_value.replace(',', '.')
-        return float(cleaned_value)
-    except (ValueError, TypeError):
-        return 0.0
-
-def parse_percentage(percent_str: str) -> float:
+    estados = [status_exportacao(job_id) for _, job_id, _ in itens]
+    if all(e['status'] in ('concluido', 'erro') for e in estados):
+        for col, (rotulo, job_id, nome_arquivo), estado in zip(st.columns(len(itens)), itens, estados):
+            if estado['status'] == 'erro': col.error(f"Erro ao gerar '{nome_arquivo}': {estado['erro']}")
+            else: col.download_button(rotulo, ler_exportacao(job_id), nome_arquivo, estado['mime'], key=f"download_{job_id}")
+        return
+
+    @st.fragment(run_every=1)
+    def acompanhar_exportacoes():
+        estados = [status_exportacao(job_id) for _, job_id, _ in itens]
+        if all(e['status'] in ('concluido', 'erro') for e in estados): st.rerun()
+        for col, (_, _, nome_arquivo), estado in zip(st.columns(len(itens)), itens, estados):
+            col.progress(estado['progresso'], text=f"Gerando {nome_arquivo}... {estado['progresso']:.0%}")
+    acompanhar_exportacoes()
+
+def exibir_catalogo_lotes():
     """
-    Converte uma string de porcentagem para float.
-    Aceita formatos como "0,89%", "0.89%", "0,89", etc.
+    Importação do catálogo de lotes (barra lateral) e seletor de lote que preenche o formulário.
     """
-    if not isinstance(percent_str, str) or not percent_str.strip():
-        return 0.0
-    try:
-        # Remove símbolos de porcentagem e espaços
-        cleaned_value = re.sub(r'[%\s]', '', percent_str.strip())
-        # Substitui vírgula decimal por ponto
-        cleaned_value = cleaned_value.replace(',', '.')
-        return float(cleaned_value)
-    except (ValueError, TypeError):
-        return 0.0
-
-def formatar_moeda(valor, simbolo=True):
-    try:
-        if isinstance(valor, str) and 'R$' in valor: valor = valor.replace('R$', '').strip()
-        if valor is None or valor == '': return "R$ 0,00" if simbolo else "0,00"
-        if isinstance(valor, str): valor = re.sub(r'\.', '', valor).replace(',', '.'); valor = float(valor)
-        valor_abs, parte_inteira = abs(valor), int(abs(valor))
-        parte_decimal = int(round((valor_abs - parte_inteira) * 100))
-        parte_inteira_str = f"{parte_inteira:,}".replace(",", ".")
-        valor_formatado = f"{parte_inteira_str},{parte_decimal:02d}"
-        if valor < 0: valor_formatado = f"-{valor_formatado}"
-        return f"R$ {valor_formatado}" if simbolo else valor_formatado
-    except Exception: return "R$ 0,00" if simbolo else "0,00"
-
-def calcular_taxas(taxa_mensal_percentual):
-    try:
-        taxa_mensal_decimal = float(taxa_mensal_percentual) / 100
-        taxa_anual = ((1 + taxa_mensal_decimal) ** 12) - 1
-        taxa_semestral = ((1 + taxa_mensal_decimal) ** 6) - 1
-        taxa_diaria = ((1 + taxa_mensal_decimal) ** (1/30.4375)) - 1
-        return {'anual': taxa_anual, 'semestral': taxa_semestral, 'mensal': taxa_mensal_decimal, 'diaria': taxa_diaria}
-    except Exception: return {'anual': 0, 'semestral': 0, 'mensal': 0, 'diaria': 0}
-
-def calcular_valor_presente(valor_futuro, taxa_diaria, dias):
-    try:
-        if dias <= 0 or taxa_diaria <= 0: return float(valor_futuro)
-        return round(float(valor_futuro) / ((1 + taxa_diaria) ** dias), 2)
-    except Exception: return float(valor_futuro)
-
-def calcular_fator_vp(datas_vencimento, data_inicio, taxa_diaria):
-    if taxa_diaria <= 0: return len(datas_vencimento)
-    fator_total = 0.0
-    for data_venc in datas_vencimento:
-        if not isinstance(data_venc, datetime): data_venc = datetime.strptime(data_venc, '%d/%m/%Y')
-        dias = (data_venc - data_inicio).days
-        if dias > 0: fator_total += 1 / ((1 + taxa_diaria) ** dias)
-    return fator_total
-
-# FUNÇÃO REVISADA PARA GARANTIR CÁLCULO CORRETO DE MESES
-def ajustar_data_vencimento(data_base, periodo, num_periodo=1, dia_vencimento=None):
+    with st.sidebar:
+        st.subheader("Catálogo de Lotes")
+        arquivo = st.file_uploader("Importar catálogo (CSV/XLSX)", type=["csv", "xlsx"], key="arquivo_catalogo")
+        if arquivo is not None and st.button("Salvar catálogo"):
+            try: st.success(f"Catálogo importado com {len(importar_catalogo(arquivo))} lotes.")
+            except Exception as e: st.error(f"Não foi possível importar o catálogo: {str(e)}")
+    try: catalogo = obter_catalogo()
+    except Exception as e: st.warning(f"Não foi possível carregar o catálogo de lotes: {str(e)}"); return None
+    if catalogo is not None:
+        rotulos = dict(zip(catalogo.index, "Quadra " + catalogo.index.get_level_values('quadra') + " - Lote " + catalogo.index.get_level_values('lote') + " (" + catalogo['status'].to_numpy() + ")"))
+        st.selectbox("Selecionar lote do catálogo", options=list(rotulos), index=None, format_func=rotulos.get, key="lote_catalogo", on_change=preencher_lote_do_catalogo, placeholder="Digite para buscar quadra/lote")
+    return catalogo
+
+def exibir_tabela_precos(catalogo):
     """
-    Calcula uma data futura com base em um período (mensal, semestral, anual).
-    É robusto contra meses com diferentes quantidades de dias.
+    Geração em lote da tabela de preços a partir do catálogo.
     """
-    try:
-        if not isinstance(data_base, datetime):
-            data_base = datetime.combine(data_base, datetime.min.time())
-
-        dia = dia_vencimento if dia_vencimento is not None else data_base.day
-
-        months_to_add = 0
-        if periodo == "mensal":
-            months_to_add = num_periodo
-        elif periodo == "semestral":
-            months_to_add = 6 * num_periodo
-        elif periodo == "anual":
-            months_to_add = 12 * num_periodo
-
-        if months_to_add == 0:
-            return data_base
-
-        total_meses = data_base.month + months_to_add
-        novo_ano = data_base.year + (total_meses - 1) // 12
-        novo_mes = (total_meses - 1) % 12 + 1
-
-        try:
-            return datetime(novo_ano, novo_mes, dia)
-        except ValueError:
-            if novo_mes == 12:
-                ultimo_dia_do_mes = 31
-            else:
-                ultimo_dia_do_mes = (datetime(novo_ano, novo_mes + 1, 1) - timedelta(days=1)).day
-            return datetime(novo_ano, novo_mes, ultimo_dia_do_mes)
-    except Exception:
-        return data_base + timedelta(days=30 * (months_to_add or num_periodo))
+    with st.expander("Tabela de Preços do Catálogo"):
+        with st.form("tabela_precos_form"):
+            cols = st.columns(4)
+            modalidade = cols[0].selectbox("Modalidade", ["mensal", "só balão anual", "só balão semestral"], key="tp_modalidade")
+            prazos_str = cols[1].text_input("Prazos (meses)", value="60, 120, 180", key="tp_prazos")
+            entrada_pct_str = cols[2].text_input("Entrada (%)", value="10", key="tp_entrada")
+            data_base = cols[3].date_input("Data Base", value=datetime.now(), format="DD/MM/YYYY", key="tp_data_base")
+            if st.form_submit_button("Gerar Tabela"): st.session_state.exibir_tabela_precos = True
+        if not st.session_state.get("exibir_tabela_precos"): return
+        prazos = [int(p) for p in re.findall(r'\d+', prazos_str) if int(p) > 0]
+        if not prazos: st.error("Informe ao menos um prazo em meses."); return
+        taxa_mensal = parse_percentage(st.session_state.taxa_mensal)
+        data_entrada = datetime.combine(data_base, datetime.min.time())
+        tabela = gerar_tabela_precos(catalogo, data_entrada, taxa_mensal, [{'modalidade': modalidade, 'qtd_parcelas': p} for p in prazos], parse_percentage(entrada_pct_str), dias_uteis=AJUSTES_DIAS_UTEIS.get(st.session_state.get("ajuste_dias_uteis")))
+        df_display = tabela.copy()
+        for col in df_display.columns[3:]: df_display[col] = df_display[col].apply(formatar_moeda)
+        st.dataframe(df_display, use_container_width=True, hide_index=True)
+        parametros = {'Modalidade': modalidade, 'Prazos': ", ".join(map(str, prazos)), 'Entrada (%)': entrada_pct_str, 'Taxa Mensal (%)': f"{taxa_mensal:.2f}", 'Data Base': data_entrada.strftime('%d/%m/%Y'), 'Vencimento em Dia Não Útil': st.session_state.get("ajuste_dias_uteis") or "Manter a data"}
+        exibir_exportacoes([("Exportar Tabela de Preços (Excel)", enviar_exportacao("tabela_precos", tabela.to_dict('records'), parametros), "tabela_precos.xlsx")])
+        if st.button("Gravar Cronogramas Completos (binário)", key="tp_gravar_binario"):
+            try:
+                conjunto, indice = gravar_cronogramas_catalogo(catalogo, data_entrada, taxa_mensal, [{'modalidade': modalidade, 'qtd_parcelas': p} for p in prazos], DIRETORIO_CRONOGRAMAS, parse_percentage(entrada_pct_str), dias_uteis=AJUSTES_DIAS_UTEIS.get(st.session_state.get("ajuste_dias_uteis")))
+                st.success(f"{len(indice)} cronogramas ({int((indice['fim'] - indice['inicio']).sum())} vencimentos) gravados em {conjunto}.")
+            except OSError as e: st.error(f"Erro ao gravar os cronogramas: {str(e)}")
 
+def exibir_quitacao(cronograma, taxa_mensal):
+    """
+    Cotação de quitação antecipada e reparcelamento do saldo de um cronograma.
+    """
+    with st.expander("Quitação Antecipada / Renegociação"):
+        c1, c2 = st.columns(2)
+        data_cotacao = c1.date_input("Data da Cotação", value=datetime.now(), format="DD/MM/YYYY", key="data_cotacao")
+        meses_renegociacao = c2.number_input("Reparcelar o saldo em (meses)", min_value=0, step=1, key="meses_renegociacao")
+        data_cotacao = datetime.combine(data_cotacao, datetime.min.time())
+        cotacao, resultado = renegociar_saldo(cronograma, data_cotacao, taxa_mensal, meses_renegociacao) if meses_renegociacao > 0 else (cotar_quitacao(cronograma, data_cotacao, taxa_mensal), None)
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Valor para Quitação", formatar_moeda(cotacao['valor_quitacao'])); c2.metric("Saldo Nominal em Aberto", formatar_moeda(cotacao['valor_nominal'])); c3.metric("Desconto na Quitação", formatar_moeda(cotacao['desconto']))
+        if resultado:
+            if resultado['erro']: st.error(resultado['erro']); return
+            st.write(f"Novo plano: **{resultado['qtd_parcelas']}x de {formatar_moeda(resultado['valor_parcela'])}** (taxa {resultado['taxa_mensal']:.2f}% a.m.)")
+            df_display = pd.DataFrame([p for p in resultado['cronograma'] if p['Item'] != 'TOTAL'])[['Item', 'Data_Vencimento', 'Valor', 'Saldo_Devedor']]
+            for col in ['Valor', 'Saldo_Devedor']: df_display[col] = df_display[col].apply(formatar_moeda)
+            st.dataframe(df_display, use_container_width=True, hide_index=True, column_config={"Data_Vencimento": "Data Venc.", "Saldo_Devedor": "Saldo Devedor"})
+
+def exibir_correcao(cronograma, data_base):
+    """
+    Projeção das parcelas corrigidas por INCC até o fim da obra e por IPCA depois.
+    """
+    with st.expander("Correção Monetária (INCC/IPCA)"):
+        try: indices = obter_indices()
+        except (OSError, ValueError) as e: st.error(f"Série de índices inválida: {str(e)}"); return
+        if indices is None: st.info(f"Sem série de índices: cadastre {CAMINHO_INDICES} (colunas mes, indice, variacao) para projetar a correção."); return
+        c1, c2 = st.columns(2)
+        fim_obra = c1.date_input("Fim da Obra (INCC até, IPCA depois)", value=data_base, format="DD/MM/YYYY", key="fim_obra")
+        defasagem = c2.number_input("Defasagem do Índice (meses)", min_value=0, value=1, step=1, key="defasagem_indice")
+        try: corrigido = corrigir_cronograma(cronograma, data_base, fim_obra, indices, defasagem)
+        except ValueError as e: st.error(str(e)); return
+        total = next((p for p in corrigido if p['Item'] == 'TOTAL'), None)
+        if not total: return
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Total Nominal", formatar_moeda(total['Valor'])); c2.metric("Total Corrigido (projeção)", formatar_moeda(total['Valor_Corrigido'])); c3.metric("Correção Projetada", formatar_moeda(total['Valor_Corrigido'] - total['Valor']))
+        df_display = pd.DataFrame([p for p in corrigido if p['Item'] != 'TOTAL'])[['Item', 'Data_Vencimento', 'Valor', 'Fator_Correcao', 'Valor_Corrigido']]
+        for col in ['Valor', 'Valor_Corrigido']: df_display[col] = df_display[col].apply(formatar_moeda)
+        st.dataframe(df_display, use_container_width=True, hide_index=True, column_config={"Data_Vencimento": "Data Venc.", "Fator_Correcao": "Fator", "Valor_Corrigido": "Valor Corrigido"})
+
+def exibir_conciliacao():
+    """
+    Conciliação de um arquivo de retorno do banco com um conjunto escolhido de cronogramas
+    gravados em formato binário (ver `gravar_cronogramas_catalogo`), com contratos
+    identificados por "quadra/lote".
+    """
+    with st.expander("Conciliação de Pagamentos"):
+        conjuntos = listar_conjuntos_cronogramas(DIRETORIO_CRONOGRAMAS)
+        if not conjuntos: st.info("Grave os cronogramas completos do catálogo (Tabela de Preços) para conciliar pagamentos."); return
+        conjunto = st.selectbox("Cronogramas Gravados", conjuntos, format_func=os.path.basename, key="conjunto_conciliacao", help="Conjunto gravado pela Tabela de Preços contra o qual os pagamentos são conciliados.")
+        indice, colunas = abrir_cronogramas(conjunto)
+        planos = indice.drop_duplicates('plano'); rotulos = dict(zip(planos['plano'], planos['modalidade'] + " " + planos['qtd_parcelas'].astype(str) + "x"))
+        with st.form("conciliacao_form"):
+            c1, c2, c3 = st.columns(3)
+            arquivo = c1.file_uploader("Arquivo de retorno (CSV ou posicional)", type=["csv", "txt", "ret"], key="arquivo_retorno")
+            plano = c2.selectbox("Plano", list(rotulos), format_func=rotulos.get, key="plano_conciliacao")
+            data_referencia = c3.date_input("Data de Referência", value=datetime.now(), format="DD/MM/YYYY", key="data_referencia_conciliacao")
+            if st.form_submit_button("Conciliar"): st.session_state.exibir_conciliacao = True
+        if not st.session_state.get("exibir_conciliacao") or arquivo is None: return
+        try: pagamentos = ler_retorno_bancario(arquivo)
+        except (UnicodeDecodeError, ValueError) as e: st.error(f"Arquivo de retorno inválido: {str(e)}"); return
+        itens, pagamentos = conciliar_pagamentos(carteira_binaria(indice, colunas, plano), pagamentos, data_referencia)
+        resumo = resumir_conciliacao(itens).reset_index(); nao_identificados = pagamentos[pagamentos['Situacao'] != 'conciliado']
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Pagamentos Conciliados", f"{len(pagamentos) - len(nao_identificados)} de {len(pagamentos)}"); c2.metric("Valor Conciliado", formatar_moeda(float(resumo['Valor_Pago'].sum())))
+        c3.metric("Encargos Recebidos", formatar_moeda(float(resumo['Encargos_Pagos'].sum()))); c4.metric("Saldo Vencido", formatar_moeda(float(resumo['Saldo_Vencido'].sum())))
+        df_display = resumo.copy()
+        for col in ['Valor_Pago', 'Encargos_Pagos', 'Saldo_Vencido']: df_display[col] = formatar_moedas(df_display[col])
+        st.dataframe(df_display, use_container_width=True, hide_index=True, column_config={"Pagos_a_Menor": "Pagos a Menor", "Valor_Pago": "Valor Pago", "Encargos_Pagos": "Encargos Pagos", "Saldo_Vencido": "Saldo Vencido"})
+        if len(nao_identificados): st.warning(f"{len(nao_identificados)} pagamentos sem item correspondente na carteira."); st.dataframe(nao_identificados.drop(columns=['Item', 'Situacao']), use_container_width=True, hide_index=True)
+        registros = {'resumo': resumo.to_dict('records'), 'nao_identificados': nao_identificados[['Contrato', 'Data_Vencimento', 'Data_Pagamento', 'Valor_Pago']].astype({'Data_Vencimento': str, 'Data_Pagamento': str}).to_dict('records')}
+        parametros = {'Arquivo': arquivo.name, 'Cronogramas': os.path.basename(conjunto), 'Plano': rotulos[plano], 'Data de Referência': data_referencia.strftime('%d/%m/%Y'), 'Multa (%)': MULTA_ATRASO, 'Juros de Mora (% a.m.)': JUROS_MORA_MENSAL}
+        exibir_exportacoes([("Exportar Conciliação (Excel)", enviar_exportacao("conciliacao", registros, parametros), "conciliacao.xlsx")])
+
+def aplicar_entrada_necessaria(entrada, balao_fixo):
+    """
+    Callback: leva a entrada calculada para o formulário e limpa os valores a calcular.
+    """
+    st.session_state.entrada_str = formatar_moeda(entrada, simbolo=False); st.session_state.valor_parcela_str = ""
+    st.session_state.valor_balao_str = formatar_moeda(balao_fixo, simbolo=False) if balao_fixo > 0 else ""
 
-def determinar_modo_calculo(modalidade):
-    return {"mensal": 1, "mensal + balão": 2, "só balão anual": 3, "só balão semestral": 4}.get(modalidade, 1)
+@st.fragment
+def exibir_entrada_necessaria():
+    """
+    Calcula a entrada necessária para uma parcela desejada com os dados do formulário.
+    Roda como fragmento: alterar o valor desejado não reexecuta a simulação inteira.
+    """
+    estado = st.session_state; modalidade = estado.get("modalidade", "mensal")
+    with st.expander("Entrada Necessária para uma Parcela Desejada"):
+        c1, c2 = st.columns(2)
+        alvo_str = c1.text_input("Balão desejado (R$)" if modalidade.startswith("só balão") else "Parcela desejada (R$)", key="alvo_parcela", placeholder="Ex: 1.500,00")
+        balao_fixo_str = c2.text_input("Balão fixo (R$)", key="alvo_balao_fixo", placeholder="Ex: 10.000,00") if modalidade == "mensal + balão" else ""
+        valor_total = parse_currency(estado.get("valor_total_str", "")); valor_alvo = parse_currency(alvo_str)
+        if valor_total <= 0 or not estado.get("qtd_parcelas") or valor_alvo <= 0:
+            st.caption("Usa o valor total, a data, a taxa e o plano do formulário (após clicar em Calcular)."); return
+        plano = {'modalidade': modalidade, 'qtd_parcelas': estado.get("qtd_parcelas"), 'tipo_balao': estado.get("tipo_balao") if modalidade == "mensal + balão" else None, 'agendamento_baloes': estado.get("agendamento_baloes"), 'meses_baloes': estado.get("meses_baloes"), 'mes_primeiro_balao': estado.get("mes_primeiro_balao")}
+        data_entrada = datetime.combine(estado.get("data_input") or datetime.now().date(), datetime.min.time())
+        try: r = calcular_entrada_necessaria(valor_total, data_entrada, parse_percentage(estado.get("taxa_mensal_str", estado.taxa_mensal)), plano, valor_alvo, parse_currency(balao_fixo_str), dias_uteis=AJUSTES_DIAS_UTEIS.get(estado.get("ajuste_dias_uteis")))
+        except ValueError as e: st.error(str(e)); return
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Entrada Necessária", formatar_moeda(r['entrada'])); c2.metric("Valor Financiado", formatar_moeda(r['valor_financiado']))
+        c3.metric("Balão Resultante" if modalidade.startswith("só balão") else "1ª Parcela Resultante" if modalidade in SISTEMAS_AMORTIZACAO else "Parcela Resultante", formatar_moeda(r['valor_balao'] if modalidade.startswith("só balão") else r['valor_parcela']))
+        if r['valor_financiado'] >= valor_total: st.caption("O valor desejado cobre o imóvel inteiro sem entrada.")
+        if st.button("Usar esta entrada", key="usar_entrada_necessaria", on_click=aplicar_entrada_necessaria, args=(r['entrada'], parse_currency(balao_fixo_str))): st.rerun()
+
+def aplicar_baloes_otimizados(meses_baloes, valor_balao):
+    """
+    Callback: leva os meses e o valor dos balões otimizados para o formulário (agendamento
+    personalizado) e limpa a parcela, que passa a ser calculada.
+    """
+    st.session_state.agendamento_baloes = "Personalizado (Mês a Mês)"; st.session_state.meses_baloes = list(meses_baloes)
+    st.session_state.valor_balao_str = formatar_moeda(valor_balao, simbolo=False); st.session_state.valor_parcela_str = ""
 
-def atualizar_baloes(modalidade, qtd_parcelas, tipo_balao=None):
-    try:
-        qtd_parcelas = int(qtd_parcelas) if qtd_parcelas else 0
-        if modalidade == "mensal + balão":
-            intervalo = 12 if tipo_balao == "anual" else 6
-            return qtd_parcelas // intervalo if intervalo > 0 else 0
-        elif modalidade == "só balão anual": return max(ceil(qtd_parcelas / 12), 0) if qtd_parcelas else 0
-        elif modalidade == "só balão semestral": return max(ceil(qtd_parcelas / 6), 0) if qtd_parcelas else 0
-        return 0
-    except Exception: return 0
-
-@st.cache_data(ttl=3600)
-def gerar_cronograma(valor_financiado, valor_parcela_final, valor_balao_final,
-                     qtd_parcelas, qtd_baloes, modalidade, tipo_balao,
-                     data_entrada, taxas, valor_ultima_parcela=None, valor_ultimo_balao=None,
-                     agendamento_baloes=None, meses_baloes=None, mes_primeiro_balao=None):
-    try:
-        dia_vencimento = data_entrada.day
-        parcelas, baloes = [], []
-
-        if modalidade in ["mensal", "mensal + balão"]:
-            for i in range(1, qtd_parcelas + 1):
-                valor_corrente = valor_ultima_parcela if (i == qtd_parcelas and valor_ultima_parcela is not None) else valor_parcela_final
-                data_vencimento = ajustar_data_vencimento(data_entrada, "mensal", i, dia_vencimento)
-                dias = (data_vencimento - data_entrada).days
-                vp = calcular_valor_presente(valor_corrente, taxas['diaria'], dias)
-                parcelas.append({"Item": f"Parcela {i}", "Tipo": "Parcela", "Data_Vencimento": data_vencimento.strftime('%d/%m/%Y'), "Dias": dias, "Valor": round(valor_corrente, 2), "Valor_Presente": round(vp, 2), "Desconto_Aplicado": round(valor_corrente - vp, 2)})
-        
-        periodo_map = {"só balão anual": "anual", "só balão semestral": "semestral"}
-        if modalidade in periodo_map:
-            periodo = periodo_map[modalidade]
-            for i in range(1, qtd_baloes + 1):
-                valor_corrente = valor_ultimo_balao if (i == qtd_baloes and valor_ultimo_balao is not None) else valor_balao_final
-                data_vencimento = ajustar_data_vencimento(data_entrada, periodo, i, dia_vencimento)
-                dias = (data_vencimento - data_entrada).days
-                vp = calcular_valor_presente(valor_corrente, taxas['diaria'], dias)
-                baloes.append({"Item": f"Balão {i}", "Tipo": "Balão", "Data_Vencimento": data_vencimento.strftime('%d/%m/%Y'), "Dias": dias, "Valor": round(valor_corrente, 2), "Valor_Presente": round(vp, 2), "Desconto_Aplicado": round(valor_corrente - vp, 2)})
-
-        if modalidade == "mensal + balão":
-            datas_baloes_a_gerar = []
-            if agendamento_baloes == "Personalizado (Mês a Mês)":
-                datas_baloes_a_gerar = [ajustar_data_vencimento(data_entrada, "mensal", mes, dia_vencimento) for mes in meses_baloes]
-            
-            elif agendamento_baloes == "A partir do 1º Vencimento":
-                primeira_data_balao = ajustar_data_vencimento(data_entrada, "mensal", mes_primeiro_balao, dia_vencimento)
-                datas_baloes_a_gerar.append(primeira_data_balao)
-                
-                data_anterior = primeira_data_balao
-                for _ in range(1, qtd_baloes):
-                    # CORREÇÃO: Usa o dia de vencimento original para os cálculos subsequentes
-                    proxima_data_balao = ajustar_data_vencimento(data_anterior, tipo_balao, 1, dia_vencimento)
-                    datas_baloes_a_gerar.append(proxima_data_balao)
-                    data_anterior = proxima_data_balao
-
-            else: # Padrão
-                # LÓGICA PADRÃO SIMPLIFICADA E CORRIGIDA
-                datas_baloes_a_gerar = [ajustar_data_vencimento(data_entrada, tipo_balao, i, dia_vencimento) for i in range(1, qtd_baloes + 1)]
-            
-            for i, data_vencimento in enumerate(datas_baloes_a_gerar):
-                balao_count = i + 1
-                valor_corrente = valor_ultimo_balao if (balao_count == qtd_baloes and valor_ultimo_balao is not None) else valor_balao_final
-                dias = (data_vencimento - data_entrada).days
-                vp = calcular_valor_presente(valor_corrente, taxas['diaria'], dias)
-                baloes.append({"Item": f"Balão {balao_count}", "Tipo": "Balão", "Data_Vencimento": data_vencimento.strftime('%d/%m/%Y'), "Dias": dias, "Valor": round(valor_corrente, 2), "Valor_Presente": round(vp, 2), "Desconto_Aplicado": round(valor_corrente - vp, 2)})
-        
-        # AJUSTE DE ORDENAÇÃO: Ordena cada lista separadamente e depois as combina.
-        parcelas_sorted = sorted(parcelas, key=lambda x: datetime.strptime(x['Data_Vencimento'], '%d/%m/%Y'))
-        baloes_sorted = sorted(baloes, key=lambda x: datetime.strptime(x['Data_Vencimento'], '%d/%m/%Y'))
-        cronograma = parcelas_sorted + baloes_sorted
-
-        if cronograma:
-            total_valor = round(sum(p['Valor'] for p in cronograma), 2)
-            valor_presente_real = round(sum(p['Valor_Presente'] for p in cronograma), 2)
-            cronograma.append({"Item": "TOTAL", "Tipo": "", "Data_Vencimento": "", "Dias": "", "Valor": total_valor, "Valor_Presente": valor_presente_real, "Desconto_Aplicado": round(total_valor - valor_presente_real, 2)})
-        
-        return cronograma
-    except Exception as e:
-        st.error(f"Erro inesperado ao gerar cronograma: {str(e)}.")
-        return []
+@st.fragment
+def exibir_otimizacao_baloes():
+    """
+    Sugere os meses dos balões que minimizam a parcela (ver `otimizar_baloes`) com os dados do
+    formulário. Roda como fragmento, como `exibir_entrada_necessaria`.
+    """
+    estado = st.session_state
+    if estado.get("modalidade") != "mensal + balão": return
+    with st.expander("Otimizar Meses dos Balões"):
+        c1, c2, c3, c4 = st.columns(4)
+        meses_do_ano = c1.multiselect("Meses permitidos", list(range(1, 13)), format_func=lambda mes: NOMES_MESES[mes - 1], key="otimizar_meses_do_ano", placeholder="Todos")
+        valor_maximo_str = c2.text_input("Balão máximo (R$)", key="otimizar_balao_maximo", placeholder="Ex: 10.000,00")
+        intervalo_minimo = c3.number_input("Intervalo mínimo (meses)", min_value=1, value=6, step=1, key="otimizar_intervalo")
+        qtd_maxima = c4.number_input("Máximo de balões (0 = sem limite)", min_value=0, value=0, step=1, key="otimizar_qtd_maxima")
+        valor_total = parse_currency(estado.get("valor_total_str", "")); entrada = parse_currency(estado.get("entrada_str", "")); valor_maximo = parse_currency(valor_maximo_str)
+        if valor_total <= entrada or not estado.get("qtd_parcelas") or valor_maximo <= 0:
+            st.caption("Usa o valor total, a entrada, a data, a taxa e a quantidade de parcelas do formulário."); return
+        data_entrada = datetime.combine(estado.get("data_input") or datetime.now().date(), datetime.min.time())
+        try: r = otimizar_baloes(round(valor_total - entrada, 2), data_entrada, parse_percentage(estado.get("taxa_mensal_str", estado.taxa_mensal)), estado.get("qtd_parcelas"), valor_maximo, meses_do_ano, intervalo_minimo, qtd_maxima, dias_uteis=AJUSTES_DIAS_UTEIS.get(estado.get("ajuste_dias_uteis")))
+        except ValueError as e: st.error(str(e)); return
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Parcela Resultante", formatar_moeda(r['valor_parcela'])); c2.metric("Valor do Balão", formatar_moeda(r['valor_balao'])); c3.metric("Quantidade de Balões", r['qtd_baloes'])
+        st.caption("Meses dos balões: " + ", ".join(str(mes) for mes in r['meses_baloes']))
+        if st.button("Usar estes balões", key="usar_baloes_otimizados", on_click=aplicar_baloes_otimizados, args=(r['meses_baloes'], r['valor_balao'])): st.rerun()
+
+# --- Links de Simulação ---
+# Os campos do formulário vão na URL (?s=...&h=...): `s` é o JSON dos campos comprimido em
+# base64 e `h` o hash desse JSON, que valida o link. Ao compartilhar um link, os resultados
+# são gravados em DIRETORIO_SIMULACOES pela chave de `chave_simulacao` (as entradas
+# financeiras canônicas): quem abre o link recebe o formulário preenchido e os resultados
+# gravados, sem recalcular, e as exportações (cujo id é o hash do conteúdo, ver
+# `enviar_exportacao`) reaproveitam os arquivos em disco. Cálculos feitos pelo formulário não
+# leem nem gravam o diretório.
+CAMPOS_LINK = ["quadra", "lote", "metragem", "valor_total_str", "entrada_str", "data_input", "ajuste_dias_uteis", "taxa_mensal_str", "modalidade", "tipo_balao",
+               "agendamento_baloes", "meses_baloes", "mes_primeiro_balao", "qtd_parcelas", "valor_parcela_str", "valor_balao_str", "modalidades_comparacao"]
+# Widgets com valor padrão no formulário: o link os restaura pelo padrão, não pela chave do widget
+PADROES_LINK = {"data_input": "data_input_padrao", "taxa_mensal_str": "taxa_mensal", "mes_primeiro_balao": "mes_primeiro_balao_padrao"}
+DIRETORIO_SIMULACOES = os.environ.get("SIMULACOES_COMPARTILHADAS", os.path.join(DIRETORIO_APP, ".simulacoes"))
+
+def codificar_link(campos):
+    """
+    Parâmetros do link de uma simulação: {'s': campos comprimidos, 'h': hash}. Campos vazios
+    ficam de fora; datas vão no formato ISO.
+    """
+    campos = {k: v.isoformat() if hasattr(v, 'isoformat') else v for k, v in campos.items() if k in CAMPOS_LINK and v not in (None, "", [])}
+    bruto = json.dumps(campos, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode()
+    return {'s': base64.urlsafe_b64encode(zlib.compress(bruto, 9)).decode().rstrip('='), 'h': hashlib.sha256(bruto).hexdigest()[:16]}
 
+def decodificar_link(s, h):
+    """
+    Inverso de `codificar_link`; lança ValueError se o link estiver corrompido ou alterado.
+    """
+    try: bruto = zlib.decompress(base64.urlsafe_b64decode(s + '=' * (-len(s) % 4)))
+    except (ValueError, zlib.error) as e: raise ValueError("Link de simulação inválido.") from e
+    if hashlib.sha256(bruto).hexdigest()[:16] != h: raise ValueError("Link de simulação inválido ou alterado.")
+    campos = {k: v for k, v in json.loads(bruto).items() if k in CAMPOS_LINK}
+    if 'data_input' in campos: campos['data_input'] = datetime.strptime(campos['data_input'][:10], '%Y-%m-%d').date()
+    return campos
+
+def restaurar_link_simulacao():
+    """
+    Preenche o formulário com os campos do link da URL, uma vez por link e sessão, e pede a
+    exibição dos resultados. Retorna True na execução em que o link foi restaurado.
+    """
+    parametros = st.query_params
+    if 's' not in parametros or 'h' not in parametros or st.session_state.get("link_simulacao") == parametros['h']: return False
+    st.session_state.link_simulacao = parametros['h']
+    try: campos = decodificar_link(parametros['s'], parametros['h'])
+    except ValueError as e: st.error(str(e)); return False
+    for chave, padrao in PADROES_LINK.items():
+        if chave in campos: st.session_state.pop(chave, None); st.session_state[padrao] = campos.pop(chave)
+    for chave, valor in campos.items(): st.session_state[chave] = valor
+    st.session_state.exibir_resultados = True
+    return True
+
+def url_simulacao(link):
+    """URL completa do link (endereço do servidor pelo cabeçalho Host da sessão), ou só a consulta."""
+    cabecalhos = st.context.headers if hasattr(st, "context") else {}
+    host = cabecalhos.get("Host")
+    return (f"{cabecalhos.get('X-Forwarded-Proto', 'http')}://{host}/" if host else "") + "?" + urlencode(link)
+
+def chave_simulacao(valor_financiado, data_entrada, taxa_mensal, planos, dias_uteis, *versoes):
+    """
+    Chave dos resultados gravados: as entradas do cálculo na forma canônica de `simular_planos`
+    (quadra, lote e metragem não entram) e as versões da política de taxas e do calendário de
+    feriados, para que uma edição deles não sirva resultados antigos.
+    """
+    entradas = [round(float(valor_financiado), 2), data_entrada.strftime('%Y-%m-%d'), round(float(taxa_mensal), 6), [canonicalizar_plano(p) for p in planos], dias_uteis, *versoes]
+    return hashlib.sha256(json.dumps(entradas, sort_keys=True, default=str).encode()).hexdigest()[:20]
 
-def gerar_pdf(cronograma, dados):
-    try:
-        pdf = FPDF(); pdf.add_page(); pdf.set_font("Arial", 'B', 14)
-        pdf.cell(200, 10, txt="Informações do Imóvel", ln=1, align='L'); pdf.set_font("Arial", size=12)
-        pdf.cell(200, 10, txt=f"Quadra: {dados.get('quadra', 'N/I')}", ln=1); pdf.cell(200, 10, txt=f"Lote: {dados.get('lote', 'N/I')}", ln=1); pdf.cell(200, 10, txt=f"Metragem: {dados.get('metragem', 'N/I')} m²", ln=1)
-        pdf.ln(5); pdf.set_font("Arial", 'B', 14)
-        pdf.cell(200, 10, txt="Simulação de Financiamento", ln=1, align='L'); pdf.set_font("Arial", size=12)
-        pdf.cell(200, 10, txt=f"Valor Total do Imóvel: {formatar_moeda(dados['valor_total'])}", ln=1); pdf.cell(200, 10, txt=f"Entrada: {formatar_moeda(dados['entrada'])}", ln=1); pdf.cell(200, 10, txt=f"Valor Financiado: {formatar_moeda(dados['valor_financiado'])}", ln=1); pdf.cell(200, 10, txt=f"Taxa Mensal Utilizada: {dados['taxa_mensal']:.2f}%", ln=1)
-        pdf.ln(10); pdf.set_font("Arial", 'B', 12)
-        colunas = ["Item", "Tipo", "Data Venc.", "Valor", "Valor Presente", "Juros"]; larguras = [30, 25, 30, 35, 35, 35]
-        for col, larg in zip(colunas, larguras): pdf.cell(larg, 10, txt=col, border=1, align='C')
-        pdf.ln(); pdf.set_font("Arial", size=10)
-        cronograma_sem_total = [p for p in cronograma if p['Item'] != 'TOTAL']
-        for item in cronograma_sem_total:
-            pdf.cell(larguras[0], 8, txt=item['Item'], border=1); pdf.cell(larguras[1], 8, txt=item['Tipo'], border=1); pdf.cell(larguras[2], 8, txt=item['Data_Vencimento'], border=1)
-            pdf.cell(larguras[3], 8, txt=formatar_moeda(item['Valor'], simbolo=False), border=1, align='R'); pdf.cell(larguras[4], 8, txt=formatar_moeda(item['Valor_Presente'], simbolo=False), border=1, align='R'); pdf.cell(larguras[5], 8, txt=formatar_moeda(item['Desconto_Aplicado'], simbolo=False), border=1, align='R'); pdf.ln()
-        total = next((p for p in cronograma if p['Item'] == 'TOTAL'), None)
-        if total:
-            pdf.set_font("Arial", 'B', 10); pdf.cell(sum(larguras[:3]), 10, txt="TOTAL", border=1, align='R')
-            pdf.cell(larguras[3], 10, txt=formatar_moeda(total['Valor'], simbolo=False), border=1, align='R'); pdf.cell(larguras[4], 10, txt=formatar_moeda(total['Valor_Presente'], simbolo=False), border=1, align='R'); pdf.cell(larguras[5], 10, txt=formatar_moeda(total['Desconto_Aplicado'], simbolo=False), border=1, align='R')
-        return BytesIO(pdf.output())
-    except Exception as e: st.error(f"Erro ao gerar PDF: {str(e)}"); return BytesIO()
-
-def gerar_excel(cronograma, dados):
+@st.cache_resource
+def preparar_diretorio_simulacoes(diretorio, dias_retencao=30):
+    """
+    Cria, uma vez por processo, o diretório dos resultados gravados e remove os antigos.
+    """
+    os.makedirs(diretorio, exist_ok=True)
+    limite = time.time() - dias_retencao * 86400
+    for nome in os.listdir(diretorio):
+        caminho = os.path.join(diretorio, nome)
+        if os.path.getmtime(caminho) < limite: os.remove(caminho)
+    return diretorio
+
+def ler_simulacao(chave):
     try:
-        install_and_import('openpyxl'); output = BytesIO()
-        info_df = pd.DataFrame({'Campo': ['Quadra', 'Lote', 'Metragem', 'Valor Total do Imóvel', 'Entrada', 'Valor Financiado', 'Taxa Mensal Utilizada'], 'Valor': [dados.get('quadra', 'N/I'), dados.get('lote', 'N/I'), f"{dados.get('metragem', 'N/I')} m²", formatar_moeda(dados.get('valor_total', 0)), formatar_moeda(dados.get('entrada', 0)), formatar_moeda(dados.get('valor_financiado', 0)), f"{dados.get('taxa_mensal', 0):.2f}%"]})
-        df_cronograma_data = pd.DataFrame([p for p in cronograma if p['Item'] != 'TOTAL'])
-        df_cronograma_data.rename(columns={'Desconto_Aplicado': 'Juros'}, inplace=True)
-        total_row = next((p for p in cronograma if p['Item'] == 'TOTAL'), None)
-        if total_row:
-            total_row['Desconto_Aplicado'] = total_row.pop('Juros', total_row.get('Desconto_Aplicado'))
-
-        df_final = pd.concat([df_cronograma_data, pd.DataFrame([total_row])], ignore_index=True) if total_row else df_cronograma_data
-        df_export = df_final[['Item', 'Tipo', 'Data_Vencimento', 'Valor', 'Valor_Presente', 'Juros']]
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            info_df.to_excel(writer, sheet_name='Informações da Simulação', index=False)
-            df_export.to_excel(writer, sheet_name='Cronograma de Pagamentos', index=False)
-        output.seek(0); return output
-    except Exception as e: st.error(f"Erro ao gerar Excel: {str(e)}"); return BytesIO()
+        with open(os.path.join(preparar_diretorio_simulacoes(DIRETORIO_SIMULACOES), f"{chave}.json"), encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+def gravar_simulacao(chave, resultados):
+    diretorio = preparar_diretorio_simulacoes(DIRETORIO_SIMULACOES)
+    with tempfile.NamedTemporaryFile("w", encoding='utf-8', dir=diretorio, suffix=".tmp", delete=False) as f:
+        try: json.dump(resultados, f, ensure_ascii=False, default=str)
+        except BaseException: f.close(); os.remove(f.name); raise
+    os.replace(f.name, os.path.join(diretorio, f"{chave}.json"))
+
+# --- Aquecimento dos Caches ---
+# Na primeira execução do script, uma thread em segundo plano preenche a política de taxas, os
+# calendários, as tabelas de desconto e os resultados dos planos modelo de hoje (ver
+# `aquecer_caches` em motor.py, que também lista as variáveis de ambiente dos cenários
+# aquecidos). SIMULADOR_AQUECIMENTO="0" desliga o aquecimento.
+AQUECIMENTO = os.environ.get("SIMULADOR_AQUECIMENTO", "1") != "0"
+
+@st.cache_resource
+def iniciar_aquecimento():
+    """
+    Dispara `aquecer_caches` uma vez por processo, em uma thread daemon: a primeira página é
+    renderizada sem esperar. Retorna o estado do aquecimento ('etapa', 'calendarios', 'tabelas',
+    'resultados', 'duracao' e 'erro'); com SIMULADOR_AQUECIMENTO=0 não faz nada.
+    """
+    estado = {'etapa': 'desligado' if not AQUECIMENTO else 'pendente', 'calendarios': 0, 'tabelas': 0, 'resultados': 0, 'duracao': None, 'erro': None}
+    if not AQUECIMENTO: return estado
+    def executar():
+        inicio = time.perf_counter()
+        try: estado.update({**aquecer_caches(), 'etapa': 'concluido', 'duracao': time.perf_counter() - inicio})
+        except Exception as e: estado.update({'etapa': 'erro', 'erro': str(e)})
+    threading.Thread(target=executar, name="aquecimento", daemon=True).start()
+    return estado
 
 # --- Função Principal do Aplicativo Streamlit ---
 def main():
+    iniciar_aquecimento()
     set_theme()
     st.write("\n")
     logo = load_logo()
     if logo:
-        col1, col2 = st.columns([1, 4]); col1.image(logo, width=200, use_container_width=False)
+        col1, col2 = st.columns([1, 4]); col1.image(logo, width=LARGURA_LOGO, use_container_width=False)
         col2.title("**Seja bem vindo ao Simulador da JMD HAMOA**")
     else: st.title("Simulador Imobiliária Celeste")
         
-    if 'taxa_mensal' not in st.session_state: st.session_state.taxa_mensal = "0,89"
+    try: politica = obter_politica_taxas()
+    except (OSError, ValueError) as e: st.error(f"Política de taxas inválida: {str(e)}"); return
+    if 'taxa_mensal' not in st.session_state: st.session_state.taxa_mensal = f"{politica['padrao']['taxa_padrao']:.2f}".replace('.', ',')
     
     def reset_form(): 
         taxa_atual = st.session_state.taxa_mensal
-        st.session_state.clear()
+        st.session_state.clear(); st.query_params.clear()
         st.session_state.taxa_mensal = taxa_atual
 
+    restaurado = restaurar_link_simulacao()
+
+    catalogo = exibir_catalogo_lotes()
     with st.container():
         cols = st.columns(3); quadra = cols[0].text_input("Quadra", key="quadra", placeholder="Ex: 15")
         lote = cols[1].text_input("Lote", key="lote", placeholder="Ex: 22"); metragem = cols[2].text_input("Metragem (m²)", key="metragem", placeholder="Ex: 360")
@@ -516,9 +432,10 @@ def main():
         with col1:
             valor_total_str = st.text_input("Valor Total do Imóvel (R$)", key="valor_total_str", placeholder="Ex: 150.000,50")
             entrada_str = st.text_input("Entrada (R$)", key="entrada_str", placeholder="Ex: 20.000,00")
-            data_input = st.date_input("Data de Entrada", value=datetime.now(), format="DD/MM/YYYY", key="data_input")
+            data_input = st.date_input("Data de Entrada", value=st.session_state.get("data_input_padrao") or datetime.now(), format="DD/MM/YYYY", key="data_input")
+            ajuste_dias_uteis = st.selectbox("Vencimento em Dia Não Útil", list(AJUSTES_DIAS_UTEIS), key="ajuste_dias_uteis")
             taxa_mensal_str = st.text_input("Taxa de Juros Mensal (%)", value=st.session_state.taxa_mensal, key="taxa_mensal_str", placeholder="Ex: 0,89")
-            modalidade = st.selectbox("Modalidade de Pagamento", ["mensal", "mensal + balão", "só balão anual", "só balão semestral"], key="modalidade")
+            modalidade = st.selectbox("Modalidade de Pagamento", MODALIDADES, key="modalidade")
             tipo_balao, agendamento_baloes, meses_baloes, mes_primeiro_balao = None, "Padrão", [], 12
             if modalidade == "mensal + balão": 
                 tipo_balao = st.selectbox("Período Padrão do Balão:", ["anual", "semestral"], key="tipo_balao")
@@ -530,7 +447,7 @@ def main():
                     meses_baloes = st.multiselect("Selecione os meses dos balões:", options=list(range(1, max_parcelas_seguro + 1)), key="meses_baloes")
                 elif agendamento_baloes == "A partir do 1º Vencimento":
                     valor_padrao_mes = (12 if tipo_balao == 'anual' else 6)
-                    mes_primeiro_balao = st.number_input("Mês de Vencimento do 1º Balão", min_value=1, max_value=max_parcelas_seguro, value=valor_padrao_mes, step=1, key="mes_primeiro_balao")
+                    mes_primeiro_balao = st.number_input("Mês de Vencimento do 1º Balão", min_value=1, max_value=max_parcelas_seguro, value=st.session_state.get("mes_primeiro_balao_padrao") or valor_padrao_mes, step=1, key="mes_primeiro_balao")
             
             elif "anual" in modalidade: tipo_balao = "anual"
             elif "semestral" in modalidade: tipo_balao = "semestral"
@@ -546,14 +463,19 @@ def main():
             valor_balao_str = ""
             if "balão" in modalidade:
                 valor_balao_str = st.text_input("Valor do Balão (R$)", key="valor_balao_str", placeholder="Deixe em branco para cálculo")
-        
+            modalidades_comparacao = st.multiselect("Comparar com outras modalidades", MODALIDADES, key="modalidades_comparacao")
+
         col_b1, col_b2, _ = st.columns([1, 1, 4])
         with col_b1:
             submitted = st.form_submit_button("Calcular")
         with col_b2:
             st.form_submit_button("Reiniciar", on_click=reset_form)
-    
-    if submitted:
+    exibir_entrada_necessaria()
+    exibir_otimizacao_baloes()
+
+    # Mantém os resultados visíveis nas reexecuções (downloads, exportações concluídas)
+    if submitted: st.session_state.exibir_resultados = True
+    if submitted or st.session_state.get("exibir_resultados"):
         try:
             valor_total = parse_currency(valor_total_str)
             entrada = parse_currency(entrada_str)
@@ -563,111 +485,67 @@ def main():
             
             st.session_state.taxa_mensal = taxa_mensal_str
             
-            taxa_mensal_para_calculo = taxa_mensal if not (1 <= (qtd_parcelas or 0) <= 36 and modalidade == 'mensal') else 0.0
             if valor_total <= 0 or entrada < 0 or valor_total <= entrada: st.error("Verifique os valores de 'Total do Imóvel' e 'Entrada'."); return
             
             valor_financiado = round(max(valor_total - entrada, 0), 2)
-            taxas = calcular_taxas(taxa_mensal_para_calculo); modo = determinar_modo_calculo(modalidade)
-            v_p_final, v_b_final = 0.0, 0.0; v_ultima_p, v_ultimo_b = None, None
-            data_entrada = datetime.combine(data_input, datetime.min.time()); dia_vencimento = data_entrada.day
-            
-            if taxa_mensal_para_calculo == 0.0:
-                if modo == 1 and qtd_parcelas > 0:
-                    vp = round(valor_financiado / qtd_parcelas, 2); dif = round((vp * qtd_parcelas) - valor_financiado, 2)
-                    v_p_final = vp; v_ultima_p = vp - dif
-                elif modo in [3, 4] and qtd_baloes > 0:
-                    vb = round(valor_financiado / qtd_baloes, 2); dif = round((vb * qtd_baloes) - valor_financiado, 2)
-                    v_b_final = vb; v_ultimo_b = vb - dif
-                elif modo == 2 and ((qtd_parcelas or 0) > 0 or qtd_baloes > 0):
-                    if valor_parcela > 0 and valor_balao == 0:
-                        v_p_final = valor_parcela
-                        vp_total_parcelas = valor_parcela * (qtd_parcelas or 0)
-                        vp_restante = valor_financiado - vp_total_parcelas
-                        if qtd_baloes > 0 and vp_restante > 0:
-                            vb = round(vp_restante / qtd_baloes, 2)
-                            dif = round((vb * qtd_baloes) - vp_restante, 2)
-                            v_b_final = vb; v_ultimo_b = vb - dif
-                        elif vp_restante < 0:
-                            st.error("O valor total das parcelas excede o valor financiado.")
-                            return
-                    elif valor_balao > 0 and valor_parcela == 0:
-                        v_b_final = valor_balao
-                        vp_total_baloes = valor_balao * qtd_baloes
-                        vp_restante = valor_financiado - vp_total_baloes
-                        if (qtd_parcelas or 0) > 0 and vp_restante > 0:
-                            vp = round(vp_restante / qtd_parcelas, 2)
-                            dif = round((vp * qtd_parcelas) - vp_restante, 2)
-                            v_p_final = vp; v_ultima_p = vp - dif
-                        elif vp_restante < 0:
-                            st.error("O valor total dos balões excede o valor financiado.")
-                            return
-                    else: st.error("No modo 'mensal + balão', informe OU o valor da parcela OU o valor do balão."); return
-            else: # Lógica para planos com juros
-                qtd_p_calc = qtd_parcelas or 0
-                
-                datas_p = [ajustar_data_vencimento(data_entrada, "mensal", i, dia_vencimento) for i in range(1, qtd_p_calc + 1)]
-                datas_b = []
-                if "balão" in modalidade and qtd_baloes > 0:
-                    if agendamento_baloes == "Personalizado (Mês a Mês)":
-                        datas_b = [ajustar_data_vencimento(data_entrada, "mensal", mes, dia_vencimento) for mes in meses_baloes]
-                    elif agendamento_baloes == "A partir do 1º Vencimento":
-                        primeira_data_b = ajustar_data_vencimento(data_entrada, "mensal", mes_primeiro_balao, dia_vencimento)
-                        datas_b = [primeira_data_b]
-                        data_anterior_b = primeira_data_b
-                        for _ in range(1, qtd_baloes):
-                            proxima_data_b = ajustar_data_vencimento(data_anterior_b, tipo_balao, 1, dia_vencimento)
-                            datas_b.append(proxima_data_b)
-                            data_anterior_b = proxima_data_b
-                    else: # Padrão
-                        datas_b = [ajustar_data_vencimento(data_entrada, tipo_balao, i, dia_vencimento) for i in range(1, qtd_baloes + 1)]
-                
-                fator_vp_p = calcular_fator_vp(datas_p, data_entrada, taxas['diaria']) if qtd_p_calc > 0 else 0
-                fator_vp_b = calcular_fator_vp(datas_b, data_entrada, taxas['diaria']) if qtd_baloes > 0 else 0
-                
-                if valor_parcela > 0 and valor_balao == 0:
-                    v_p_final = valor_parcela
-                    vp_restante = max(valor_financiado - (v_p_final * fator_vp_p), 0)
-                    if qtd_baloes > 0:
-                       v_b_final = round(vp_restante / fator_vp_b, 2) if fator_vp_b > 0 else 0
-                elif valor_balao > 0 and valor_parcela == 0:
-                    v_b_final = valor_balao
-                    vp_restante = max(valor_financiado - (v_b_final * fator_vp_b), 0)
-                    if qtd_p_calc > 0:
-                       v_p_final = round(vp_restante / fator_vp_p, 2) if fator_vp_p > 0 else 0
-                elif valor_parcela == 0 and valor_balao == 0:
-                     if modo == 1: v_p_final = round(valor_financiado / fator_vp_p, 2) if fator_vp_p > 0 else 0
-                     elif modo in [3, 4]: v_b_final = round(valor_financiado / fator_vp_b, 2) if fator_vp_b > 0 else 0
-                     else: st.error("Para cálculo automático em modo misto, preencha o valor da Parcela ou do Balão."); return
-                else: # Ambos os valores foram preenchidos
-                    v_p_final = valor_parcela
-                    v_b_final = valor_balao
-
-            cronograma = gerar_cronograma(valor_financiado, v_p_final, v_b_final, (qtd_parcelas or 0), qtd_baloes, modalidade, tipo_balao, data_entrada, taxas, valor_ultima_parcela=v_ultima_p, valor_ultimo_balao=v_ultimo_b, agendamento_baloes=agendamento_baloes, meses_baloes=meses_baloes, mes_primeiro_balao=mes_primeiro_balao)
+            data_entrada = datetime.combine(data_input, datetime.min.time())
+
+            # Uma única chamada ao motor resolve parcela/balão e monta o cronograma (do plano
+            # atual e das modalidades comparadas) com o mesmo vetor de fatores de desconto.
+            plano_atual = {'modalidade': modalidade, 'qtd_parcelas': qtd_parcelas, 'tipo_balao': tipo_balao, 'agendamento_baloes': agendamento_baloes, 'meses_baloes': meses_baloes, 'mes_primeiro_balao': mes_primeiro_balao, 'valor_parcela': valor_parcela, 'valor_balao': valor_balao}
+            outras_modalidades = [m for m in modalidades_comparacao if m != modalidade]
+            planos = [plano_atual] + [{'modalidade': m, 'qtd_parcelas': qtd_parcelas, 'tipo_balao': tipo_balao if m == modalidade == "mensal + balão" else None, 'agendamento_baloes': agendamento_baloes if m == "mensal + balão" else "Padrão", 'meses_baloes': meses_baloes if m == "mensal + balão" else None, 'mes_primeiro_balao': mes_primeiro_balao if m == "mensal + balão" else None, 'valor_parcela': valor_parcela if m == "mensal + balão" else 0.0, 'valor_balao': valor_balao if m == "mensal + balão" else 0.0} for m in outras_modalidades]
+            dias_uteis = AJUSTES_DIAS_UTEIS[ajuste_dias_uteis]
+            if dias_uteis:
+                try: obter_feriados()
+                except (OSError, ValueError) as e: st.error(f"Calendário de feriados inválido: {str(e)}"); return
+            # Quem abre um link compartilhado recebe os resultados gravados (ver "Links de Simulação"); a URL passa a ser o link
+            link = codificar_link({k: st.session_state.get(k) for k in CAMPOS_LINK})
+            chave = chave_simulacao(valor_financiado, data_entrada, taxa_mensal, planos, dias_uteis, versao_politica_taxas(), versao_feriados() if dias_uteis else None)
+            resultados = ler_simulacao(chave) if restaurado else None
+            if resultados is None: resultados = simular_planos(valor_financiado, data_entrada, taxa_mensal, planos, versao_politica=versao_politica_taxas(), dias_uteis=dias_uteis, versao_feriados=versao_feriados() if dias_uteis else None)
+            if resultados[0]['erro']: st.error(resultados[0]['erro']); return
+            if st.query_params.to_dict() != link: st.query_params.from_dict(link); st.session_state.link_simulacao = link['h']
+            taxa_mensal_para_calculo, v_p_final, v_b_final, cronograma = (resultados[0][k] for k in ('taxa_mensal', 'valor_parcela', 'valor_balao', 'cronograma'))
             
             st.subheader("Resultados da Simulação")
             c1, c2, c3, c4 = st.columns(4)
             c1.metric("Valor Financiado", formatar_moeda(valor_financiado)); c2.metric("Taxa Mensal Utilizada", f"{taxa_mensal_para_calculo:.2f}%")
-            if v_p_final > 0: c3.metric("Valor da Parcela", formatar_moeda(v_p_final))
+            if resultados[0]['sistema'] != "price": c3.metric("1ª Parcela", formatar_moeda(v_p_final)); c4.metric("Última Parcela", formatar_moeda(resultados[0]['valor_ultima_parcela']))
+            elif v_p_final > 0: c3.metric("Valor da Parcela", formatar_moeda(v_p_final))
             if v_b_final > 0: c4.metric("Valor do Balão", formatar_moeda(v_b_final))
+            with st.expander("Compartilhar Simulação"):
+                if st.button("Gerar Link", key="compartilhar_simulacao"): gravar_simulacao(chave, resultados); st.session_state.chave_compartilhada = chave
+                if st.session_state.get("chave_compartilhada") == chave: st.code(url_simulacao(link), language=None); st.caption("Quem abrir este link vê o formulário preenchido e os mesmos resultados e arquivos.")
 
             st.subheader("Cronograma de Pagamentos")
             if cronograma:
-                df_cronograma = pd.DataFrame([p for p in cronograma if p['Item'] != 'TOTAL'])
-                df_display = df_cronograma.copy()
-                for col in ['Valor', 'Valor_Presente', 'Desconto_Aplicado']: df_display[col] = df_display[col].apply(lambda x: formatar_moeda(x, simbolo=True))
-                df_display.rename(columns={'Desconto_Aplicado': 'Juros'}, inplace=True)
-                st.dataframe(df_display, use_container_width=True, hide_index=True, column_config={"Data_Vencimento": "Data Venc."})
+                df_display = pd.DataFrame(colunas_cronograma_formatadas([p for p in cronograma if p['Item'] != 'TOTAL'])).rename(columns=COLUNAS_CRONOGRAMA)
+                st.dataframe(df_display, use_container_width=True, hide_index=True)
                 total = next((p for p in cronograma if p['Item'] == 'TOTAL'), None)
                 if total:
-                    c1, c2, c3 = st.columns(3)
+                    c1, c2, c3, c4 = st.columns(4)
                     c1.metric("Valor Total a Pagar", formatar_moeda(total['Valor'])); c2.metric("Valor Presente Total", formatar_moeda(total['Valor_Presente'])); c3.metric("Total de Juros", formatar_moeda(total['Desconto_Aplicado']))
+                    if resultados[0]['cet_anual'] is not None: c4.metric("CET", f"{resultados[0]['cet_anual']:.2f}% a.a.", help=f"Custo Efetivo Total: {resultados[0]['cet_mensal']:.2f}% a.m.")
                     st.subheader("Exportar Resultados")
-                    export_data = {'valor_total': valor_total, 'entrada': entrada, 'taxa_mensal': taxa_mensal_para_calculo, 'valor_financiado': valor_financiado, 'quadra': quadra, 'lote': lote, 'metragem': metragem}
-                    c1_exp, c2_exp = st.columns(2)
-                    pdf_file = gerar_pdf(cronograma, export_data); c1_exp.download_button("Exportar para PDF", pdf_file, "simulacao.pdf", "application/pdf")
-                    excel_file = gerar_excel(cronograma, export_data); c2_exp.download_button("Exportar para Excel", excel_file, "simulacao.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                    export_data = {'valor_total': valor_total, 'entrada': entrada, 'taxa_mensal': taxa_mensal_para_calculo, 'cet_anual': resultados[0]['cet_anual'], 'cet_mensal': resultados[0]['cet_mensal'], 'valor_financiado': valor_financiado, 'quadra': quadra, 'lote': lote, 'metragem': metragem}
+                    exibir_exportacoes([("Exportar para PDF", enviar_exportacao("pdf", cronograma, export_data), "simulacao.pdf"), ("Exportar para Excel", enviar_exportacao("xlsx", cronograma, export_data), "simulacao.xlsx"), ("Relatório HTML", enviar_exportacao("html", cronograma, export_data), "simulacao.html")])
+                    exibir_quitacao(cronograma, taxa_mensal_para_calculo)
+                    exibir_correcao(cronograma, data_entrada)
+
+            if outras_modalidades:
+                st.subheader("Comparativo de Planos")
+                df_comparativo = tabela_comparativa(resultados)
+                for col in ['Valor da Parcela', 'Última Parcela', 'Valor do Balão', 'Valor Total a Pagar', 'Valor Presente Total', 'Total de Juros']: df_comparativo[col] = df_comparativo[col].apply(formatar_moeda)
+                df_comparativo['Taxa Mensal'] = df_comparativo['Taxa Mensal'].apply(lambda x: f"{x:.2f}%")
+                df_comparativo['CET a.a.'] = df_comparativo['CET a.a.'].apply(lambda x: f"{x:.2f}%" if pd.notna(x) else "-")
+                st.dataframe(df_comparativo, use_container_width=True, hide_index=True)
+                export_comparativo = {'valor_total': valor_total, 'entrada': entrada, 'valor_financiado': valor_financiado, 'quadra': quadra, 'lote': lote, 'metragem': metragem}
+                exibir_exportacoes([("Exportar Comparativo (PDF)", enviar_exportacao("comparativo_pdf", resultados, export_comparativo), "comparativo.pdf"), ("Exportar Comparativo (Excel)", enviar_exportacao("comparativo_xlsx", resultados, export_comparativo), "comparativo.xlsx")])
         except Exception as e:
             st.error(f"Ocorreu um erro durante a simulação: {str(e)}. Por favor, verifique os valores inseridos e tente novamente.")
 
+    if catalogo is not None: exibir_tabela_precos(catalogo); exibir_conciliacao()
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,121 @@
+"""
+Teste de carga do simulador: N corretores simultâneos conectados ao mesmo servidor Streamlit,
+como no servidor compartilhado. Cada sessão abre o app e submete o formulário algumas vezes
+pelo mesmo websocket usado pelo navegador; a latência é medida do envio até o fim da
+execução do script no servidor. Informa p50, p95 e máximo da abertura e das simulações.
+
+Uso:
+    python carga.py [--sessoes 100] [--execucoes 3] [--rampa 5] [--pausa 0] [--app app.py] [--porta 8599]
+    python carga.py --url ws://servidor:8501 ...   (servidor já em execução)
+
+A implantação multiusuário é configurada em motor.py por variáveis de ambiente (repassadas ao
+servidor iniciado aqui):
+    SIMULADOR_IMPLANTACAO      'local' (padrão) ou 'compartilhado' (ver PERFIS_IMPLANTACAO)
+    SIMULADOR_LIMITE_CACHE     entradas de cada cache de cálculo compartilhado
+    SIMULADOR_TRABALHADORES    threads do pool de exportação
+    SIMULADOR_PROCESSOS        processos que geram os arquivos (0: nas próprias threads)
+    SIMULADOR_LIMITE_TAREFAS   tarefas de exportação mantidas no registro
+    SIMULADOR_AQUECIMENTO      '0' desliga o aquecimento dos caches na partida (ver 'Aquecimento
+                               dos Caches' em app.py), para medir a abertura com os caches frios
+No servidor compartilhado, rode também com --server.fileWatcherType none (como o servidor
+iniciado aqui): o observador de arquivos é criado por sessão e pesa na abertura do app.
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+# Poucos lotes e prazos, como no uso real: muitos corretores simulam as mesmas combinações
+VALORES_TOTAIS = ["150.000,00", "182.500,00", "210.000,00", "98.750,50", "265.000,00"]
+ENTRADAS = ["10.000,00", "15.000,00", "20.000,00"]
+PRAZOS = [24, 36, 60, 120, 180]
+
+async def executar_script(ws, widgets=None, pagina=""):
+    """
+    Pede uma execução do script e espera o fim dela. Retorna (latência em s, widgets por
+    rótulo, hash da página, exceções mostradas pelo app).
+    """
+    mensagem = BackMsg(); mensagem.rerun_script.page_script_hash = pagina
+    if widgets: mensagem.rerun_script.widget_states.widgets.extend(widgets)
+    inicio = time.perf_counter(); await ws.send(mensagem.SerializeToString())
+    elementos, excecoes = {}, []
+    while True:
+        resposta = ForwardMsg(); resposta.ParseFromString(await ws.recv()); tipo = resposta.WhichOneof("type")
+        if tipo == "new_session": pagina = resposta.new_session.page_script_hash
+        elif tipo == "delta" and resposta.delta.WhichOneof("type") == "new_element":
+            elemento = resposta.delta.new_element; nome = elemento.WhichOneof("type"); widget = getattr(elemento, nome)
+            if nome == "exception": excecoes.append(widget.message)
+            elif hasattr(widget, "id") and hasattr(widget, "label"): elementos[widget.label] = widget.id
+        elif tipo == "script_finished": return time.perf_counter() - inicio, elementos, pagina, excecoes
+
+async def simular_corretor(url, execucoes, semente, inicio_ate, pausa):
+    """
+    Uma sessão: abre o app e calcula `execucoes` simulações. Retorna (abertura, [simulações]).
+    """
+    sorteio = random.Random(semente)
+    await asyncio.sleep(sorteio.uniform(0, inicio_ate))
+    origem = url.replace("ws://", "http://").replace("wss://", "https://")
+    async with websockets.connect(f"{url}/_stcore/stream", subprotocols=["streamlit"], origin=origem, max_size=None, open_timeout=60) as ws:
+        abertura, ids, pagina, excecoes = await executar_script(ws)
+        simulacoes = []
+        for _ in range(execucoes):
+            await asyncio.sleep(sorteio.uniform(0, pausa))
+            widgets = [WidgetState(id=ids["Valor Total do Imóvel (R$)"], string_value=sorteio.choice(VALORES_TOTAIS)),
+                       WidgetState(id=ids["Entrada (R$)"], string_value=sorteio.choice(ENTRADAS)),
+                       WidgetState(id=ids["Quantidade de Parcelas"], int_value=sorteio.choice(PRAZOS)),
+                       WidgetState(id=ids["Calcular"], trigger_value=True)]
+            latencia, _, pagina, novas = await executar_script(ws, widgets, pagina)
+            simulacoes.append(latencia); excecoes += novas
+        if excecoes: raise RuntimeError(f"Erro no app: {excecoes[0]}")
+        return abertura, simulacoes
+
+def iniciar_servidor(caminho_app, porta):
+    processo = subprocess.Popen([sys.executable, "-m", "streamlit", "run", caminho_app, "--server.headless", "true", "--server.port", str(porta), "--server.fileWatcherType", "none"],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(120):
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{porta}/_stcore/health", timeout=1): return processo
+        except OSError: time.sleep(0.5)
+    processo.terminate(); raise RuntimeError("O servidor Streamlit não respondeu.")
+
+def resumir(rotulo, latencias):
+    if not latencias: return
+    latencias = np.asarray(latencias) * 1000
+    print(f"{rotulo}: {len(latencias)} execuções | p50 {np.percentile(latencias, 50):.0f} ms | p95 {np.percentile(latencias, 95):.0f} ms | máx {latencias.max():.0f} ms")
+
+async def executar_carga(url, sessoes, execucoes, inicio_ate, pausa):
+    return await asyncio.gather(*(simular_corretor(url, execucoes, i, inicio_ate, pausa) for i in range(sessoes)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessoes", type=int, default=100)
+    parser.add_argument("--execucoes", type=int, default=3)
+    parser.add_argument("--rampa", type=float, default=5.0, help="segundos para todas as sessões conectarem")
+    parser.add_argument("--pausa", type=float, default=0.0, help="pausa máxima (s) do corretor antes de cada simulação")
+    parser.add_argument("--app", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py"))
+    parser.add_argument("--porta", type=int, default=8599)
+    parser.add_argument("--url", help="servidor já em execução (ex.: ws://127.0.0.1:8501)")
+    args = parser.parse_args()
+
+    servidor = None if args.url else iniciar_servidor(args.app, args.porta)
+    try:
+        inicio = time.perf_counter()
+        resultados = asyncio.run(executar_carga(args.url or f"ws://127.0.0.1:{args.porta}", args.sessoes, args.execucoes, args.rampa, args.pausa))
+        print(f"{args.sessoes} sessões x {args.execucoes} simulações em {time.perf_counter() - inicio:.1f} s")
+        resumir("abertura do app", [abertura for abertura, _ in resultados])
+        resumir("simulação (Calcular)", [latencia for _, simulacoes in resultados for latencia in simulacoes])
+    finally:
+        if servidor: servidor.terminate(); servidor.wait()
+
+if __name__ == "__main__":
+    main()
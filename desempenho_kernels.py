@@ -0,0 +1,72 @@
+"""
+Mede os kernels numéricos do simulador (ver "Kernels Numéricos" em motor.py): a versão NumPy
+e a compilada com o Numba, nas cargas de carteira, grades de sensibilidade e Monte Carlo.
+Para cada kernel informa o melhor tempo das repetições, o ganho e a maior diferença entre as
+duas versões (os valores arredondados a centavos devem coincidir).
+
+Uso:
+    python desempenho_kernels.py [--contratos 20000] [--parcelas 240] [--datas 2000] [--repeticoes 5]
+
+Sem o Numba instalado, mede só a versão NumPy. No app os kernels compilados só são usados com
+SIMULADOR_JIT=1; as potências não têm versão compilada (ver "Kernels Numéricos").
+"""
+import argparse
+import time
+
+import numpy as np
+
+import motor
+
+def melhor_tempo(funcao, argumentos, repeticoes):
+    funcao(*argumentos) # aquecimento (compilação)
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter(); resultado = funcao(*argumentos); tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+def em_lote_de_datas(kernel):
+    """Aplica o kernel de calendário a cada data de entrada (um calendário por data)."""
+    return lambda entradas, meses: np.stack([kernel(ano, mes, dia, meses) for ano, mes, dia in entradas])
+
+def cargas(contratos, parcelas, datas, sorteio):
+    """
+    Argumentos de cada kernel: potências de uma carteira inteira (uma taxa por item), calendários
+    de `datas` datas de entrada e saldo devedor de `contratos` contratos.
+    """
+    dias = np.sort(sorteio.integers(0, parcelas * 31, size=(contratos, parcelas)), axis=1).astype(float)
+    taxas = np.repeat(sorteio.uniform(0, 0.0006, size=contratos), parcelas)
+    entradas = [(int(a), int(m), int(d)) for a, m, d in zip(sorteio.integers(2000, 2040, datas), sorteio.integers(1, 13, datas), sorteio.integers(1, 29, datas))]
+    crescimento = np.power(1 + taxas.reshape(contratos, parcelas), dias)
+    valores = np.round(sorteio.uniform(500, 5000, size=(contratos, parcelas)), 2)
+    saldo_inicial = (valores / crescimento).sum(axis=1)[:, None]
+    return {
+        'potencias': ((dias.ravel(), taxas), f"{contratos * parcelas:,} vencimentos"),
+        'dias_calendario': ((entradas, parcelas), f"{datas:,} datas x {parcelas} meses"),
+        'saldo': ((valores, crescimento, saldo_inicial), f"{contratos:,} contratos x {parcelas} pagamentos"),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--contratos", type=int, default=20000)
+    parser.add_argument("--parcelas", type=int, default=240)
+    parser.add_argument("--datas", type=int, default=2000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    compilados = motor.compilar_kernels()
+    if compilados is None: print("Numba não instalado: medindo só a versão NumPy.")
+    for nome, (argumentos, descricao) in cargas(args.contratos, args.parcelas, args.datas, np.random.default_rng(0)).items():
+        versoes = {'numpy': motor.KERNELS_NUMPY[nome], 'numba': compilados[nome] if compilados else None}
+        if nome == 'dias_calendario': versoes = {rotulo: em_lote_de_datas(kernel) if kernel else None for rotulo, kernel in versoes.items()}
+        tempo_numpy, referencia = melhor_tempo(versoes['numpy'], argumentos, args.repeticoes)
+        linha = f"{nome:<16} {descricao:<34} numpy {tempo_numpy * 1000:9.1f} ms"
+        if compilados and compilados[nome] is motor.KERNELS_NUMPY[nome]: linha += " | numba não usado (o NumPy é mais rápido)"
+        elif versoes['numba']:
+            tempo_numba, resultado = melhor_tempo(versoes['numba'], argumentos, args.repeticoes)
+            diferenca = float(np.max(np.abs(resultado - referencia))) if referencia.size else 0.0
+            centavos = np.array_equal(np.round(resultado, 2), np.round(referencia, 2))
+            linha += f" | numba {tempo_numba * 1000:9.1f} ms | {tempo_numpy / tempo_numba:5.1f}x | dif. máx. {diferenca:.2e} | centavos {'iguais' if centavos else 'DIFERENTES'}"
+        print(linha)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Arquivos exportados pelo simulador (PDF, Excel e relatório HTML) e a fila que os gera em
+segundo plano, em threads ou em processos separados. Não desenha nada: o app só agenda
+(`enviar_exportacao`), consulta (`status_exportacao`) e lê (`ler_exportacao`) as tarefas.
+Como é um módulo importável, inicializador e gerador dos processos são referenciados daqui
+mesmo pelo pickle, sem reexecutar o script do app.
+"""
+import streamlit as st
+from math import ceil
+from io import BytesIO
+import os
+import json
+import time
+import hashlib
+import html
+import base64
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+from fpdf import FPDF
+
+from motor import DIRETORIO_APP, LIMITE_TAREFAS_EXPORTACAO, PROCESSOS_EXPORTACAO, TRABALHADORES_EXPORTACAO, formatar_moeda, formatar_moedas, tabela_comparativa
+from tema import load_logo
+
+# --- Exportação de Arquivos ---
+def escrever_cabecalho_pdf(pdf, dados):
+    pdf.set_font("Arial", 'B', 14)
+    pdf.cell(200, 10, txt="Informações do Imóvel", ln=1, align='L'); pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=f"Quadra: {dados.get('quadra', 'N/I')}", ln=1); pdf.cell(200, 10, txt=f"Lote: {dados.get('lote', 'N/I')}", ln=1); pdf.cell(200, 10, txt=f"Metragem: {dados.get('metragem', 'N/I')} m²", ln=1)
+    pdf.ln(5); pdf.set_font("Arial", 'B', 14)
+    pdf.cell(200, 10, txt="Simulação de Financiamento", ln=1, align='L'); pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=f"Valor Total do Imóvel: {formatar_moeda(dados['valor_total'])}", ln=1); pdf.cell(200, 10, txt=f"Entrada: {formatar_moeda(dados['entrada'])}", ln=1); pdf.cell(200, 10, txt=f"Valor Financiado: {formatar_moeda(dados['valor_financiado'])}", ln=1)
+    if dados.get('taxa_mensal') is not None: pdf.cell(200, 10, txt=f"Taxa Mensal Utilizada: {dados['taxa_mensal']:.2f}%", ln=1)
+    if dados.get('cet_anual') is not None: pdf.cell(200, 10, txt=f"CET: {dados['cet_anual']:.2f}% a.a. ({dados['cet_mensal']:.2f}% a.m.)", ln=1)
+
+def escrever_tabela_cronograma_pdf(pdf, cronograma, progresso=None):
+    pdf.set_font("Arial", 'B', 12)
+    colunas = ["Item", "Tipo", "Data Venc.", "Valor", "Valor Presente", "Juros"]; larguras = [30, 25, 30, 35, 35, 35]
+    for col, larg in zip(colunas, larguras): pdf.cell(larg, 10, txt=col, border=1, align='C')
+    pdf.ln(); pdf.set_font("Arial", size=10)
+    cronograma_sem_total = [p for p in cronograma if p['Item'] != 'TOTAL']
+    for i, item in enumerate(cronograma_sem_total, start=1):
+        if progresso and i % 25 == 0: progresso(i / len(cronograma_sem_total))
+        pdf.cell(larguras[0], 8, txt=item['Item'], border=1); pdf.cell(larguras[1], 8, txt=item['Tipo'], border=1); pdf.cell(larguras[2], 8, txt=item['Data_Vencimento'], border=1)
+        pdf.cell(larguras[3], 8, txt=formatar_moeda(item['Valor'], simbolo=False), border=1, align='R'); pdf.cell(larguras[4], 8, txt=formatar_moeda(item['Valor_Presente'], simbolo=False), border=1, align='R'); pdf.cell(larguras[5], 8, txt=formatar_moeda(item['Desconto_Aplicado'], simbolo=False), border=1, align='R'); pdf.ln()
+    total = next((p for p in cronograma if p['Item'] == 'TOTAL'), None)
+    if total:
+        pdf.set_font("Arial", 'B', 10); pdf.cell(sum(larguras[:3]), 10, txt="TOTAL", border=1, align='R')
+        pdf.cell(larguras[3], 10, txt=formatar_moeda(total['Valor'], simbolo=False), border=1, align='R'); pdf.cell(larguras[4], 10, txt=formatar_moeda(total['Valor_Presente'], simbolo=False), border=1, align='R'); pdf.cell(larguras[5], 10, txt=formatar_moeda(total['Desconto_Aplicado'], simbolo=False), border=1, align='R')
+
+def gerar_pdf(cronograma, dados, progresso=None):
+    pdf = FPDF(); pdf.add_page()
+    escrever_cabecalho_pdf(pdf, dados)
+    pdf.ln(10); escrever_tabela_cronograma_pdf(pdf, cronograma, progresso)
+    return BytesIO(pdf.output())
+
+def gerar_excel(cronograma, dados, progresso=None):
+    output = BytesIO()
+    info_df = pd.DataFrame({'Campo': ['Quadra', 'Lote', 'Metragem', 'Valor Total do Imóvel', 'Entrada', 'Valor Financiado', 'Taxa Mensal Utilizada'], 'Valor': [dados.get('quadra', 'N/I'), dados.get('lote', 'N/I'), f"{dados.get('metragem', 'N/I')} m²", formatar_moeda(dados.get('valor_total', 0)), formatar_moeda(dados.get('entrada', 0)), formatar_moeda(dados.get('valor_financiado', 0)), f"{dados.get('taxa_mensal', 0):.2f}%"]})
+    if dados.get('cet_anual') is not None: info_df.loc[len(info_df)] = ['CET', f"{dados['cet_anual']:.2f}% a.a. ({dados['cet_mensal']:.2f}% a.m.)"]
+    df_cronograma_data = pd.DataFrame([p for p in cronograma if p['Item'] != 'TOTAL'])
+    df_cronograma_data.rename(columns={'Desconto_Aplicado': 'Juros'}, inplace=True)
+    total_row = next((p for p in cronograma if p['Item'] == 'TOTAL'), None)
+    if total_row:
+        total_row['Desconto_Aplicado'] = total_row.pop('Juros', total_row.get('Desconto_Aplicado'))
+
+    df_final = pd.concat([df_cronograma_data, pd.DataFrame([total_row])], ignore_index=True) if total_row else df_cronograma_data
+    df_export = df_final[['Item', 'Tipo', 'Data_Vencimento', 'Valor', 'Valor_Presente', 'Juros', 'Juros_Periodo', 'Amortizacao', 'Saldo_Devedor']]
+    if progresso: progresso(0.5)
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        info_df.to_excel(writer, sheet_name='Informações da Simulação', index=False)
+        df_export.to_excel(writer, sheet_name='Cronograma de Pagamentos', index=False)
+    output.seek(0); return output
+
+COLUNAS_CRONOGRAMA = {'Item': 'Item', 'Tipo': 'Tipo', 'Data_Vencimento': 'Data Venc.', 'Dias': 'Dias', 'Valor': 'Valor', 'Valor_Presente': 'Valor Presente', 'Desconto_Aplicado': 'Juros', 'Juros_Periodo': 'Juros do Período', 'Amortizacao': 'Amortização', 'Saldo_Devedor': 'Saldo Devedor'}
+COLUNAS_MONETARIAS = ['Valor', 'Valor_Presente', 'Desconto_Aplicado', 'Juros_Periodo', 'Amortizacao', 'Saldo_Devedor']
+
+def colunas_cronograma_formatadas(itens, simbolo=True):
+    """
+    Extrai as colunas de COLUNAS_CRONOGRAMA dos itens do cronograma e formata as monetárias
+    coluna a coluna (ver `formatar_moedas`). Retorna um dict coluna -> lista de textos.
+    """
+    colunas = {col: [p.get(col, "") for p in itens] for col in COLUNAS_CRONOGRAMA}
+    for col in COLUNAS_MONETARIAS: colunas[col] = formatar_moedas(colunas[col], simbolo)
+    return colunas
+
+def gerar_html_relatorio(cronograma, dados, progresso=None, itens_por_pagina=60):
+    """
+    Relatório estático em HTML (CSS e logo embutidos, sem JavaScript) com o cronograma já
+    formatado e paginado. Não depende de sessão do Streamlit: o arquivo pode ser servido por
+    qualquer servidor estático ou enviado por e-mail.
+    """
+    itens = [p for p in cronograma if p['Item'] != 'TOTAL']; total = next((p for p in cronograma if p['Item'] == 'TOTAL'), None)
+    colunas = colunas_cronograma_formatadas(itens + ([total] if total else []), simbolo=False)
+    linhas = ["<tr>" + "".join(f'<td class="{"num" if col in COLUNAS_MONETARIAS else "txt"}">{html.escape(str(colunas[col][i]))}</td>' for col in COLUNAS_CRONOGRAMA) + "</tr>" for i in range(len(itens) + (1 if total else 0))]
+    if total: linhas[-1] = linhas[-1].replace("<tr>", '<tr class="total">', 1)
+    cabecalho = "<thead><tr>" + "".join(f"<th>{html.escape(titulo)}</th>" for titulo in COLUNAS_CRONOGRAMA.values()) + "</tr></thead>"
+    qtd_paginas = max(ceil(len(linhas) / itens_por_pagina), 1); paginas = []
+    for n in range(qtd_paginas):
+        if progresso: progresso((n + 1) / (qtd_paginas + 1))
+        corpo = "".join(linhas[n * itens_por_pagina:(n + 1) * itens_por_pagina])
+        paginas.append(f'<section class="pagina" id="p{n + 1}"><table>{cabecalho}<tbody>{corpo}</tbody></table><p class="rodape">Página {n + 1} de {qtd_paginas}</p></section>')
+
+    logo = load_logo()
+    campos = [("Quadra", dados.get('quadra') or 'N/I'), ("Lote", dados.get('lote') or 'N/I'), ("Metragem", f"{dados.get('metragem') or 'N/I'} m²"), ("Valor Total do Imóvel", formatar_moeda(dados.get('valor_total', 0))), ("Entrada", formatar_moeda(dados.get('entrada', 0))), ("Valor Financiado", formatar_moeda(dados.get('valor_financiado', 0)))]
+    if dados.get('taxa_mensal') is not None: campos.append(("Taxa Mensal Utilizada", f"{dados['taxa_mensal']:.2f}%"))
+    if dados.get('cet_anual') is not None: campos.append(("CET", f"{dados['cet_anual']:.2f}% a.a. ({dados['cet_mensal']:.2f}% a.m.)"))
+    resumo = "".join(f"<dt>{html.escape(rotulo)}</dt><dd>{html.escape(str(valor))}</dd>" for rotulo, valor in campos)
+    navegacao = " ".join(f'<a href="#p{n + 1}">{n + 1}</a>' for n in range(qtd_paginas)) if qtd_paginas > 1 else ""
+    documento = f"""<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8"><title>Simulação de Financiamento</title>
+<style>
+body{{font-family:Arial,Helvetica,sans-serif;color:#222;margin:24px}} header{{display:flex;align-items:center;gap:24px}}
+header img{{height:60px;background:#1E1E1E;padding:8px;border-radius:4px}} dl{{display:grid;grid-template-columns:max-content auto;gap:4px 16px}} dt{{font-weight:bold}} dd{{margin:0}}
+table{{border-collapse:collapse;width:100%;font-size:12px}} th,td{{border:1px solid #999;padding:3px 6px}} th{{background:#4D6BFE;color:#fff}}
+td.num{{text-align:right;white-space:nowrap}} tr.total td{{font-weight:bold;background:#eee}} .rodape{{text-align:right;font-size:11px;color:#666}} nav a{{margin-right:6px}}
+@media print{{nav{{display:none}} .pagina{{page-break-after:always}} .pagina:last-child{{page-break-after:auto}}}}
+</style></head><body>
+<header>{f'<img alt="logo" src="data:image/png;base64,{base64.b64encode(logo).decode()}">' if logo else ''}<h1>Simulação de Financiamento</h1></header>
+<dl>{resumo}</dl>
+<nav>{navegacao}</nav>
+{"".join(paginas)}
+</body></html>"""
+    return BytesIO(documento.encode("utf-8"))
+
+def gerar_pdf_comparativo(resultados, dados, progresso=None):
+    pdf = FPDF(); pdf.add_page()
+    escrever_cabecalho_pdf(pdf, {**dados, 'taxa_mensal': None})
+    pdf.ln(10); pdf.set_font("Arial", 'B', 14)
+    pdf.cell(200, 10, txt="Comparativo de Planos", ln=1, align='L'); pdf.set_font("Arial", 'B', 9)
+    colunas = ["Modalidade", "Taxa", "Parcela", "Balão", "Total a Pagar", "Valor Presente"]; larguras = [45, 15, 45, 25, 30, 30]
+    for col, larg in zip(colunas, larguras): pdf.cell(larg, 10, txt=col, border=1, align='C')
+    pdf.ln(); pdf.set_font("Arial", size=9)
+    for _, linha in tabela_comparativa(resultados).iterrows():
+        pdf.cell(larguras[0], 8, txt=linha['Modalidade'], border=1); pdf.cell(larguras[1], 8, txt=f"{linha['Taxa Mensal']:.2f}%", border=1, align='R')
+        ultima = f" a {formatar_moeda(linha['Última Parcela'], simbolo=False)}" if round(linha['Última Parcela'] - linha['Valor da Parcela'], 2) else ""
+        pdf.cell(larguras[2], 8, txt=f"{linha['Parcelas']}x {formatar_moeda(linha['Valor da Parcela'], simbolo=False)}{ultima}" if linha['Valor da Parcela'] else "-", border=1, align='R')
+        pdf.cell(larguras[3], 8, txt=f"{linha['Balões']}x {formatar_moeda(linha['Valor do Balão'], simbolo=False)}" if linha['Valor do Balão'] else "-", border=1, align='R')
+        pdf.cell(larguras[4], 8, txt=formatar_moeda(linha['Valor Total a Pagar'], simbolo=False), border=1, align='R'); pdf.cell(larguras[5], 8, txt=formatar_moeda(linha['Valor Presente Total'], simbolo=False), border=1, align='R'); pdf.ln()
+    for i, r in enumerate(resultados, start=1):
+        if progresso: progresso(i / (len(resultados) + 1))
+        if not r['cronograma']: continue
+        pdf.add_page(); pdf.set_font("Arial", 'B', 14)
+        pdf.cell(200, 10, txt=f"Cronograma - {r['modalidade']} (Taxa {r['taxa_mensal']:.2f}%)", ln=1, align='L')
+        escrever_tabela_cronograma_pdf(pdf, r['cronograma'])
+    return BytesIO(pdf.output())
+
+def gerar_excel_comparativo(resultados, dados, progresso=None):
+    output = BytesIO()
+    info_df = pd.DataFrame({'Campo': ['Quadra', 'Lote', 'Metragem', 'Valor Total do Imóvel', 'Entrada', 'Valor Financiado'], 'Valor': [dados.get('quadra', 'N/I'), dados.get('lote', 'N/I'), f"{dados.get('metragem', 'N/I')} m²", formatar_moeda(dados.get('valor_total', 0)), formatar_moeda(dados.get('entrada', 0)), formatar_moeda(dados.get('valor_financiado', 0))]})
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        info_df.to_excel(writer, sheet_name='Informações da Simulação', index=False)
+        tabela_comparativa(resultados).to_excel(writer, sheet_name='Comparativo', index=False)
+        for i, r in enumerate(resultados, start=1):
+            if progresso: progresso(i / (len(resultados) + 1))
+            if not r['cronograma']: continue
+            df = pd.DataFrame(r['cronograma']).rename(columns={'Desconto_Aplicado': 'Juros'})
+            df[['Item', 'Tipo', 'Data_Vencimento', 'Valor', 'Valor_Presente', 'Juros', 'Juros_Periodo', 'Amortizacao', 'Saldo_Devedor']].to_excel(writer, sheet_name=f"{i} - {r['modalidade']}"[:31], index=False)
+    output.seek(0); return output
+
+def gerar_excel_tabela_precos(registros, dados, progresso=None):
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        pd.DataFrame(registros).to_excel(writer, sheet_name='Tabela de Preços', index=False)
+        pd.DataFrame({'Campo': list(dados.keys()), 'Valor': [str(v) for v in dados.values()]}).to_excel(writer, sheet_name='Parâmetros', index=False)
+    output.seek(0); return output
+
+def gerar_excel_conciliacao(conteudo, dados, progresso=None):
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        pd.DataFrame(conteudo['resumo']).to_excel(writer, sheet_name='Resumo por Contrato', index=False)
+        if progresso: progresso(0.5)
+        pd.DataFrame(conteudo['nao_identificados'], columns=['Contrato', 'Data_Vencimento', 'Data_Pagamento', 'Valor_Pago']).to_excel(writer, sheet_name='Não Identificados', index=False)
+        pd.DataFrame({'Campo': list(dados.keys()), 'Valor': [str(v) for v in dados.values()]}).to_excel(writer, sheet_name='Parâmetros', index=False)
+    output.seek(0); return output
+
+# --- Exportação em Segundo Plano ---
+DIRETORIO_EXPORTACOES = os.path.join(DIRETORIO_APP, ".exportacoes")
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+FORMATOS_EXPORTACAO = {
+    "pdf": (gerar_pdf, "pdf", "application/pdf"),
+    "xlsx": (gerar_excel, "xlsx", MIME_XLSX),
+    "html": (gerar_html_relatorio, "html", "text/html"),
+    "comparativo_pdf": (gerar_pdf_comparativo, "pdf", "application/pdf"),
+    "comparativo_xlsx": (gerar_excel_comparativo, "xlsx", MIME_XLSX),
+    "tabela_precos": (gerar_excel_tabela_precos, "xlsx", MIME_XLSX),
+    "conciliacao": (gerar_excel_conciliacao, "xlsx", MIME_XLSX),
+}
+
+@st.cache_resource
+def obter_fila_exportacoes(max_workers=TRABALHADORES_EXPORTACAO, dias_retencao=7):
+    """
+    Cria, uma vez por processo, o pool de threads das exportações e o registro de tarefas
+    compartilhado entre as sessões. Arquivos antigos do cache em disco são removidos aqui.
+    """
+    os.makedirs(DIRETORIO_EXPORTACOES, exist_ok=True)
+    limite = time.time() - dias_retencao * 86400
+    for nome in os.listdir(DIRETORIO_EXPORTACOES):
+        caminho = os.path.join(DIRETORIO_EXPORTACOES, nome)
+        if os.path.getmtime(caminho) < limite: os.remove(caminho)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="exportacao"), {}, threading.Lock()
+
+@st.cache_resource
+def obter_processos_exportacao(max_workers=PROCESSOS_EXPORTACAO):
+    """
+    Pool de processos das exportações (None se PROCESSOS_EXPORTACAO for 0), criado uma vez
+    por processo. Os processos devolvem o progresso por uma fila, lida por uma thread que
+    atualiza o registro de tarefas (sempre sob a trava do registro).
+    """
+    if max_workers <= 0: return None
+    _, tarefas, trava = obter_fila_exportacoes(); contexto = multiprocessing.get_context("spawn"); fila = contexto.Queue()
+    def acompanhar_progresso():
+        while True:
+            job_id, fracao = fila.get()
+            atualizar_progresso(tarefas, trava, job_id, fracao)
+    threading.Thread(target=acompanhar_progresso, name="progresso_exportacao", daemon=True).start()
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=contexto, initializer=iniciar_processo_exportacao, initargs=(fila,))
+
+def atualizar_progresso(tarefas, trava, job_id, fracao):
+    with trava:
+        if tarefas.get(job_id, {}).get('status') == 'executando': tarefas[job_id]['progresso'] = min(max(fracao, 0.0), 0.99)
+
+FILA_PROGRESSO = None
+
+def iniciar_processo_exportacao(fila):
+    global FILA_PROGRESSO
+    FILA_PROGRESSO = fila
+
+def gerar_exportacao_em_processo(job_id, formato, conteudo, dados):
+    """
+    Executa, dentro de um processo do pool, o gerador de FORMATOS_EXPORTACAO e devolve os bytes.
+    """
+    return FORMATOS_EXPORTACAO[formato][0](conteudo, dados, progresso=lambda fracao: FILA_PROGRESSO.put((job_id, fracao))).getvalue()
+
+def executar_exportacao(job_id, formato, conteudo, dados, processos=None):
+    _, tarefas, trava = obter_fila_exportacoes()
+    gerador, extensao, _ = FORMATOS_EXPORTACAO[formato]
+    with trava: tarefas[job_id]['status'] = 'executando'
+    try:
+        if processos: arquivo = BytesIO(processos.submit(gerar_exportacao_em_processo, job_id, formato, conteudo, dados).result())
+        else: arquivo = gerador(conteudo, dados, progresso=lambda fracao: atualizar_progresso(tarefas, trava, job_id, fracao))
+        if not arquivo.getbuffer().nbytes: raise ValueError("o arquivo gerado está vazio")
+        caminho = os.path.join(DIRETORIO_EXPORTACOES, f"{job_id}.{extensao}")
+        with open(caminho + ".tmp", "wb") as f: f.write(arquivo.getvalue())
+        os.replace(caminho + ".tmp", caminho)
+        with trava: tarefas[job_id].update({'status': 'concluido', 'progresso': 1.0, 'caminho': caminho})
+    except Exception as e:
+        with trava: tarefas[job_id].update({'status': 'erro', 'erro': str(e)})
+
+def enviar_exportacao(formato, conteudo, dados):
+    """
+    Agenda a geração de um arquivo (ver FORMATOS_EXPORTACAO) e retorna o id da tarefa.
+    O id é o hash do conteúdo: a mesma simulação reaproveita o arquivo já gerado em disco.
+    """
+    executor, tarefas, trava = obter_fila_exportacoes()
+    _, extensao, mime = FORMATOS_EXPORTACAO[formato]
+    job_id = hashlib.sha256(json.dumps([formato, conteudo, dados], sort_keys=True, default=str).encode()).hexdigest()[:20]
+    caminho = os.path.join(DIRETORIO_EXPORTACOES, f"{job_id}.{extensao}")
+    with trava:
+        if job_id in tarefas and tarefas[job_id]['status'] != 'erro': return job_id
+        # Registro limitado: descarta as tarefas encerradas mais antigas (o arquivo continua em disco)
+        encerradas = [j for j, t in tarefas.items() if t['status'] in ('concluido', 'erro')]
+        for antiga in encerradas[:max(len(tarefas) + 1 - LIMITE_TAREFAS_EXPORTACAO, 0)]: del tarefas[antiga]
+        if os.path.exists(caminho):
+            tarefas[job_id] = {'status': 'concluido', 'progresso': 1.0, 'caminho': caminho, 'mime': mime, 'erro': None}
+            return job_id
+        tarefas[job_id] = {'status': 'pendente', 'progresso': 0.0, 'caminho': None, 'mime': mime, 'erro': None}
+    executor.submit(executar_exportacao, job_id, formato, conteudo, dados, obter_processos_exportacao())
+    return job_id
+
+def status_exportacao(job_id):
+    _, tarefas, trava = obter_fila_exportacoes()
+    with trava: return dict(tarefas.get(job_id, {'status': 'erro', 'progresso': 0.0, 'caminho': None, 'mime': None, 'erro': "tarefa desconhecida"}))
+
+def ler_exportacao(job_id):
+    with open(status_exportacao(job_id)['caminho'], "rb") as f: return f.read()
@@ -0,0 +1,1414 @@
+"""
+Motor de cálculo do simulador, compartilhado por app.py e app2.py: parsers e formatação,
+calendário, política de taxas, resolução de parcelas/balões, cronogramas, CET, quitação,
+correção, conciliação, catálogo de lotes e cronogramas em formato binário.
+Não desenha nada nem configura a página: do Streamlit usa apenas os decoradores de cache,
+então pode ser importado pelos dois apps, por scripts e pelos testes sem efeitos colaterais.
+"""
+import streamlit as st
+from datetime import datetime, timedelta
+from math import ceil, floor
+from io import BytesIO
+import os
+import re
+import json
+import shutil
+import importlib
+import tempfile
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# --- Implantação Multiusuário ---
+# No servidor compartilhado as sessões de todos os corretores rodam no mesmo processo: os
+# caches de cálculo são comuns a todas elas e limitados em número de entradas, e as
+# exportações vão para um único pool. No perfil 'compartilhado' (SIMULADOR_IMPLANTACAO) os
+# arquivos são gerados em processos separados, para que PDF/Excel não disputem o GIL com as
+# reexecuções do script. Cada limite pode ser ajustado pela sua variável de ambiente;
+# carga.py mede a latência do app com N sessões simultâneas.
+PERFIS_IMPLANTACAO = {
+    "local": {"limite_cache": 256, "trabalhadores": 2, "processos": 0, "limite_tarefas": 500},
+    "compartilhado": {"limite_cache": 1024, "trabalhadores": 4, "processos": max((os.cpu_count() or 2) - 1, 1), "limite_tarefas": 2000},
+}
+IMPLANTACAO = PERFIS_IMPLANTACAO[os.environ.get("SIMULADOR_IMPLANTACAO", "local")]
+LIMITE_CACHE_CALCULO = int(os.environ.get("SIMULADOR_LIMITE_CACHE", IMPLANTACAO['limite_cache']))
+TRABALHADORES_EXPORTACAO = int(os.environ.get("SIMULADOR_TRABALHADORES", IMPLANTACAO['trabalhadores']))
+PROCESSOS_EXPORTACAO = int(os.environ.get("SIMULADOR_PROCESSOS", IMPLANTACAO['processos']))
+LIMITE_TAREFAS_EXPORTACAO = int(os.environ.get("SIMULADOR_LIMITE_TAREFAS", IMPLANTACAO['limite_tarefas']))
+
+DIRETORIO_APP = os.path.dirname(os.path.abspath(__file__))
+
+# --- Funções de Cálculo Financeiro ---
+
+def parse_currency(value_str: str) -> float:
+    """
+    Converte uma string de valor monetário para float.
+    Aceita formatos como "R$ 150.000,50", "150.000,50", "150000,50", etc.
+    """
+    if not isinstance(value_str, str) or not value_str.strip():
+        return 0.0
+    try:
+        # Remove símbolos de moeda, espaços e pontos de milhar
+        cleaned_value = re.sub(r'[R$\s\.]', '', value_str.strip())
+        # Substitui vírgula decimal por ponto
+        cleaned_value = cleaned_value.replace(',', '.')
+        return float(cleaned_value)
+    except (ValueError, TypeError):
+        return 0.0
+
+def parse_percentage(percent_str: str) -> float:
+    """
+    Converte uma string de porcentagem para float.
+    Aceita formatos como "0,89%", "0.89%", "0,89", etc.
+    """
+    if not isinstance(percent_str, str) or not percent_str.strip():
+        return 0.0
+    try:
+        # Remove símbolos de porcentagem e espaços
+        cleaned_value = re.sub(r'[%\s]', '', percent_str.strip())
+        # Substitui vírgula decimal por ponto
+        cleaned_value = cleaned_value.replace(',', '.')
+        return float(cleaned_value)
+    except (ValueError, TypeError):
+        return 0.0
+
+NUMERO_VALIDO = r'^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$'
+
+def converter_coluna_numerica(serie, remover):
+    """
+    Núcleo dos conversores em lote: remove os caracteres de `remover`, troca a vírgula
+    decimal por ponto e converte a coluna inteira com kernels do pyarrow, sem laço por valor.
+    Retorna (valores, erros). Vazios viram 0.0, como nos conversores escalares. Textos que
+    não formam número ficam NaN em `valores` e aparecem em `erros`, uma Series com o texto
+    original indexada pela linha.
+    """
+    if not (isinstance(serie.dtype, pd.StringDtype) and serie.dtype.storage == "pyarrow"): serie = serie.astype("string[pyarrow]")
+    texto = pc.utf8_trim_whitespace(pa.array(serie))
+    for caractere in remover: texto = pc.replace_substring(texto, caractere, "")
+    texto = pc.replace_substring(texto, ",", ".")
+    vazio = pc.fill_null(pc.equal(texto, ""), True).to_numpy(zero_copy_only=False)
+    valido = pc.fill_null(pc.match_substring_regex(texto, NUMERO_VALIDO), False)
+    numeros = pc.cast(pc.if_else(valido, texto, pa.scalar(None, texto.type)), pa.float64()).to_numpy(zero_copy_only=False)
+    valores = pd.Series(np.where(vazio, 0.0, numeros), index=serie.index)
+    return valores, serie[~(vazio | valido.to_numpy(zero_copy_only=False))]
+
+def parse_currency_series(serie):
+    """
+    Versão em lote de `parse_currency` para colunas do pandas ("R$ 150.000,50", "150000,50").
+    Retorna (valores, erros), ver `converter_coluna_numerica`.
+    """
+    return converter_coluna_numerica(serie, ["R", "$", ".", " ", "\xa0", "\t"])
+
+def parse_percentage_series(serie):
+    """
+    Versão em lote de `parse_percentage` para colunas do pandas ("0,89%", "0.89").
+    Retorna (valores, erros), ver `converter_coluna_numerica`.
+    """
+    return converter_coluna_numerica(serie, ["%", " ", "\xa0", "\t"])
+
+def formatar_moeda(valor, simbolo=True):
+    try:
+        if isinstance(valor, str) and 'R$' in valor: valor = valor.replace('R$', '').strip()
+        if valor is None or valor == '': return "R$ 0,00" if simbolo else "0,00"
+        if isinstance(valor, str): valor = re.sub(r'\.', '', valor).replace(',', '.'); valor = float(valor)
+        valor_abs, parte_inteira = abs(valor), int(abs(valor))
+        parte_decimal = int(round((valor_abs - parte_inteira) * 100))
+        parte_inteira_str = f"{parte_inteira:,}".replace(",", ".")
+        valor_formatado = f"{parte_inteira_str},{parte_decimal:02d}"
+        if valor < 0: valor_formatado = f"-{valor_formatado}"
+        return f"R$ {valor_formatado}" if simbolo else valor_formatado
+    except Exception: return "R$ 0,00" if simbolo else "0,00"
+
+SEPARADORES_PT_BR = str.maketrans(",.", ".,")
+
+def formatar_moedas(valores, simbolo=True):
+    """
+    Formata uma coluna numérica inteira de uma vez, com a mesma saída de `formatar_moeda`.
+    Valores vazios ou não numéricos (como o saldo da linha TOTAL) viram texto vazio.
+    """
+    valores = pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce').round(2).to_numpy(dtype=float)
+    prefixo = "R$ " if simbolo else ""
+    return ["" if v != v else f"{prefixo}{'-' if v < 0 else ''}{abs(v):,.2f}".translate(SEPARADORES_PT_BR) for v in valores.tolist()]
+
+def calcular_taxas(taxa_mensal_percentual, dias_mes=30.4375):
+    try:
+        taxa_mensal_decimal = float(taxa_mensal_percentual) / 100
+        taxa_anual = ((1 + taxa_mensal_decimal) ** 12) - 1
+        taxa_semestral = ((1 + taxa_mensal_decimal) ** 6) - 1
+        taxa_diaria = ((1 + taxa_mensal_decimal) ** (1/dias_mes)) - 1
+        return {'anual': taxa_anual, 'semestral': taxa_semestral, 'mensal': taxa_mensal_decimal, 'diaria': taxa_diaria}
+    except Exception: return {'anual': 0, 'semestral': 0, 'mensal': 0, 'diaria': 0}
+
+# Versões item a item do cálculo original (um vencimento e um desconto por vez). O motor usa os
+# kernels vetorizados (ver "Kernels Numéricos"); estas ficam como referência, conferidas contra
+# os cronogramas em tests/test_corpus.py.
+def calcular_valor_presente(valor_futuro, taxa_diaria, dias):
+    try:
+        if dias <= 0 or taxa_diaria <= 0: return float(valor_futuro)
+        return round(float(valor_futuro) / ((1 + taxa_diaria) ** dias), 2)
+    except Exception: return float(valor_futuro)
+
+# FUNÇÃO REVISADA PARA GARANTIR CÁLCULO CORRETO DE MESES
+def ajustar_data_vencimento(data_base, periodo, num_periodo=1, dia_vencimento=None):
+    """
+    Calcula uma data futura com base em um período (mensal, semestral, anual).
+    É robusto contra meses com diferentes quantidades de dias.
+    """
+    try:
+        if not isinstance(data_base, datetime):
+            data_base = datetime.combine(data_base, datetime.min.time())
+
+        dia = dia_vencimento if dia_vencimento is not None else data_base.day
+
+        months_to_add = 0
+        if periodo == "mensal":
+            months_to_add = num_periodo
+        elif periodo == "semestral":
+            months_to_add = 6 * num_periodo
+        elif periodo == "anual":
+            months_to_add = 12 * num_periodo
+
+        if months_to_add == 0:
+            return data_base
+
+        total_meses = data_base.month + months_to_add
+        novo_ano = data_base.year + (total_meses - 1) // 12
+        novo_mes = (total_meses - 1) % 12 + 1
+
+        try:
+            return datetime(novo_ano, novo_mes, dia)
+        except ValueError:
+            if novo_mes == 12:
+                ultimo_dia_do_mes = 31
+            else:
+                ultimo_dia_do_mes = (datetime(novo_ano, novo_mes + 1, 1) - timedelta(days=1)).day
+            return datetime(novo_ano, novo_mes, ultimo_dia_do_mes)
+    except Exception:
+        return data_base + timedelta(days=30 * (months_to_add or num_periodo))
+
+
+def determinar_modo_calculo(modalidade):
+    return {"mensal": 1, "mensal + balão": 2, "só balão anual": 3, "só balão semestral": 4}.get(modalidade, 1)
+
+def atualizar_baloes(modalidade, qtd_parcelas, tipo_balao=None):
+    try:
+        qtd_parcelas = int(qtd_parcelas) if qtd_parcelas else 0
+        if modalidade == "mensal + balão":
+            intervalo = 12 if tipo_balao == "anual" else 6
+            return qtd_parcelas // intervalo if intervalo > 0 else 0
+        elif modalidade == "só balão anual": return max(ceil(qtd_parcelas / 12), 0) if qtd_parcelas else 0
+        elif modalidade == "só balão semestral": return max(ceil(qtd_parcelas / 6), 0) if qtd_parcelas else 0
+        return 0
+    except Exception: return 0
+
+def taxa_para_calculo(taxa_mensal, modalidade, qtd_parcelas, perfil="padrao", politica=None):
+    """
+    Aplica a regra comercial de taxa do `perfil` pela política de taxas compilada
+    (ver `obter_politica_taxas`): consulta indexada por modalidade e prazo; sem faixa
+    aplicável, vale a taxa informada.
+    """
+    tabela = (politica or obter_politica_taxas())[perfil]['tabela']
+    taxas = tabela.get(modalidade, tabela[None])
+    taxa = taxas[min(max(int(qtd_parcelas or 0), 0), len(taxas) - 1)]
+    return taxa_mensal if np.isnan(taxa) else float(taxa)
+
+def calcular_meses_baloes(modalidade, qtd_parcelas, qtd_baloes, tipo_balao=None,
+                          agendamento_baloes=None, meses_baloes=None, mes_primeiro_balao=None):
+    """
+    Retorna os meses (contados a partir da entrada) em que vencem os balões do plano,
+    na ordem em que são numerados no cronograma.
+    Sem balões (`qtd_baloes` 0) a lista é vazia em todos os agendamentos. A versão original
+    de "A partir do 1º Vencimento" sempre incluía o 1º balão, mesmo com `qtd_baloes` 0; a
+    diferença é intencional e está fixada em tests/test_saidas.py.
+    """
+    if "balão" not in modalidade or not qtd_baloes: return []
+    intervalo = 12 if tipo_balao == "anual" else 6
+    if modalidade == "só balão anual": intervalo = 12
+    elif modalidade == "só balão semestral": intervalo = 6
+    elif agendamento_baloes == "Personalizado (Mês a Mês)":
+        return [int(mes) for mes in (meses_baloes or [])]
+    elif agendamento_baloes == "A partir do 1º Vencimento":
+        return [int(mes_primeiro_balao) + intervalo * i for i in range(qtd_baloes)]
+    return [intervalo * i for i in range(1, qtd_baloes + 1)]
+
+# --- Kernels Numéricos ---
+# Núcleos de desconto, de contagem de dias do calendário e da recursão de saldo. As versões
+# NumPy são a referência e as usadas por padrão; com SIMULADOR_JIT=1 e o Numba instalado, os
+# cálculos de calendário e de saldo rodam em laços compilados, sem arrays temporários e com os
+# mesmos resultados (tests/test_kernels.py). As potências de desconto ficam sempre no NumPy: já
+# são uma única chamada vetorizada de np.power, e o laço compilado saiu mais lento nas medições
+# de desempenho_kernels.py. O cache da compilação fica em NUMBA_CACHE_DIR ou, sem ela, no
+# diretório temporário do sistema, nunca ao lado do código. desempenho_kernels.py mede as
+# duas versões.
+DIAS_POR_MES = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+def potencias_numpy(dias, taxas):
+    """(1 + taxa) ** dias item a item (arrays float); sem prazo ou sem juros, fator 1."""
+    return np.where((dias > 0) & (taxas > 0), np.power(1 + taxas, dias), 1.0)
+
+def dias_calendario_numpy(ano, mes, dia, qtd_meses):
+    """
+    Dias corridos da data (ano, mes, dia) até o mesmo dia de cada um dos `qtd_meses` meses
+    seguintes, limitado ao último dia do mês (como `ajustar_data_vencimento`).
+    """
+    entrada = np.datetime64(f"{ano:04d}-{mes:02d}-{dia:02d}", 'D')
+    mes_entrada = entrada.astype('datetime64[M]'); meses = mes_entrada + np.arange(1, qtd_meses + 1)
+    inicio = meses.astype('datetime64[D]'); dias_no_mes = ((meses + 1).astype('datetime64[D]') - inicio).astype(np.int64)
+    return (inicio + np.minimum(dia - 1, dias_no_mes - 1) - entrada).astype(np.int64)
+
+def saldo_numpy(valores, crescimento, saldo_inicial):
+    """Saldo após cada pagamento, G * (saldo_inicial - soma acumulada de valores / G); `saldo_inicial` com forma (..., 1)."""
+    return crescimento * (saldo_inicial - np.cumsum(valores / crescimento, axis=-1))
+
+def dias_calendario_laco(ano, mes, dia, qtd_meses):
+    """Versão em laço de `dias_calendario_numpy`: avança mês a mês somando a duração de cada um."""
+    saida = np.empty(qtd_meses, dtype=np.int64); ate_inicio_mes = 1 - dia
+    duracao = DIAS_POR_MES[mes - 1] + (1 if mes == 2 and ano % 4 == 0 and (ano % 100 != 0 or ano % 400 == 0) else 0)
+    for m in range(qtd_meses):
+        ate_inicio_mes += duracao; mes += 1
+        if mes > 12: mes = 1; ano += 1
+        duracao = DIAS_POR_MES[mes - 1] + (1 if mes == 2 and ano % 4 == 0 and (ano % 100 != 0 or ano % 400 == 0) else 0)
+        saida[m] = ate_inicio_mes + min(dia, duracao) - 1
+    return saida
+
+def saldo_laco(valores, crescimento, saldo_inicial):
+    """Versão em laço de `saldo_numpy` para matrizes (contratos, pagamentos) e `saldo_inicial` (contratos,)."""
+    saldo = np.empty_like(valores)
+    for i in range(valores.shape[0]):
+        acumulado = 0.0
+        for k in range(valores.shape[1]):
+            acumulado += valores[i, k] / crescimento[i, k]
+            saldo[i, k] = crescimento[i, k] * (saldo_inicial[i] - acumulado)
+    return saldo
+
+KERNELS_NUMPY = {'potencias': potencias_numpy, 'dias_calendario': dias_calendario_numpy, 'saldo': saldo_numpy}
+
+@st.cache_resource
+def compilar_kernels():
+    """
+    Compila, uma vez por processo, os laços com o Numba e os devolve com a mesma assinatura
+    das versões NumPy (KERNELS_NUMPY), que continuam valendo para as potências; None se o
+    Numba não estiver instalado.
+    """
+    try: numba = importlib.import_module("numba")
+    except ImportError: return None
+    if not numba.config.CACHE_DIR: numba.config.CACHE_DIR = os.path.join(tempfile.gettempdir(), "simulador_jit")
+    dias_calendario, saldo = (numba.njit(cache=True)(f) for f in (dias_calendario_laco, saldo_laco))
+    def contiguos(forma, *arrays): # laços compilados recebem arrays C-contíguos já na forma final
+        return [np.ascontiguousarray(np.broadcast_to(np.asarray(a, dtype=float), forma)) for a in arrays]
+    def saldo_matriz(valores, crescimento, saldo_inicial):
+        forma = np.broadcast_shapes(np.shape(valores), np.shape(crescimento), np.shape(saldo_inicial))
+        valores, crescimento, saldo_inicial = contiguos(forma, valores, crescimento, saldo_inicial)
+        if not valores.size: return saldo_numpy(valores, crescimento, saldo_inicial)
+        n = forma[-1]
+        return saldo(valores.reshape(-1, n), crescimento.reshape(-1, n), np.ascontiguousarray(saldo_inicial[..., 0]).reshape(-1)).reshape(forma)
+    return {**KERNELS_NUMPY, 'dias_calendario': lambda ano, mes, dia, qtd_meses: dias_calendario(int(ano), int(mes), int(dia), int(qtd_meses)), 'saldo': saldo_matriz}
+
+def obter_kernels():
+    """
+    Kernels em uso: os de NumPy, ou os compilados com SIMULADOR_JIT=1 (se o Numba estiver instalado).
+    """
+    if os.environ.get("SIMULADOR_JIT", "0") != "1": return KERNELS_NUMPY
+    return compilar_kernels() or KERNELS_NUMPY
+
+# --- Calendário de Dias Úteis ---
+# Feriados em CSV (colunas data e, opcionalmente, descricao e municipio). Feriados sem
+# município são nacionais; os demais valem só para o MUNICIPIO do empreendimento.
+CAMINHO_FERIADOS = os.environ.get("FERIADOS", os.path.join(DIRETORIO_APP, "feriados.csv"))
+MUNICIPIO = os.environ.get("MUNICIPIO", "")
+# Rolagem dos vencimentos que caem em fim de semana ou feriado (nomes de `np.busday_offset`)
+AJUSTES_DIAS_UTEIS = {"Manter a data": None, "Próximo dia útil": "following", "Próximo dia útil no mesmo mês": "modifiedfollowing"}
+
+@st.cache_resource(max_entries=4)
+def carregar_feriados(caminho, mtime, municipio=MUNICIPIO):
+    """
+    Lê os feriados e monta um np.busdaycalendar (segunda a sexta, exceto feriados) usado em
+    todas as rolagens de vencimento. O `mtime` faz parte da chave do cache: o arquivo só é
+    relido quando muda.
+    """
+    df = pd.read_csv(caminho, dtype=str, sep=None, engine='python', encoding='utf-8-sig')
+    df.columns = [normalizar_coluna(c) for c in df.columns]
+    if 'data' not in df.columns: raise ValueError("Coluna obrigatória ausente no calendário de feriados: data.")
+    df = df.dropna(subset=['data'])
+    if 'municipio' in df.columns: df = df[df['municipio'].isna() | (df['municipio'].str.strip().str.lower() == municipio.strip().lower())]
+    datas = pd.to_datetime(df['data'].str.strip(), format='mixed', dayfirst=True, errors='coerce')
+    erros = [f"linha {linha + 2}: '{valor}'" for linha, valor in df['data'][datas.isna()].items()]
+    if erros: raise ValueError(f"Datas inválidas no calendário de feriados ({len(erros)}): {'; '.join(erros[:10])}{' ...' if len(erros) > 10 else ''}.")
+    return np.busdaycalendar(weekmask='1111100', holidays=datas.to_numpy().astype('datetime64[D]'))
+
+def versao_feriados(caminho=CAMINHO_FERIADOS):
+    return os.path.getmtime(caminho) if os.path.exists(caminho) else None
+
+def obter_feriados(caminho=CAMINHO_FERIADOS):
+    """
+    Retorna o calendário de dias úteis; sem arquivo de feriados, só os fins de semana são excluídos.
+    """
+    if not os.path.exists(caminho): return np.busdaycalendar(weekmask='1111100')
+    return carregar_feriados(caminho, os.path.getmtime(caminho))
+
+@st.cache_data(ttl=3600, max_entries=LIMITE_CACHE_CALCULO)
+def gerar_calendario(data_entrada, qtd_meses, dias_uteis=None, versao_feriados=None):
+    """
+    Gera, uma única vez, as datas de vencimento mês a mês (meses 1..qtd_meses) e os dias
+    corridos desde a entrada, de uma vez para todos os meses (ver `dias_calendario_numpy`): o
+    dia da entrada em cada mês, limitado ao último dia do mês.
+    Com `dias_uteis` (ver AJUSTES_DIAS_UTEIS), os vencimentos em dia não útil rolam por
+    `np.busday_offset` no calendário de `obter_feriados`, e os dias corridos usados no
+    desconto acompanham a data rolada. `versao_feriados` só entra na chave do cache.
+    Todos os planos de uma mesma data de entrada compartilham este calendário.
+    """
+    entrada = np.datetime64(data_entrada.date() if isinstance(data_entrada, datetime) else data_entrada, 'D')
+    vencimentos = entrada + obter_kernels()['dias_calendario'](data_entrada.year, data_entrada.month, data_entrada.day, qtd_meses)
+    if dias_uteis: vencimentos = np.busday_offset(vencimentos, 0, roll=dias_uteis, busdaycal=obter_feriados())
+    dias = (vencimentos - entrada).astype(np.int64)
+    return vencimentos.astype('datetime64[us]').astype(datetime).tolist(), dias
+
+def calcular_potencias_desconto(dias, taxa_diaria):
+    """
+    Calcula (1 + taxa_diaria) ** dias para cada vencimento do calendário.
+    Vencimentos sem prazo ou sem juros recebem fator 1 (sem desconto).
+    """
+    if taxa_diaria <= 0: return np.ones(len(dias))
+    return obter_kernels()['potencias'](np.asarray(dias, dtype=float), np.full(len(dias), float(taxa_diaria)))
+
+# --- Convenções de Contagem de Prazo ---
+# Cada convenção recebe os dias corridos do calendário (meses 1..n) e a taxa mensal (%) e
+# devolve (dias exibidos no cronograma, potências de desconto por mês).
+@st.cache_data(ttl=3600, max_entries=LIMITE_CACHE_CALCULO)
+def potencias_periodicas(taxa_periodo, periodos_por_mes, qtd_meses):
+    """
+    Potências (1 + taxa_periodo) ** (periodos_por_mes * m) para m = 1..qtd_meses. Não dependem
+    da data de entrada, então são calculadas uma vez por taxa e prazo e reaproveitadas.
+    """
+    expoentes = periodos_por_mes * np.arange(1, qtd_meses + 1, dtype=np.int64)
+    return expoentes, calcular_potencias_desconto(expoentes, taxa_periodo)
+
+def potencias_calendario(dias, taxa_mensal):
+    """Dias corridos reais, com taxa diária equivalente em base 30,4375 (simulador principal)."""
+    return dias, calcular_potencias_desconto(dias, calcular_taxas(taxa_mensal)['diaria'])
+
+def potencias_comercial(dias, taxa_mensal):
+    """Mês comercial 30/360: o mês m vale 30·m dias, com taxa diária em base 30 (app2.py)."""
+    return potencias_periodicas(calcular_taxas(taxa_mensal, dias_mes=30)['diaria'], 30, len(dias))
+
+def potencias_mensal(dias, taxa_mensal):
+    """Períodos mensais puros: o mês m é descontado por (1 + i) ** m."""
+    return dias, potencias_periodicas(calcular_taxas(taxa_mensal)['mensal'], 1, len(dias))[1]
+
+CONVENCOES_CONTAGEM = {"calendario": potencias_calendario, "comercial": potencias_comercial, "mensal": potencias_mensal}
+
+# Perfis de cálculo: convenção de prazo, item que absorve a diferença de arredondamento,
+# valor presente do TOTAL ('soma' dos itens ou o próprio 'financiado'), taxa sugerida no
+# formulário e regras de taxa (padrões; a política de taxas pode sobrepor as duas últimas).
+# A taxa zero dos prazos curtos vale para as modalidades mensais em qualquer sistema de
+# amortização, para que a comparação entre eles não misture taxas diferentes.
+PERFIS_CALCULO = {
+    "padrao": {"convencao": "calendario", "ajuste_arredondamento": "ultima", "vp_total": "soma", "taxa_padrao": 0.89,
+               "regras_taxa": [{'modalidades': ['mensal', 'mensal SAC', 'mensal misto (SAC/Price)'], 'min': 1, 'max': 36, 'taxa': 0.0}]},
+    "comercial": {"convencao": "comercial", "ajuste_arredondamento": "primeira", "vp_total": "financiado", "taxa_padrao": 0.79,
+                  "regras_taxa": [{'min': 1, 'max': 36, 'taxa': 0.0}, {'min': 37, 'max': 48, 'taxa': 0.395}, {'taxa': 0.79}]},
+}
+
+# --- Política de Taxas ---
+# Arquivo JSON opcional {perfil: {'taxa_padrao': x, 'regras_taxa': [...]}} que sobrepõe os
+# padrões de PERFIS_CALCULO. Cada regra é uma faixa {'modalidades', 'empreendimentos', 'min',
+# 'max', 'taxa'} (chaves ausentes valem para qualquer valor) e vale a primeira que casar.
+CAMINHO_POLITICA_TAXAS = os.environ.get("POLITICA_TAXAS", os.path.join(DIRETORIO_APP, "politica_taxas.json"))
+EMPREENDIMENTO = os.environ.get("EMPREENDIMENTO", "")
+# Modalidades mensais com parcelas variáveis e o sistema de amortização de cada uma; as
+# demais seguem o modelo de parcelas iguais ('price').
+SISTEMAS_AMORTIZACAO = {"mensal SAC": "sac", "mensal misto (SAC/Price)": "misto"}
+MODALIDADES = ["mensal", "mensal + balão", "só balão anual", "só balão semestral"] + list(SISTEMAS_AMORTIZACAO)
+
+def compilar_regras_taxa(regras, empreendimento=EMPREENDIMENTO):
+    """
+    Pré-compila as faixas de taxa em um vetor por modalidade indexado pelo prazo: a posição
+    q traz a taxa da primeira faixa que casa com q, ou NaN para "usar a taxa informada".
+    Prazos acima do maior limite das faixas usam a última posição, que vale para todos eles.
+    A chave None atende modalidades fora de MODALIDADES.
+    """
+    regras = [r for r in regras if not r.get('empreendimentos') or empreendimento in r['empreendimentos']]
+    limite = max([0] + [int(r[k]) for r in regras for k in ('min', 'max') if r.get(k) is not None]) + 1
+    prazos = np.arange(limite + 1); tabela = {}
+    for modalidade in MODALIDADES + [None]:
+        taxas = np.full(limite + 1, np.nan)
+        for regra in reversed(regras): # as primeiras faixas sobrescrevem as seguintes
+            if regra.get('modalidades') and modalidade not in regra['modalidades']: continue
+            casa = np.ones(limite + 1, dtype=bool)
+            if regra.get('min') is not None: casa &= prazos >= int(regra['min'])
+            if regra.get('max') is not None: casa &= prazos <= int(regra['max'])
+            taxas[casa] = float(regra['taxa'])
+        tabela[modalidade] = taxas
+    return tabela
+
+@st.cache_resource(max_entries=4)
+def carregar_politica_taxas(caminho, mtime, empreendimento=EMPREENDIMENTO):
+    """
+    Lê e compila a política de taxas: {perfil: {'taxa_padrao', 'tabela'}}. Perfis ou chaves
+    ausentes do arquivo (ou `caminho` None) ficam com os valores de PERFIS_CALCULO.
+    O `mtime` faz parte da chave do cache: o arquivo só é relido quando muda.
+    """
+    politica = {}
+    if caminho is not None:
+        with open(caminho, encoding='utf-8') as f: politica = json.load(f)
+        desconhecidos = set(politica) - set(PERFIS_CALCULO)
+        if desconhecidos: raise ValueError(f"Perfis desconhecidos na política de taxas: {', '.join(sorted(desconhecidos))}.")
+    compilada = {}
+    for perfil, config in PERFIS_CALCULO.items():
+        ajustes = politica.get(perfil, {})
+        compilada[perfil] = {'taxa_padrao': float(ajustes.get('taxa_padrao', config['taxa_padrao'])), 'tabela': compilar_regras_taxa(ajustes.get('regras_taxa', config['regras_taxa']), empreendimento)}
+    return compilada
+
+def versao_politica_taxas(caminho=CAMINHO_POLITICA_TAXAS):
+    return os.path.getmtime(caminho) if os.path.exists(caminho) else None
+
+def obter_politica_taxas(caminho=CAMINHO_POLITICA_TAXAS):
+    """
+    Retorna a política de taxas compilada. Uma edição no arquivo vale a partir da próxima
+    execução do script, sem reiniciar o app; sem arquivo, valem os padrões.
+    """
+    if not os.path.exists(caminho): return carregar_politica_taxas(None, None)
+    return carregar_politica_taxas(caminho, os.path.getmtime(caminho))
+
+def calcular_amortizacao(valores, dias, saldo_inicial, taxa_diaria, crescimento=None):
+    """
+    Recursão de saldo devedor em forma vetorizada. `valores` e `dias` são arrays
+    (..., n) em ordem cronológica (uma linha por contrato); `saldo_inicial` tem forma (...,).
+    Com G = (1 + taxa_diaria) ** dias, o saldo após o pagamento k é
+    G_k * (saldo_inicial - soma acumulada de valores / G), sem laço por parcela.
+    `crescimento` permite informar G já calculado (por exemplo, as potências de uma convenção).
+    Retorna (juros, amortizacao, saldo) com a mesma forma de `valores`.
+    """
+    valores = np.asarray(valores, dtype=float); dias = np.asarray(dias, dtype=float)
+    saldo_inicial = np.asarray(saldo_inicial, dtype=float)[..., None]
+    if crescimento is None:
+        taxa_diaria = np.asarray(taxa_diaria, dtype=float)
+        if taxa_diaria.ndim: taxa_diaria = taxa_diaria[..., None]
+        crescimento = np.power(1 + taxa_diaria, dias)
+    crescimento = np.asarray(crescimento, dtype=float)
+    saldo = obter_kernels()['saldo'](valores, crescimento, saldo_inicial)
+    saldo_anterior = np.concatenate([saldo_inicial, saldo[..., :-1]], axis=-1)
+    crescimento_anterior = np.concatenate([np.ones_like(saldo_inicial), crescimento[..., :-1]], axis=-1)
+    juros = saldo_anterior * (crescimento / crescimento_anterior - 1)
+    return juros, valores - juros, saldo
+
+def acrescentar_amortizacao(cronograma, valor_financiado, taxa_diaria, crescimento=None):
+    """
+    Acrescenta ao cronograma as colunas Juros_Periodo, Amortizacao e Saldo_Devedor,
+    percorrendo parcelas e balões em ordem cronológica. `crescimento`, se informado, traz
+    as potências de desconto de cada item na ordem do cronograma.
+    """
+    itens = [p for p in cronograma if p['Item'] != 'TOTAL']
+    if not itens: return cronograma
+    ordem = np.argsort([p['Dias'] for p in itens], kind='stable')
+    valores = np.array([itens[i]['Valor'] for i in ordem], dtype=float)
+    dias = np.array([itens[i]['Dias'] for i in ordem], dtype=float)
+    if crescimento is not None: crescimento = np.asarray(crescimento, dtype=float)[ordem]
+    juros, amortizacao, saldo = calcular_amortizacao(valores, dias, valor_financiado, max(taxa_diaria, 0.0), crescimento)
+    for i, j, a, s in zip(ordem.tolist(), juros.tolist(), amortizacao.tolist(), saldo.tolist()):
+        itens[i].update({"Juros_Periodo": round(j, 2), "Amortizacao": round(a, 2), "Saldo_Devedor": round(s, 2) or 0.0})
+    total = next((p for p in cronograma if p['Item'] == 'TOTAL'), None)
+    if total: total.update({"Juros_Periodo": round(float(juros.sum()), 2), "Amortizacao": round(float(amortizacao.sum()), 2), "Saldo_Devedor": ""})
+    return cronograma
+
+def calcular_cet(valores, dias, valor_financiado, tolerancia=1e-10, max_iteracoes=50):
+    """
+    Custo Efetivo Total de vários cronogramas de uma vez: a taxa anual i tal que o crédito
+    líquido liberado em t0 (valor do imóvel menos a entrada, isto é, o valor financiado)
+    iguala a soma dos pagamentos descontados por (1 + i) ** (dias / 365), como na fórmula
+    do CET. `valores` e `dias` são arrays (..., n) com zeros nas posições sem pagamento;
+    `valor_financiado` tem forma (...,). Newton vetorizado sobre todos os cronogramas,
+    partindo da taxa de um pagamento único no prazo médio. Retorna (cet_anual, cet_mensal)
+    em %, com NaN onde não houver solução.
+    """
+    valores = np.asarray(valores, dtype=float); anos = np.asarray(dias, dtype=float) / 365
+    financiado = np.asarray(valor_financiado, dtype=float)
+    total = valores.sum(axis=-1); valido = (financiado > 0) & (total > 0)
+    with np.errstate(all='ignore'):
+        prazo = np.where(valido, (valores * anos).sum(axis=-1) / np.where(valido, total, 1), 1.0)
+        taxa = np.where(valido, (total / np.where(valido, financiado, 1)) ** (1 / np.maximum(prazo, 1 / 365)) - 1, np.nan)
+        for _ in range(max_iteracoes):
+            desconto = (1 + taxa[..., None]) ** -anos
+            residuo = (valores * desconto).sum(axis=-1) - financiado
+            passo = residuo * (1 + taxa) / -(valores * anos * desconto).sum(axis=-1)
+            taxa = np.maximum(taxa - passo, -0.99)
+            if not np.any(np.abs(passo) > tolerancia): break
+        residuo = (valores * (1 + taxa[..., None]) ** -anos).sum(axis=-1) - financiado
+        taxa = np.where(np.abs(residuo) <= 1e-6 * np.maximum(financiado, 1), taxa, np.nan)
+        return taxa * 100, ((1 + taxa) ** (1 / 12) - 1) * 100
+
+def cet_cronogramas(cronogramas, valores_financiados):
+    """
+    `calcular_cet` para cronogramas no formato de `montar_cronograma` (a linha TOTAL é
+    ignorada), completando com zeros os que têm menos pagamentos.
+    """
+    itens = [[p for p in c if p['Item'] != 'TOTAL'] for c in cronogramas]
+    valores = np.zeros((len(itens), max([len(i) for i in itens] + [1]))); dias = np.zeros_like(valores)
+    for k, lista in enumerate(itens):
+        valores[k, :len(lista)] = [p['Valor'] for p in lista]; dias[k, :len(lista)] = [p['Dias'] for p in lista]
+    return calcular_cet(valores, dias, valores_financiados)
+
+def coeficientes_parcelas(potencias, qtd_parcelas, sistema):
+    """
+    Parcela de cada mês 1..qtd_parcelas por real financiado, em forma fechada sobre as
+    potências de desconto G da convenção. Price: 1 / soma(1 / G), constante. SAC: amortização
+    constante 1/n mais os juros do período sobre o saldo 1 - (k - 1)/n, isto é,
+    1/n + (1 - (k - 1)/n) * (G_k / G_(k-1) - 1), decrescente. Misto (SAM): média das duas.
+    Os três têm valor presente igual ao financiado.
+    """
+    if qtd_parcelas <= 0: return np.zeros(0)
+    crescimento = np.asarray(potencias[:qtd_parcelas], dtype=float)
+    price = np.full(qtd_parcelas, 1.0 / np.sum(1.0 / crescimento))
+    if sistema == "price": return price
+    anterior = np.concatenate([[1.0], crescimento[:-1]])
+    sac = 1.0 / qtd_parcelas + (1 - np.arange(qtd_parcelas) / qtd_parcelas) * (crescimento / anterior - 1)
+    return sac if sistema == "sac" else (price + sac) / 2
+
+def resolver_parcelas_sistema(valores_financiados, coeficientes, valor_parcela=0.0, ajuste_arredondamento="ultima"):
+    """
+    Parcelas de um plano SAC ou misto para um ou vários valores financiados de uma vez:
+    matriz (lotes, parcelas) = financiado x coeficientes, arredondada a centavos. Sem juros
+    (todos os coeficientes iguais a 1/n), a diferença de arredondamento vai para o item de
+    `ajuste_arredondamento`, como em `resolver_valores`. Lança ValueError se o valor da
+    parcela foi informado, pois nestes sistemas ele é sempre calculado.
+    """
+    if valor_parcela > 0: raise ValueError("Nos sistemas SAC e misto as parcelas são calculadas: deixe o valor da parcela em branco.")
+    if not len(coeficientes): raise ValueError("Informe a quantidade de parcelas do plano.")
+    financiados = np.asarray(valores_financiados, dtype=float)
+    parcelas = np.round(financiados[..., None] * coeficientes, 2)
+    if np.all(coeficientes == 1.0 / len(coeficientes)): # sem juros
+        posicao = 0 if ajuste_arredondamento == "primeira" else -1
+        parcelas[..., posicao] = np.round(financiados - parcelas.sum(axis=-1) + parcelas[..., posicao], 2)
+    return parcelas
+
+def resolver_valores(valor_financiado, modalidade, qtd_parcelas, qtd_baloes, taxa_mensal_para_calculo,
+                     fator_vp_p=0.0, fator_vp_b=0.0, valor_parcela=0.0, valor_balao=0.0):
+    """
+    Resolve os valores de parcela e balão de um plano a partir das somas de fatores de
+    valor presente. Retorna (v_p_final, v_b_final, v_ultima_p, v_ultimo_b) e lança
+    ValueError com a mensagem para o usuário quando o plano é inconsistente.
+    """
+    modo = determinar_modo_calculo(modalidade); qtd_parcelas = qtd_parcelas or 0
+    v_p_final, v_b_final = 0.0, 0.0; v_ultima_p, v_ultimo_b = None, None
+
+    if taxa_mensal_para_calculo == 0.0:
+        if modo == 1 and qtd_parcelas > 0:
+            vp = round(valor_financiado / qtd_parcelas, 2); dif = round((vp * qtd_parcelas) - valor_financiado, 2)
+            v_p_final = vp; v_ultima_p = vp - dif
+        elif modo in [3, 4] and qtd_baloes > 0:
+            vb = round(valor_financiado / qtd_baloes, 2); dif = round((vb * qtd_baloes) - valor_financiado, 2)
+            v_b_final = vb; v_ultimo_b = vb - dif
+        elif modo == 2 and (qtd_parcelas > 0 or qtd_baloes > 0):
+            if valor_parcela > 0 and valor_balao == 0:
+                v_p_final = valor_parcela
+                vp_restante = valor_financiado - valor_parcela * qtd_parcelas
+                if qtd_baloes > 0 and vp_restante > 0:
+                    vb = round(vp_restante / qtd_baloes, 2); dif = round((vb * qtd_baloes) - vp_restante, 2)
+                    v_b_final = vb; v_ultimo_b = vb - dif
+                elif vp_restante < 0: raise ValueError("O valor total das parcelas excede o valor financiado.")
+            elif valor_balao > 0 and valor_parcela == 0:
+                v_b_final = valor_balao
+                vp_restante = valor_financiado - valor_balao * qtd_baloes
+                if qtd_parcelas > 0 and vp_restante > 0:
+                    vp = round(vp_restante / qtd_parcelas, 2); dif = round((vp * qtd_parcelas) - vp_restante, 2)
+                    v_p_final = vp; v_ultima_p = vp - dif
+                elif vp_restante < 0: raise ValueError("O valor total dos balões excede o valor financiado.")
+            else: raise ValueError("No modo 'mensal + balão', informe OU o valor da parcela OU o valor do balão.")
+    else: # Lógica para planos com juros
+        if valor_parcela > 0 and valor_balao == 0:
+            v_p_final = valor_parcela
+            vp_restante = max(valor_financiado - (v_p_final * fator_vp_p), 0)
+            if qtd_baloes > 0: v_b_final = round(vp_restante / fator_vp_b, 2) if fator_vp_b > 0 else 0
+        elif valor_balao > 0 and valor_parcela == 0:
+            v_b_final = valor_balao
+            vp_restante = max(valor_financiado - (v_b_final * fator_vp_b), 0)
+            if qtd_parcelas > 0: v_p_final = round(vp_restante / fator_vp_p, 2) if fator_vp_p > 0 else 0
+        elif valor_parcela == 0 and valor_balao == 0:
+            if modo == 1: v_p_final = round(valor_financiado / fator_vp_p, 2) if fator_vp_p > 0 else 0
+            elif modo in [3, 4]: v_b_final = round(valor_financiado / fator_vp_b, 2) if fator_vp_b > 0 else 0
+            else: raise ValueError("Para cálculo automático em modo misto, preencha o valor da Parcela ou do Balão.")
+        else: # Ambos os valores foram preenchidos
+            v_p_final = valor_parcela
+            v_b_final = valor_balao
+    return v_p_final, v_b_final, v_ultima_p, v_ultimo_b
+
+def montar_cronograma(meses_p, meses_b, v_p_final, v_b_final, datas, dias, potencias,
+                      valor_parcela_ajustada=None, valor_balao_ajustado=None,
+                      ajuste_arredondamento="ultima", vp_total=None):
+    """
+    Monta o cronograma (uma linha por parcela/balão e a linha TOTAL) indexando um calendário
+    e o mesmo vetor de potências de desconto usado para resolver os valores, sem recalcular
+    datas nem expoentes.
+    O valor ajustado vai para o último ou o primeiro item (`ajuste_arredondamento`);
+    `vp_total`, se informado, substitui a soma dos valores presentes na linha TOTAL.
+    `v_p_final` pode ser um array com o valor de cada parcela (sistemas SAC e misto).
+    """
+    def itens(meses, tipo, valor_final, valor_ajustado):
+        linhas = []; posicao = 0 if ajuste_arredondamento == "primeira" else len(meses) - 1
+        for i, mes in enumerate(meses):
+            valor_corrente = valor_ajustado if (i == posicao and valor_ajustado is not None) else (float(valor_final[i]) if np.ndim(valor_final) else valor_final)
+            potencia = float(potencias[mes - 1])
+            vp = round(float(valor_corrente) / potencia, 2) if potencia != 1.0 else float(valor_corrente)
+            linhas.append({"Item": f"{tipo} {i + 1}", "Tipo": tipo, "Data_Vencimento": datas[mes - 1].strftime('%d/%m/%Y'), "Dias": int(dias[mes - 1]), "Valor": round(valor_corrente, 2), "Valor_Presente": round(vp, 2), "Desconto_Aplicado": round(valor_corrente - vp, 2)})
+        ordem = sorted(range(len(meses)), key=lambda i: meses[i])
+        return [linhas[i] for i in ordem]
+
+    cronograma = itens(list(meses_p), "Parcela", v_p_final, valor_parcela_ajustada) + itens(list(meses_b), "Balão", v_b_final, valor_balao_ajustado)
+    if cronograma:
+        total_valor = round(sum(p['Valor'] for p in cronograma), 2)
+        valor_presente_real = round(sum(p['Valor_Presente'] for p in cronograma), 2) if vp_total is None else vp_total
+        cronograma.append({"Item": "TOTAL", "Tipo": "", "Data_Vencimento": "", "Dias": "", "Valor": total_valor, "Valor_Presente": valor_presente_real, "Desconto_Aplicado": round(total_valor - valor_presente_real, 2)})
+    return cronograma
+
+def preparar_planos(planos, data_entrada, taxa_mensal, perfil="padrao", dias_uteis=None):
+    """
+    Resolve, para cada plano, os meses de vencimento, a taxa aplicável e as somas de fatores
+    de valor presente, usando um único calendário e um vetor de potências por taxa, na
+    convenção de prazo do `perfil` (ver PERFIS_CALCULO).
+    Cada plano é um dict com 'modalidade' e 'qtd_parcelas' e, opcionalmente, 'tipo_balao',
+    'agendamento_baloes', 'meses_baloes', 'mes_primeiro_balao', 'valor_parcela' e 'valor_balao'
+    (o agendamento só vale em 'mensal + balão'; as demais modalidades usam o padrão).
+    Nos sistemas SAC e misto (SISTEMAS_AMORTIZACAO), 'coeficientes' traz a parcela de cada mês
+    por real financiado (ver `coeficientes_parcelas`). `dias_uteis` é a rolagem dos
+    vencimentos em dia não útil (ver `gerar_calendario`).
+    Retorna (datas, dias, preparados).
+    """
+    config = PERFIS_CALCULO[perfil]; convencao = CONVENCOES_CONTAGEM[config['convencao']]
+    preparados = []; politica = obter_politica_taxas()
+    for plano in planos:
+        modalidade = plano['modalidade']; qtd_parcelas = int(plano.get('qtd_parcelas') or 0)
+        tipo_balao = plano.get('tipo_balao') or ("semestral" if "semestral" in modalidade else "anual")
+        agendamento_baloes = (plano.get('agendamento_baloes') or "Padrão") if modalidade == "mensal + balão" else "Padrão"
+        if agendamento_baloes == "Personalizado (Mês a Mês)": qtd_baloes = len(plano.get('meses_baloes') or [])
+        else: qtd_baloes = atualizar_baloes(modalidade, qtd_parcelas, tipo_balao)
+        meses_b = calcular_meses_baloes(modalidade, qtd_parcelas, qtd_baloes, tipo_balao, agendamento_baloes, plano.get('meses_baloes'), plano.get('mes_primeiro_balao') or 12)
+        meses_p = list(range(1, qtd_parcelas + 1)) if modalidade in ["mensal", "mensal + balão"] + list(SISTEMAS_AMORTIZACAO) else []
+        preparados.append({'plano': plano, 'modalidade': modalidade, 'sistema': SISTEMAS_AMORTIZACAO.get(modalidade, "price"), 'qtd_parcelas': qtd_parcelas, 'qtd_baloes': qtd_baloes, 'meses_p': meses_p, 'meses_b': meses_b})
+
+    qtd_meses = max([1] + [p['qtd_parcelas'] for p in preparados] + [max(p['meses_b']) for p in preparados if p['meses_b']])
+    datas, dias = gerar_calendario(data_entrada, qtd_meses, dias_uteis, versao_feriados() if dias_uteis else None)
+    potencias_por_taxa = {}
+    for p in preparados:
+        taxa = taxa_para_calculo(taxa_mensal, p['modalidade'], p['qtd_parcelas'], perfil, politica)
+        if taxa not in potencias_por_taxa: potencias_por_taxa[taxa] = convencao(dias, taxa)
+        dias_convencao, potencias = potencias_por_taxa[taxa]
+        p.update({'taxa': taxa, 'dias': dias_convencao, 'potencias': potencias,
+                  'fator_vp_p': float(np.sum(1.0 / potencias[:p['qtd_parcelas']])) if p['qtd_parcelas'] > 0 else 0,
+                  'fator_vp_b': float(np.sum(1.0 / potencias[np.asarray(p['meses_b'], dtype=np.int64) - 1])) if p['meses_b'] else 0,
+                  'coeficientes': coeficientes_parcelas(potencias, p['qtd_parcelas'], p['sistema']) if p['sistema'] != "price" else None})
+    return datas, dias, preparados
+
+def comparar_planos(valor_financiado, data_entrada, taxa_mensal, planos, perfil="padrao", dias_uteis=None):
+    """
+    Avalia N variantes de plano (ver `preparar_planos`) para o mesmo lote em uma única
+    chamada, compartilhando o calendário de vencimentos e os fatores de desconto entre elas.
+    """
+    config = PERFIS_CALCULO[perfil]
+    datas, _, preparados = preparar_planos(planos, data_entrada, taxa_mensal, perfil, dias_uteis)
+    vp_total = valor_financiado if config['vp_total'] == "financiado" else None
+    resultados = []
+    for p in preparados:
+        plano = p['plano']
+        resultado = {'modalidade': p['modalidade'], 'sistema': p['sistema'], 'taxa_mensal': p['taxa'], 'qtd_parcelas': p['qtd_parcelas'], 'qtd_baloes': p['qtd_baloes'], 'valor_parcela': 0.0, 'valor_ultima_parcela': 0.0, 'valor_balao': 0.0, 'cronograma': [], 'erro': None}
+        try:
+            if p['sistema'] != "price":
+                parcelas = resolver_parcelas_sistema(valor_financiado, p['coeficientes'], plano.get('valor_parcela', 0.0), config['ajuste_arredondamento'])
+                v_p_final, v_b_final, v_ultima_p, v_ultimo_b = parcelas, 0.0, None, None
+            else: v_p_final, v_b_final, v_ultima_p, v_ultimo_b = resolver_valores(valor_financiado, p['modalidade'], p['qtd_parcelas'], p['qtd_baloes'], p['taxa'], p['fator_vp_p'], p['fator_vp_b'], plano.get('valor_parcela', 0.0), plano.get('valor_balao', 0.0))
+        except ValueError as e:
+            resultado['erro'] = str(e); resultados.append(resultado); continue
+        cronograma = montar_cronograma(p['meses_p'], p['meses_b'], v_p_final, v_b_final, datas, p['dias'], p['potencias'], v_ultima_p, v_ultimo_b, config['ajuste_arredondamento'], vp_total)
+        crescimento = p['potencias'][np.asarray(sorted(p['meses_p']) + sorted(p['meses_b']), dtype=np.int64) - 1]
+        if np.ndim(v_p_final): v_p_final, v_ultima_p = float(v_p_final[0]), float(v_p_final[-1])
+        resultado.update({'valor_parcela': v_p_final, 'valor_ultima_parcela': v_p_final if v_ultima_p is None else v_ultima_p, 'valor_balao': v_b_final, 'cronograma': acrescentar_amortizacao(cronograma, valor_financiado, 0.0, crescimento)})
+        resultados.append(resultado)
+    validos = [r for r in resultados if r['cronograma']]
+    cet_anual, cet_mensal = cet_cronogramas([r['cronograma'] for r in validos], np.full(len(validos), valor_financiado))
+    for r in resultados: r.update({'cet_anual': None, 'cet_mensal': None})
+    for r, a, m in zip(validos, cet_anual.tolist(), cet_mensal.tolist()):
+        if not np.isnan(a): r.update({'cet_anual': round(a, 4), 'cet_mensal': round(m, 4)})
+    return resultados
+
+def canonicalizar_plano(plano):
+    """
+    Forma canônica de um plano (ver `preparar_planos`): só os campos que alteram o resultado,
+    em ordem fixa e com tipos normalizados. Planos que diferem apenas em campos que a
+    modalidade ignora (o tipo de balão de um plano 'mensal', o 1º balão de um agendamento
+    padrão) viram o mesmo plano.
+    """
+    modalidade = plano['modalidade']; agendamento = plano.get('agendamento_baloes') or "Padrão"
+    canonico = {'modalidade': modalidade, 'qtd_parcelas': int(plano.get('qtd_parcelas') or 0)}
+    if modalidade == "mensal + balão": canonico['tipo_balao'] = plano.get('tipo_balao') or "anual"
+    if modalidade == "mensal + balão" and agendamento == "Personalizado (Mês a Mês)": canonico.update({'agendamento_baloes': agendamento, 'meses_baloes': [int(mes) for mes in plano.get('meses_baloes') or []]})
+    elif modalidade == "mensal + balão" and agendamento == "A partir do 1º Vencimento": canonico.update({'agendamento_baloes': agendamento, 'mes_primeiro_balao': int(plano.get('mes_primeiro_balao') or 12)})
+    canonico.update({'valor_parcela': float(plano.get('valor_parcela') or 0.0), 'valor_balao': float(plano.get('valor_balao') or 0.0)})
+    return canonico
+
+@st.cache_data(ttl=3600, max_entries=LIMITE_CACHE_CALCULO)
+def simular_cenario(valor_financiado, data_entrada, taxa_mensal, planos, perfil="padrao", versao_politica=None, dias_uteis=None, versao_feriados=None):
+    return comparar_planos(valor_financiado, data_entrada, taxa_mensal, planos, perfil, dias_uteis)
+
+def simular_planos(valor_financiado, data_entrada, taxa_mensal, planos, perfil="padrao", versao_politica=None, dias_uteis=None, versao_feriados=None):
+    """
+    `comparar_planos` com cache compartilhado entre as sessões: corretores que simulam o mesmo
+    cenário reaproveitam o resultado. Antes da consulta ao cache as entradas são canonicalizadas
+    (valor em centavos, data sem horário, planos pela `canonicalizar_plano`, sem repetições e
+    em ordem fixa), de modo que lotes e sessões com o mesmo cenário financeiro caem na mesma
+    entrada; os resultados voltam na ordem de `planos`. `versao_politica` (ver
+    `versao_politica_taxas`) e `versao_feriados` entram na chave para que uma edição da
+    política de taxas ou do calendário de feriados invalide os resultados antigos.
+    """
+    chaves = [json.dumps(canonicalizar_plano(plano), sort_keys=True) for plano in planos]
+    distintos = sorted(set(chaves))
+    resultados = simular_cenario(round(float(valor_financiado), 2), datetime.combine(data_entrada, datetime.min.time()), float(taxa_mensal), [json.loads(chave) for chave in distintos], perfil, versao_politica, dias_uteis, versao_feriados)
+    return [resultados[distintos.index(chave)] for chave in chaves]
+
+def calcular_entrada_necessaria(valor_total, data_entrada, taxa_mensal, plano, valor_alvo, balao_fixo=0.0, perfil="padrao", dias_uteis=None):
+    """
+    Problema inverso de `resolver_valores`: a menor entrada para que o pagamento recorrente do
+    plano (a parcela; nas modalidades só balão, o balão) não passe de `valor_alvo`. Como o
+    valor resolvido é o saldo financiado dividido pela soma dos fatores de valor presente,
+    valor_financiado = valor_alvo * fator_vp_p + balao_fixo * fator_vp_b, sem iteração.
+    Em 'mensal + balão' o balão fica fixo em `balao_fixo` e a parcela é o alvo. Nos sistemas
+    SAC e misto o alvo é a primeira parcela (a maior), com fator 1 / coeficiente do mês 1.
+    Retorna um dict com entrada, valor_financiado, taxa_mensal, valor_parcela e valor_balao
+    resultantes; lança ValueError com a mensagem para o usuário.
+    """
+    _, _, (p,) = preparar_planos([plano], data_entrada, taxa_mensal, perfil, dias_uteis)
+    so_balao = p['modalidade'] in ["só balão anual", "só balão semestral"]
+    fator_alvo = p['fator_vp_b'] if so_balao else p['fator_vp_p']
+    if p['sistema'] != "price" and p['qtd_parcelas'] > 0: fator_alvo = 1.0 / p['coeficientes'][0]
+    if fator_alvo <= 0: raise ValueError("Informe a quantidade de parcelas do plano.")
+    if p['modalidade'] == "mensal + balão" and (balao_fixo <= 0 or not p['qtd_baloes']): raise ValueError("No modo 'mensal + balão', informe o valor fixo do balão.")
+    parcela_fixa = balao_fixo * p['fator_vp_b'] if p['modalidade'] == "mensal + balão" else 0.0
+    # Arredonda o financiado para baixo para que a parcela resolvida não ultrapasse o alvo
+    valor_financiado = min(floor((valor_alvo * fator_alvo + parcela_fixa) * 100) / 100, round(valor_total, 2))
+    if valor_financiado <= 0: raise ValueError("O valor desejado é pequeno demais para este plano.")
+    if p['sistema'] != "price": v_p, v_b = float(resolver_parcelas_sistema(valor_financiado, p['coeficientes'], ajuste_arredondamento=PERFIS_CALCULO[perfil]['ajuste_arredondamento'])[0]), 0.0
+    else: v_p, v_b, _, _ = resolver_valores(valor_financiado, p['modalidade'], p['qtd_parcelas'], p['qtd_baloes'], p['taxa'], p['fator_vp_p'], p['fator_vp_b'], valor_balao=balao_fixo if p['modalidade'] == "mensal + balão" else 0.0)
+    return {'entrada': round(valor_total - valor_financiado, 2), 'valor_financiado': valor_financiado, 'taxa_mensal': p['taxa'], 'valor_parcela': v_p, 'valor_balao': v_b}
+
+# --- Aquecimento dos Caches ---
+# Só o que é puro e seguro entre threads e que o primeiro corretor do dia pagaria a frio: a
+# política de taxas, o calendário de vencimentos de hoje (ver `gerar_calendario`), as tabelas
+# de desconto das convenções periódicas (ver `potencias_periodicas`) e os resultados dos planos
+# modelo (ver `simular_planos`) nos prazos mais comuns. Os cenários aquecidos são configurados
+# por variáveis de ambiente:
+#     SIMULADOR_AQUECIMENTO_PRAZOS       prazos em meses (padrão "120,180,240")
+#     SIMULADOR_AQUECIMENTO_DIAS_UTEIS   regras de vencimento em dia não útil aquecidas além de
+#                                        manter a data: "following", "modifiedfollowing" (padrão nenhuma)
+#     SIMULADOR_AQUECIMENTO_MODALIDADES  modalidades dos planos modelo, separadas por ";" (padrão "mensal;mensal + balão")
+#     SIMULADOR_AQUECIMENTO_VALOR        valor financiado de referência dos planos modelo (padrão 130000)
+PRAZOS_AQUECIMENTO = [int(p) for p in re.findall(r'\d+', os.environ.get("SIMULADOR_AQUECIMENTO_PRAZOS", "120,180,240")) if int(p) > 0]
+DIAS_UTEIS_AQUECIMENTO = [None] + [r for r in re.findall(r'[a-z]+', os.environ.get("SIMULADOR_AQUECIMENTO_DIAS_UTEIS", "").lower()) if r in AJUSTES_DIAS_UTEIS.values()]
+MODALIDADES_AQUECIMENTO = [m.strip() for m in os.environ.get("SIMULADOR_AQUECIMENTO_MODALIDADES", "mensal;mensal + balão").split(";") if m.strip() in MODALIDADES]
+VALOR_AQUECIMENTO = float(os.environ.get("SIMULADOR_AQUECIMENTO_VALOR", "130000"))
+
+def aquecer_caches(prazos=PRAZOS_AQUECIMENTO, regras_dias_uteis=DIAS_UTEIS_AQUECIMENTO, data_entrada=None, modalidades=MODALIDADES_AQUECIMENTO, valor_financiado=VALOR_AQUECIMENTO):
+    """
+    Carrega a política de taxas e, para `data_entrada` (hoje, por padrão) e cada prazo, gera
+    os calendários de cada regra de dia não útil, as tabelas de desconto das convenções
+    comercial (30/360) e mensal na taxa padrão de cada perfil e os resultados de um plano de
+    cada modalidade em `valor_financiado`, com os mesmos argumentos que os formulários usam
+    (app.py no perfil 'padrao', com a taxa de 2 casas do campo; app2.py no 'comercial'), para
+    cair nas mesmas chaves de cache.
+    Retorna quantos itens aqueceu: {'calendarios', 'tabelas', 'resultados'}.
+    """
+    politica = obter_politica_taxas(); versao = versao_politica_taxas()
+    data_entrada = datetime.combine(data_entrada or datetime.now().date(), datetime.min.time())
+    aquecidos = {'calendarios': 0, 'tabelas': 0, 'resultados': 0}
+    for dias_uteis in regras_dias_uteis:
+        for prazo in prazos: gerar_calendario(data_entrada, prazo, dias_uteis, versao_feriados() if dias_uteis else None); aquecidos['calendarios'] += 1
+    for taxa in sorted({politica[perfil]['taxa_padrao'] for perfil in PERFIS_CALCULO}):
+        for prazo in prazos:
+            potencias_periodicas(calcular_taxas(taxa, dias_mes=30)['diaria'], 30, prazo); potencias_periodicas(calcular_taxas(taxa)['mensal'], 1, prazo); aquecidos['tabelas'] += 2
+    for perfil, taxa, regras in (("padrao", round(politica['padrao']['taxa_padrao'], 2), regras_dias_uteis), ("comercial", politica['comercial']['taxa_padrao'], [None])):
+        for dias_uteis in regras:
+            for prazo in prazos:
+                for modalidade in modalidades:
+                    simular_planos(valor_financiado, data_entrada, taxa, [{'modalidade': modalidade, 'qtd_parcelas': prazo}], perfil, versao, dias_uteis, versao_feriados() if dias_uteis else None)
+                    aquecidos['resultados'] += 1
+    return aquecidos
+
+# --- Otimização dos Balões ---
+NOMES_MESES = ["Janeiro", "Fevereiro", "Março", "Abril", "Maio", "Junho", "Julho", "Agosto", "Setembro", "Outubro", "Novembro", "Dezembro"]
+
+def melhores_conjuntos_baloes(fatores, candidatos, intervalo_minimo=1, qtd_maxima=None):
+    """
+    Programação dinâmica sobre os meses candidatos: para cada quantidade k de balões, o
+    conjunto de meses (a pelo menos `intervalo_minimo` meses um do outro) com a maior soma de
+    fatores de valor presente `fatores` (mês m em fatores[m - 1]). Cada k custa uma passada
+    vetorizada sobre os candidatos, sem montar cronogramas.
+    Retorna (somas, conjuntos): somas[k - 1] e conjuntos[k - 1] são os do melhor conjunto com k
+    balões, até `qtd_maxima` ou até não caber mais nenhum balão.
+    """
+    candidatos = np.unique(np.asarray(candidatos, dtype=np.int64))
+    if not len(candidatos): return np.zeros(0), []
+    pesos, posicoes = np.asarray(fatores, dtype=float)[candidatos - 1], np.arange(len(candidatos))
+    # anterior[i]: último candidato que pode anteceder o i-ésimo (-1 se nenhum)
+    anterior = np.searchsorted(candidatos, candidatos - max(int(intervalo_minimo), 1), side='right') - 1
+    qtd_maxima = len(candidatos) if not qtd_maxima else min(int(qtd_maxima), len(candidatos))
+    melhor, origens, somas, conjuntos = pesos.copy(), [np.full(len(candidatos), -1)], [], []
+    for k in range(1, qtd_maxima + 1):
+        # melhor[i]: maior soma com k balões, o último no candidato i; acumulado/arg: o melhor até i
+        acumulado = np.maximum.accumulate(melhor); arg = np.maximum.accumulate(np.where(melhor == acumulado, posicoes, 0))
+        if not np.isfinite(acumulado[-1]): break
+        somas.append(float(acumulado[-1])); i, conjunto = int(arg[-1]), []
+        for origem in reversed(origens): conjunto.append(int(candidatos[i])); i = int(origem[i])
+        conjuntos.append(conjunto[::-1])
+        viavel = anterior >= 0
+        melhor = np.where(viavel, pesos + acumulado[np.maximum(anterior, 0)], -np.inf)
+        origens.append(np.where(viavel, arg[np.maximum(anterior, 0)], -1))
+    return np.array(somas), conjuntos
+
+def otimizar_baloes(valor_financiado, data_entrada, taxa_mensal, qtd_parcelas, valor_maximo_balao, meses_do_ano=None,
+                    intervalo_minimo=1, qtd_maxima_baloes=None, perfil="padrao", dias_uteis=None):
+    """
+    Escolhe os meses dos balões de um plano 'mensal + balão' personalizado (ver `preparar_planos`)
+    que minimizam a parcela mensal, dadas as restrições do cliente: balões só nos meses do ano
+    `meses_do_ano` (1-12; todos se vazio), no máximo `valor_maximo_balao` cada, a pelo menos
+    `intervalo_minimo` meses um do outro e no máximo `qtd_maxima_baloes` balões.
+    Com o balão fixo, parcela = (valor_financiado - balão * soma dos fatores dos meses) /
+    fator_vp_p, então os candidatos são avaliados pela soma dos fatores de valor presente do
+    calendário já calculado (ver `melhores_conjuntos_baloes`). Entre quantidades com a mesma
+    parcela fica a com menos balões; se os balões quitam o financiado, o balão é reduzido.
+    Retorna um dict com meses_baloes, valor_balao, valor_parcela, qtd_baloes e taxa_mensal;
+    lança ValueError com a mensagem para o usuário.
+    """
+    qtd_parcelas = int(qtd_parcelas or 0)
+    if qtd_parcelas <= 0: raise ValueError("Informe a quantidade de parcelas do plano.")
+    if valor_maximo_balao <= 0: raise ValueError("Informe o valor máximo do balão.")
+    plano = {'modalidade': "mensal + balão", 'qtd_parcelas': qtd_parcelas, 'agendamento_baloes': "Personalizado (Mês a Mês)", 'meses_baloes': []}
+    datas, _, (p,) = preparar_planos([plano], data_entrada, taxa_mensal, perfil, dias_uteis)
+    meses = np.arange(1, qtd_parcelas + 1)
+    if meses_do_ano: meses = meses[np.isin([datas[m - 1].month for m in meses.tolist()], list(meses_do_ano))]
+    somas, conjuntos = melhores_conjuntos_baloes(1.0 / p['potencias'], meses, intervalo_minimo, qtd_maxima_baloes)
+    if not conjuntos: raise ValueError("Nenhum mês de vencimento atende às restrições dos balões.")
+    parcelas = np.round(np.maximum(valor_financiado - valor_maximo_balao * somas, 0) / p['fator_vp_p'], 2)
+    k = int(np.argmin(parcelas)) # a primeira ocorrência do mínimo: a menor quantidade de balões
+    valor_balao = min(round(valor_maximo_balao, 2), floor(valor_financiado / somas[k] * 100) / 100)
+    v_p, _, _, _ = resolver_valores(valor_financiado, "mensal + balão", qtd_parcelas, k + 1, p['taxa'], p['fator_vp_p'], float(somas[k]), valor_balao=valor_balao)
+    return {'meses_baloes': conjuntos[k], 'valor_balao': valor_balao, 'valor_parcela': v_p, 'qtd_baloes': k + 1, 'taxa_mensal': p['taxa']}
+
+def tabela_comparativa(resultados):
+    """
+    Resume os planos comparados em um DataFrame com uma linha por modalidade.
+    """
+    linhas = []
+    for r in resultados:
+        total = next((p for p in r['cronograma'] if p['Item'] == 'TOTAL'), None) or {}
+        linhas.append({"Modalidade": r['modalidade'], "Taxa Mensal": r['taxa_mensal'], "Parcelas": r['qtd_parcelas'] if r['valor_parcela'] else 0, "Valor da Parcela": r['valor_parcela'], "Última Parcela": r.get('valor_ultima_parcela') or r['valor_parcela'], "Balões": r['qtd_baloes'], "Valor do Balão": r['valor_balao'], "Valor Total a Pagar": total.get('Valor', 0.0), "Valor Presente Total": total.get('Valor_Presente', 0.0), "Total de Juros": total.get('Desconto_Aplicado', 0.0), "CET a.a.": r.get('cet_anual'), "Observação": r['erro'] or ""})
+    return pd.DataFrame(linhas)
+
+# --- Quitação Antecipada e Renegociação ---
+def cronograma_para_carteira(cronograma, contrato, taxa_mensal):
+    """
+    Converte um cronograma de `comparar_planos` em linhas no formato de carteira
+    ('Contrato', 'Data_Vencimento', 'Valor', 'Taxa_Mensal') aceito por `cotar_quitacao_carteira`.
+    """
+    itens = [p for p in cronograma if p['Item'] != 'TOTAL']
+    return pd.DataFrame({'Contrato': contrato, 'Data_Vencimento': [p['Data_Vencimento'] for p in itens], 'Valor': [p['Valor'] for p in itens], 'Taxa_Mensal': taxa_mensal})
+
+def cotar_quitacao_carteira(carteira, data_cotacao):
+    """
+    Cota a quitação antecipada de uma carteira inteira de uma vez. `carteira` tem uma linha por
+    item do cronograma ('Contrato', 'Data_Vencimento', 'Valor', 'Taxa_Mensal'). Itens com
+    vencimento a partir de `data_cotacao` são trazidos a valor presente na data da cotação,
+    com a mesma taxa diária e o mesmo arredondamento de `calcular_valor_presente`; os
+    vencidos antes dela são considerados pagos.
+    Retorna um DataFrame por contrato com Itens_Restantes, Valor_Nominal, Valor_Quitacao e Desconto.
+    """
+    vencimentos = carteira['Data_Vencimento']
+    if not pd.api.types.is_datetime64_any_dtype(vencimentos): vencimentos = pd.to_datetime(vencimentos, format='%d/%m/%Y')
+    dias = (vencimentos - pd.Timestamp(data_cotacao)).dt.days.to_numpy()
+    taxas_mensais = carteira['Taxa_Mensal'].to_numpy(dtype=float)
+    taxas_diarias = {t: calcular_taxas(t)['diaria'] for t in np.unique(taxas_mensais).tolist()}
+    taxa_diaria = pd.Series(taxas_mensais).map(taxas_diarias).to_numpy()
+    valores = carteira['Valor'].to_numpy(dtype=float)
+
+    abertos = dias >= 0
+    fatores = obter_kernels()['potencias'](dias.astype(float), taxa_diaria.astype(float))
+    valores_presentes = np.where(fatores != 1.0, np.round(valores / fatores, 2), valores)
+    resumo = pd.DataFrame({'Contrato': carteira['Contrato'].to_numpy(), 'Itens_Restantes': abertos.astype(int), 'Valor_Nominal': np.where(abertos, valores, 0.0), 'Valor_Quitacao': np.where(abertos, valores_presentes, 0.0)}).groupby('Contrato', sort=False).sum()
+    resumo[['Valor_Nominal', 'Valor_Quitacao']] = resumo[['Valor_Nominal', 'Valor_Quitacao']].round(2)
+    resumo['Desconto'] = (resumo['Valor_Nominal'] - resumo['Valor_Quitacao']).round(2)
+    return resumo
+
+def cotar_quitacao(cronograma, data_cotacao, taxa_mensal):
+    """
+    Valor para quitar em `data_cotacao` o saldo de um único cronograma (ver `cotar_quitacao_carteira`).
+    """
+    resumo = cotar_quitacao_carteira(cronograma_para_carteira(cronograma, 0, taxa_mensal), data_cotacao)
+    if resumo.empty: return {'itens_restantes': 0, 'valor_nominal': 0.0, 'valor_quitacao': 0.0, 'desconto': 0.0}
+    linha = resumo.iloc[0]
+    return {'itens_restantes': int(linha['Itens_Restantes']), 'valor_nominal': float(linha['Valor_Nominal']), 'valor_quitacao': float(linha['Valor_Quitacao']), 'desconto': float(linha['Desconto'])}
+
+def renegociar_saldo(cronograma, data_cotacao, taxa_mensal, qtd_parcelas, modalidade="mensal"):
+    """
+    Reparcela o saldo em aberto: cota a quitação em `data_cotacao` e gera um novo plano para
+    esse valor a partir da mesma data. Retorna (cotacao, resultado) onde `resultado` segue o
+    formato de `comparar_planos`.
+    """
+    cotacao = cotar_quitacao(cronograma, data_cotacao, taxa_mensal)
+    if cotacao['valor_quitacao'] <= 0: return cotacao, None
+    return cotacao, comparar_planos(cotacao['valor_quitacao'], data_cotacao, taxa_mensal, [{'modalidade': modalidade, 'qtd_parcelas': qtd_parcelas}])[0]
+
+# --- Correção Monetária (INCC/IPCA) ---
+# Série mensal dos índices em CSV, histórico e projeção no mesmo arquivo: colunas mes
+# (AAAA-MM ou MM/AAAA), indice (INCC, IPCA) e variacao (% no mês). Meses são tratados como
+# inteiros de np.datetime64[M].
+CAMINHO_INDICES = os.environ.get("INDICES_CORRECAO", os.path.join(DIRETORIO_APP, "indices_correcao.csv"))
+INDICE_OBRA, INDICE_POS_OBRA = "INCC", "IPCA"
+
+def meses_de(datas):
+    """
+    Meses (inteiros de np.datetime64[M]) de uma coluna de datas ou de textos 'DD/MM/AAAA'.
+    """
+    datas = pd.Series(datas)
+    if not pd.api.types.is_datetime64_any_dtype(datas): datas = pd.to_datetime(datas, format='%d/%m/%Y')
+    return datas.to_numpy().astype('datetime64[M]').astype(np.int64)
+
+@st.cache_resource(max_entries=4)
+def carregar_indices(caminho, mtime):
+    """
+    Lê a série de índices e acumula cada um: {indice: {'inicio', 'acumulado', 'variacao_projecao'}}.
+    acumulado[k] é o número-índice ao fim do mês inicio + k, com 1,0 em `inicio` (o mês anterior
+    ao primeiro da série). Após o último mês, a série é estendida pela `variacao_projecao`
+    (média dos últimos 12 meses). O `mtime` faz parte da chave do cache: o arquivo só é
+    relido quando muda.
+    """
+    df = pd.read_csv(caminho, dtype=str, sep=None, engine='python', encoding='utf-8-sig')
+    df.columns = [normalizar_coluna(c) for c in df.columns]
+    faltando = {'mes', 'indice', 'variacao'} - set(df.columns)
+    if faltando: raise ValueError(f"Colunas obrigatórias ausentes na série de índices: {', '.join(sorted(faltando))}.")
+    df = df.dropna(subset=['mes', 'indice']).reset_index(drop=True)
+    variacoes, invalidos = parse_percentage_series(df['variacao'])
+    meses = pd.to_datetime(df['mes'].str.strip().str.replace(r'^(\d{1,2})/(\d{4})$', r'\2-\1', regex=True), format='mixed', dayfirst=True, errors='coerce')
+    erros = [f"linha {linha + 2}, variacao: '{valor}'" for linha, valor in invalidos.items()] + [f"linha {linha + 2}, mes: '{df['mes'][linha]}'" for linha in np.flatnonzero(meses.isna())]
+    if erros: raise ValueError(f"Valores inválidos na série de índices ({len(erros)}): {'; '.join(erros[:10])}{' ...' if len(erros) > 10 else ''}.")
+    serie = pd.DataFrame({'indice': df['indice'].str.strip().str.upper(), 'mes': meses.to_numpy().astype('datetime64[M]').astype(np.int64), 'variacao': variacoes.to_numpy() / 100})
+    serie = serie.drop_duplicates(['indice', 'mes'], keep='last').sort_values(['indice', 'mes'])
+    indices = {}
+    for nome, grupo in serie.groupby('indice', sort=False):
+        meses_serie, variacao = grupo['mes'].to_numpy(), grupo['variacao'].to_numpy()
+        lacunas = np.flatnonzero(np.diff(meses_serie) != 1)
+        if len(lacunas): raise ValueError(f"A série {nome} não tem o mês {np.datetime64(int(meses_serie[lacunas[0]]) + 1, 'M')}.")
+        indices[nome] = {'inicio': int(meses_serie[0]) - 1, 'acumulado': np.concatenate([[1.0], np.cumprod(1 + variacao)]), 'variacao_projecao': float(variacao[-12:].mean())}
+    return indices
+
+def obter_indices(caminho=CAMINHO_INDICES):
+    """
+    Retorna as séries de índices acumuladas, ou None se não houver arquivo de índices.
+    """
+    if not os.path.exists(caminho): return None
+    return carregar_indices(caminho, os.path.getmtime(caminho))
+
+def numero_indice(serie, meses):
+    """
+    Número-índice de uma série de `carregar_indices` nos `meses`, por consulta direta ao
+    vetor acumulado. Meses anteriores ao início da série valem 1,0 (ver `fatores_correcao`).
+    """
+    posicao = np.maximum(np.asarray(meses, dtype=np.int64) - serie['inicio'], 0); ultimo = len(serie['acumulado']) - 1
+    return serie['acumulado'][np.minimum(posicao, ultimo)] * (1 + serie['variacao_projecao']) ** np.maximum(posicao - ultimo, 0)
+
+def fatores_correcao(indices, meses_base, meses_vencimento, meses_fim_obra, defasagem=1):
+    """
+    Fator de correção de cada vencimento (arrays com broadcast): INCC do mês base até o fim
+    da obra e IPCA daí em diante. Com N o número-índice, d a `defasagem` (o vencimento usa o
+    índice já divulgado d meses antes) e s = min(max(fim_obra, base), vencimento) o mês da
+    troca de índice, o fator é N_incc(s - d) / N_incc(base - d) * N_ipca(venc - d) / N_ipca(s - d).
+    Vencimentos até o mês base não são corrigidos. Lança ValueError se faltar série ou se
+    algum trecho necessário começar antes dela.
+    """
+    base = np.asarray(meses_base, dtype=np.int64); vencimento = np.maximum(np.asarray(meses_vencimento, dtype=np.int64), base)
+    troca = np.minimum(np.maximum(np.asarray(meses_fim_obra, dtype=np.int64), base), vencimento)
+    fator = 1.0
+    for nome, inicio, fim in ((INDICE_OBRA, base, troca), (INDICE_POS_OBRA, troca, vencimento)):
+        inicio, fim = np.broadcast_arrays(inicio - defasagem, fim - defasagem); usado = fim > inicio
+        if not usado.any(): continue
+        if nome not in indices: raise ValueError(f"A série de índices não tem o {nome}.")
+        serie = indices[nome]
+        if inicio[usado].min() < serie['inicio']: raise ValueError(f"A série {nome} começa em {np.datetime64(serie['inicio'] + 1, 'M')}; a correção precisa dela desde {np.datetime64(int(inicio[usado].min()) + 1, 'M')}.")
+        fator = fator * np.where(usado, numero_indice(serie, fim) / numero_indice(serie, inicio), 1.0)
+    return np.broadcast_to(fator, vencimento.shape)
+
+def corrigir_carteira(carteira, data_base, fim_obra, indices, defasagem=1):
+    """
+    Correção monetária projetada de uma carteira inteira de uma vez. `carteira` tem uma linha
+    por item ('Contrato', 'Data_Vencimento', 'Valor', ...; ver `cronograma_para_carteira`);
+    `data_base` e `fim_obra` são datas únicas ou colunas alinhadas à carteira.
+    Retorna um DataFrame por contrato com Itens, Valor_Nominal, Valor_Corrigido e Correcao.
+    """
+    meses_base = meses_de(data_base if isinstance(data_base, pd.Series) else [data_base])
+    meses_obra = meses_de(fim_obra if isinstance(fim_obra, pd.Series) else [fim_obra])
+    valores = carteira['Valor'].to_numpy(dtype=float)
+    corrigidos = np.round(valores * fatores_correcao(indices, meses_base, meses_de(carteira['Data_Vencimento']), meses_obra, defasagem), 2)
+    resumo = pd.DataFrame({'Contrato': carteira['Contrato'].to_numpy(), 'Itens': 1, 'Valor_Nominal': valores, 'Valor_Corrigido': corrigidos}).groupby('Contrato', sort=False).sum()
+    resumo[['Valor_Nominal', 'Valor_Corrigido']] = resumo[['Valor_Nominal', 'Valor_Corrigido']].round(2)
+    resumo['Correcao'] = (resumo['Valor_Corrigido'] - resumo['Valor_Nominal']).round(2)
+    return resumo
+
+def corrigir_cronograma(cronograma, data_base, fim_obra, indices, defasagem=1):
+    """
+    Cópia do cronograma com Fator_Correcao e Valor_Corrigido em cada item e o total corrigido
+    na linha TOTAL (ver `fatores_correcao`).
+    """
+    itens = [dict(p) for p in cronograma if p['Item'] != 'TOTAL']
+    if not itens: return []
+    fatores = fatores_correcao(indices, meses_de([data_base])[0], meses_de([p['Data_Vencimento'] for p in itens]), meses_de([fim_obra])[0], defasagem)
+    corrigidos = np.round(np.array([p['Valor'] for p in itens], dtype=float) * fatores, 2)
+    for p, f, v in zip(itens, fatores.tolist(), corrigidos.tolist()): p.update({'Fator_Correcao': round(f, 6), 'Valor_Corrigido': v})
+    total = next((dict(p) for p in cronograma if p['Item'] == 'TOTAL'), None)
+    if total: itens.append({**total, 'Fator_Correcao': "", 'Valor_Corrigido': round(float(corrigidos.sum()), 2)})
+    return itens
+
+# --- Conciliação de Pagamentos ---
+# Arquivos de retorno do banco, lidos localmente: CSV (contrato, data_vencimento,
+# data_pagamento, valor_pago) ou posicional no estilo CNAB, com um registro por linha, datas
+# DDMMAAAA e valores em centavos. Do posicional só entram os registros de detalhe (tipo '1').
+LAYOUT_RETORNO = {'tipo_registro': (0, 1), 'contrato': (1, 21), 'data_vencimento': (21, 29), 'data_pagamento': (29, 37), 'valor_pago': (37, 52)}
+COLUNAS_RETORNO = {
+    "contrato": "contrato", "quadra_lote": "contrato", "data_vencimento": "data_vencimento", "vencimento": "data_vencimento",
+    "data_pagamento": "data_pagamento", "pagamento": "data_pagamento", "data_credito": "data_pagamento", "valor_pago": "valor_pago", "valor": "valor_pago",
+}
+MULTA_ATRASO, JUROS_MORA_MENSAL = 2.0, 1.0 # % sobre o item; % a.m. pro rata die
+
+def ler_retorno_bancario(arquivo, layout=LAYOUT_RETORNO):
+    """
+    Lê um arquivo de retorno (caminho ou arquivo enviado) em um DataFrame com Contrato,
+    Data_Vencimento, Data_Pagamento e Valor_Pago. No formato posicional os campos são
+    recortados da coluna de linhas inteira com kernels do pyarrow, sem laço por registro.
+    Lança ValueError listando as linhas inválidas.
+    """
+    if isinstance(arquivo, str):
+        with open(arquivo, "rb") as f: conteudo, nome = f.read(), arquivo
+    else: conteudo, nome = arquivo.getvalue(), arquivo.name
+    if nome.lower().endswith('.csv'):
+        df = pd.read_csv(BytesIO(conteudo), dtype=str, sep=None, engine='python', encoding='utf-8-sig')
+        df.columns = [COLUNAS_RETORNO.get(normalizar_coluna(c), normalizar_coluna(c)) for c in df.columns]
+        faltando = {'contrato', 'data_vencimento', 'data_pagamento', 'valor_pago'} - set(df.columns)
+        if faltando: raise ValueError(f"Colunas obrigatórias ausentes no retorno: {', '.join(sorted(faltando))}.")
+        df = df.dropna(subset=['contrato']); linhas = df.index + 2
+        valores, invalidos = parse_currency_series(df['valor_pago'])
+        erros = [f"linha {linha + 2}, valor_pago: '{valor}'" for linha, valor in invalidos.items()]; formato_data = '%d/%m/%Y'
+    else:
+        registros = pa.array(conteudo.decode('latin-1').splitlines(), pa.string())
+        campos = {campo: pc.utf8_trim_whitespace(pc.utf8_slice_codeunits(registros, inicio, fim)) for campo, (inicio, fim) in layout.items()}
+        detalhe = pc.equal(campos.pop('tipo_registro'), '1')
+        df = pd.DataFrame({campo: pc.filter(coluna, detalhe).to_pandas() for campo, coluna in campos.items()})
+        linhas = pd.Index(np.flatnonzero(detalhe.to_numpy(zero_copy_only=False)) + 1)
+        centavos = pd.to_numeric(df['valor_pago'].where(df['valor_pago'].str.fullmatch(r'\d+')), errors='coerce')
+        erros = [f"linha {linha}, valor_pago: '{valor}'" for linha, valor in zip(linhas[centavos.isna().to_numpy()], df['valor_pago'][centavos.isna()])]
+        valores, formato_data = centavos / 100, '%d%m%Y'
+    datas = {campo: pd.to_datetime(df[campo].str.strip(), format=formato_data, errors='coerce') for campo in ('data_vencimento', 'data_pagamento')}
+    for campo, serie in datas.items(): erros += [f"linha {linha}, {campo}: '{valor}'" for linha, valor in zip(linhas[serie.isna().to_numpy()], df[campo][serie.isna()])]
+    if erros: raise ValueError(f"Valores inválidos no retorno ({len(erros)}): {'; '.join(erros[:10])}{' ...' if len(erros) > 10 else ''}.")
+    return pd.DataFrame({'Contrato': df['contrato'].str.strip().to_numpy(), 'Data_Vencimento': datas['data_vencimento'].to_numpy(), 'Data_Pagamento': datas['data_pagamento'].to_numpy(), 'Valor_Pago': valores.to_numpy(dtype=float)})
+
+def calcular_encargos(valores, dias_atraso, multa=MULTA_ATRASO, juros_mora_mensal=JUROS_MORA_MENSAL):
+    """
+    Multa (percentual único) e juros de mora (pro rata die, mês de 30 dias) dos itens com
+    `dias_atraso` > 0, para arrays inteiros. Retorna (multa, juros_mora), arredondados.
+    """
+    valores = np.asarray(valores, dtype=float); atraso = np.maximum(np.asarray(dias_atraso), 0)
+    return np.round(np.where(atraso > 0, valores * multa / 100, 0.0), 2), np.round(valores * juros_mora_mensal / 100 / 30 * atraso, 2)
+
+def conciliar_pagamentos(carteira, pagamentos, data_referencia, multa=MULTA_ATRASO, juros_mora_mensal=JUROS_MORA_MENSAL, tolerancia=0.01):
+    """
+    Concilia os pagamentos de um retorno (ver `ler_retorno_bancario`) com os itens de uma
+    carteira ('Contrato', 'Data_Vencimento', 'Valor', ...; ver `carteira_binaria`). Os
+    candidatos de cada pagamento saem de um join por contrato e vencimento. Entre eles (parcela
+    e balão no mesmo dia, pagamento em duplicidade) cada pagamento prefere o item de valor
+    devido, com multa e mora até o pagamento, mais próximo do valor pago; cada item e cada
+    pagamento é usado uma vez. A atribuição é feita em rodadas: os pagamentos livres se
+    oferecem ao próximo candidato, cada item fica com a oferta mais próxima e os preteridos
+    passam ao candidato seguinte, de modo que nenhum pagamento fica sem item enquanto houver
+    um candidato dele livre.
+    Retorna (itens, pagamentos): a carteira com Data_Pagamento, Valor_Pago, Dias_Atraso, Multa,
+    Juros_Mora, Diferenca e Situacao ('pago', 'pago a menor', 'vencido' com encargos até
+    `data_referencia`, ou 'a vencer'), e os pagamentos com Item (linha da carteira, -1 se não
+    identificado) e Situacao ('conciliado' ou 'não identificado').
+    """
+    vencimentos = carteira['Data_Vencimento']
+    if not pd.api.types.is_datetime64_any_dtype(vencimentos): vencimentos = pd.to_datetime(vencimentos, format='%d/%m/%Y')
+    n = len(carteira); referencia = pd.Timestamp(data_referencia).to_datetime64().astype('datetime64[D]').astype(np.int64)
+    codigos, _ = pd.factorize(np.concatenate([carteira['Contrato'].astype(str).to_numpy(), pagamentos['Contrato'].astype(str).to_numpy()]))
+    dias_vencimento = vencimentos.to_numpy().astype('datetime64[D]').astype(np.int64)
+    dias_pagamento = pagamentos['Data_Pagamento'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    candidatos = pd.DataFrame({'contrato': codigos[n:], 'vencimento': pagamentos['Data_Vencimento'].to_numpy().astype('datetime64[D]').astype(np.int64), 'pagamento': np.arange(len(pagamentos))}).merge(
+        pd.DataFrame({'contrato': codigos[:n], 'vencimento': dias_vencimento, 'item': np.arange(n)}), on=['contrato', 'vencimento'])
+    pagamento, item = candidatos['pagamento'].to_numpy(), candidatos['item'].to_numpy()
+    valores, pagos = carteira['Valor'].to_numpy(dtype=float), pagamentos['Valor_Pago'].to_numpy(dtype=float)
+    multas, moras = calcular_encargos(valores[item], dias_pagamento[pagamento] - dias_vencimento[item], multa, juros_mora_mensal)
+    custo = np.abs(pagos[pagamento] - valores[item] - multas - moras)
+    ordem = np.lexsort((item, custo, pagamento)); pagamento, item, custo = pagamento[ordem], item[ordem], custo[ordem]
+    proxima = np.searchsorted(pagamento, np.arange(len(pagamentos))); fim = np.searchsorted(pagamento, np.arange(len(pagamentos)), 'right') # candidatos de cada pagamento, do preferido ao último
+    pagamento_do_item = np.full(n, -1, dtype=np.int64); livres = np.flatnonzero(proxima < fim)
+    while len(livres):
+        titulares = pagamento_do_item[np.unique(item[proxima[livres]])]
+        disputa = np.concatenate([livres, titulares[titulares >= 0]]); posicao = proxima[disputa]
+        o = np.lexsort((disputa, custo[posicao], item[posicao])); disputa, disputados = disputa[o], item[posicao[o]]
+        vence = np.concatenate([[True], disputados[1:] != disputados[:-1]])
+        pagamento_do_item[disputados[vence]] = disputa[vence]
+        preteridos = disputa[~vence]; proxima[preteridos] += 1
+        livres = preteridos[proxima[preteridos] < fim[preteridos]]
+    item_do_pagamento = np.full(len(pagamentos), -1, dtype=np.int64); item_do_pagamento[pagamento_do_item[pagamento_do_item >= 0]] = np.flatnonzero(pagamento_do_item >= 0)
+    pago = pagamento_do_item >= 0; de_pago = pagamento_do_item[pago]
+    dias_fim = np.full(n, referencia, dtype=np.int64); dias_fim[pago] = dias_pagamento[de_pago]
+    atraso = np.maximum(dias_fim - dias_vencimento, 0)
+    multas, moras = calcular_encargos(valores, atraso, multa, juros_mora_mensal)
+    valor_pago = np.zeros(n); valor_pago[pago] = pagos[de_pago]
+    diferenca = np.where(pago, np.round(valor_pago - valores - multas - moras, 2), 0.0)
+    data_pagamento = np.full(n, np.datetime64('NaT'), dtype='datetime64[D]'); data_pagamento[pago] = dias_pagamento[de_pago].astype('datetime64[D]')
+    situacao = np.select([pago & (diferenca >= -tolerancia), pago, dias_vencimento < referencia], ['pago', 'pago a menor', 'vencido'], 'a vencer')
+    itens = carteira.assign(Data_Vencimento=vencimentos.to_numpy(), Data_Pagamento=data_pagamento, Valor_Pago=valor_pago, Dias_Atraso=atraso, Multa=multas, Juros_Mora=moras, Diferenca=diferenca, Situacao=situacao)
+    return itens, pagamentos.assign(Item=item_do_pagamento, Situacao=np.where(item_do_pagamento >= 0, 'conciliado', 'não identificado'))
+
+def resumir_conciliacao(itens):
+    """
+    Resume por contrato uma conciliação (ver `conciliar_pagamentos`): itens pagos, pagos a
+    menor e vencidos, valor pago, encargos pagos e saldo vencido com encargos.
+    """
+    situacao = itens['Situacao'].to_numpy(); pago = np.isin(situacao, ['pago', 'pago a menor'])
+    encargos = itens['Multa'].to_numpy() + itens['Juros_Mora'].to_numpy()
+    saldo = np.where(situacao == 'vencido', itens['Valor'].to_numpy(dtype=float) + encargos, 0.0) - np.where(situacao == 'pago a menor', itens['Diferenca'].to_numpy(), 0.0)
+    resumo = pd.DataFrame({'Contrato': itens['Contrato'].to_numpy(), 'Itens': 1, 'Pagos': situacao == 'pago', 'Pagos_a_Menor': situacao == 'pago a menor', 'Vencidos': situacao == 'vencido',
+                           'Valor_Pago': itens['Valor_Pago'].to_numpy(), 'Encargos_Pagos': np.where(pago, encargos, 0.0), 'Saldo_Vencido': saldo}).groupby('Contrato', sort=False).sum()
+    resumo[['Valor_Pago', 'Encargos_Pagos', 'Saldo_Vencido']] = resumo[['Valor_Pago', 'Encargos_Pagos', 'Saldo_Vencido']].round(2)
+    return resumo
+
+# --- Catálogo de Lotes ---
+CAMINHO_CATALOGO = os.environ.get("CATALOGO_LOTES", os.path.join(DIRETORIO_APP, "catalogo_lotes.csv"))
+# Nomes de coluna aceitos (já normalizados) e o campo correspondente no catálogo
+COLUNAS_CATALOGO = {
+    "quadra": "quadra", "lote": "lote", "metragem": "metragem", "area": "metragem", "metragem_m2": "metragem",
+    "preco_m2": "preco_m2", "preco_por_m2": "preco_m2", "valor_m2": "preco_m2", "valor_por_m2": "preco_m2",
+    "preco_total": "preco_total", "valor_total": "preco_total", "preco": "preco_total", "valor": "preco_total",
+    "status": "status", "situacao": "status",
+}
+
+def normalizar_coluna(nome):
+    nome = unicodedata.normalize('NFKD', str(nome)).encode('ascii', 'ignore').decode().lower()
+    return re.sub(r'[^a-z0-9]+', '_', nome).strip('_')
+
+@st.cache_data(max_entries=4)
+def carregar_catalogo(caminho, mtime):
+    """
+    Lê o catálogo de lotes (CSV ou XLSX) e o indexa por (quadra, lote).
+    O `mtime` do arquivo faz parte da chave do cache: o arquivo só é relido quando muda.
+    """
+    if caminho.lower().endswith(('.xlsx', '.xls')): df = pd.read_excel(caminho, dtype=str)
+    else: df = pd.read_csv(caminho, dtype=str, sep=None, engine='python', encoding='utf-8-sig')
+    df.columns = [COLUNAS_CATALOGO.get(normalizar_coluna(c), normalizar_coluna(c)) for c in df.columns]
+    faltando = {'quadra', 'lote', 'metragem'} - set(df.columns)
+    if faltando: raise ValueError(f"Colunas obrigatórias ausentes no catálogo: {', '.join(sorted(faltando))}.")
+    if 'preco_m2' not in df.columns and 'preco_total' not in df.columns: raise ValueError("O catálogo precisa da coluna de preço por m² ou de preço total.")
+
+    df = df.dropna(subset=['quadra', 'lote'])
+    df['quadra'], df['lote'] = df['quadra'].str.strip(), df['lote'].str.strip()
+    df = df.drop_duplicates(['quadra', 'lote'], keep='last')
+    erros = []
+    for coluna in ['metragem', 'preco_m2', 'preco_total']:
+        if coluna not in df.columns: continue
+        df[coluna], invalidos = parse_currency_series(df[coluna])
+        erros += [f"linha {linha + 2}, {coluna}: '{valor}'" for linha, valor in invalidos.items()]
+    if erros: raise ValueError(f"Valores inválidos no catálogo ({len(erros)}): {'; '.join(erros[:10])}{' ...' if len(erros) > 10 else ''}.")
+    if 'preco_m2' not in df.columns: df['preco_m2'] = 0.0
+    preco_total = df['preco_total'] if 'preco_total' in df.columns else 0.0
+    df['valor_total'] = np.where(preco_total > 0, preco_total, (df['metragem'] * df['preco_m2']).round(2))
+    df['status'] = df['status'].fillna('disponível').str.strip().str.lower() if 'status' in df.columns else 'disponível'
+    return df[['quadra', 'lote', 'metragem', 'preco_m2', 'valor_total', 'status']].set_index(['quadra', 'lote']).sort_index()
+
+def obter_catalogo(caminho=CAMINHO_CATALOGO):
+    """
+    Retorna o catálogo de lotes, ou None se não houver arquivo de catálogo.
+    """
+    if not os.path.exists(caminho): return None
+    return carregar_catalogo(caminho, os.path.getmtime(caminho))
+
+def importar_catalogo(arquivo, caminho=CAMINHO_CATALOGO):
+    """
+    Valida um arquivo enviado pelo usuário e o grava como catálogo. O novo mtime faz com que
+    a próxima leitura recarregue o catálogo.
+    """
+    extensao = os.path.splitext(arquivo.name)[1].lower()
+    temporario = f"{caminho}.importacao{extensao}"
+    with open(temporario, "wb") as f: f.write(arquivo.getvalue())
+    try:
+        catalogo = carregar_catalogo(temporario, os.path.getmtime(temporario))
+        if extensao != os.path.splitext(caminho)[1].lower(): catalogo.reset_index().to_csv(caminho + ".tmp", index=False, sep=';', decimal=',', encoding='utf-8'); os.replace(caminho + ".tmp", caminho)
+        else: os.replace(temporario, caminho)
+        return catalogo
+    finally:
+        if os.path.exists(temporario): os.remove(temporario)
+
+def gerar_tabela_precos(catalogo, data_entrada, taxa_mensal, planos, percentual_entrada=0.0, somente_disponiveis=True, dias_uteis=None):
+    """
+    Gera a tabela de preços do catálogo: para cada lote, o valor da parcela (ou do balão)
+    em cada plano. Calendário e fatores de desconto de cada plano são calculados uma vez
+    e reaproveitados para todos os lotes, e cada valor financiado distinto é resolvido uma
+    única vez (lotes de mesmo preço compartilham o resultado).
+    """
+    lotes = catalogo[catalogo['status'].str.startswith('dispon')] if somente_disponiveis else catalogo
+    valores_totais = lotes['valor_total'].to_numpy(dtype=float)
+    entradas = np.round(valores_totais * percentual_entrada / 100, 2)
+    financiados = np.round(valores_totais - entradas, 2)
+    tabela = pd.DataFrame({'Quadra': lotes.index.get_level_values('quadra'), 'Lote': lotes.index.get_level_values('lote'), 'Metragem': lotes['metragem'].to_numpy(), 'Valor Total': valores_totais, 'Entrada': entradas, 'Valor Financiado': financiados})
+    _, _, preparados = preparar_planos(planos, data_entrada, taxa_mensal, dias_uteis=dias_uteis)
+    distintos, repeticao = np.unique(financiados, return_inverse=True)
+    for p in preparados:
+        qtd = p['qtd_parcelas'] if p['meses_p'] else p['qtd_baloes']
+        if p['sistema'] != "price": # SAC e misto: a primeira parcela de todos os lotes de uma vez
+            try: tabela[f"{p['modalidade']} {qtd}x ({p['taxa']:.2f}%) - 1ª parcela"] = resolver_parcelas_sistema(financiados, p['coeficientes'], p['plano'].get('valor_parcela', 0.0))[:, 0]
+            except ValueError: tabela[f"{p['modalidade']} {qtd}x ({p['taxa']:.2f}%) - 1ª parcela"] = np.nan
+            continue
+        valores = []
+        for valor_financiado in distintos.tolist():
+            try: v_p, v_b, _, _ = resolver_valores(valor_financiado, p['modalidade'], p['qtd_parcelas'], p['qtd_baloes'], p['taxa'], p['fator_vp_p'], p['fator_vp_b'], p['plano'].get('valor_parcela', 0.0), p['plano'].get('valor_balao', 0.0))
+            except ValueError: v_p, v_b = np.nan, np.nan
+            valores.append(v_p or v_b)
+        tabela[f"{p['modalidade']} {qtd}x ({p['taxa']:.2f}%)"] = np.asarray(valores, dtype=float)[repeticao]
+    return tabela
+
+# --- Cronogramas em Lote (Formato Binário) ---
+DIRETORIO_CRONOGRAMAS = os.environ.get("CRONOGRAMAS_LOTES", os.path.join(DIRETORIO_APP, "cronogramas_lotes"))
+COLUNAS_BINARIAS = {'tipo': np.int8, 'mes': np.int16, 'data': 'datetime64[D]', 'dias': np.int32, 'valor': np.float64, 'valor_presente': np.float64, 'juros_periodo': np.float64, 'amortizacao': np.float64, 'saldo_devedor': np.float64}
+TIPOS_BINARIOS = ["Parcela", "Balão"]
+
+def gravar_cronogramas_catalogo(catalogo, data_entrada, taxa_mensal, planos, diretorio=DIRETORIO_CRONOGRAMAS,
+                                percentual_entrada=0.0, somente_disponiveis=True, perfil="padrao", lotes_por_bloco=2048, dias_uteis=None):
+    """
+    Gera o cronograma completo de cada lote do catálogo em cada plano e grava tudo em formato
+    colunar binário: um .npy por coluna de COLUNAS_BINARIAS (lido depois com mmap) e um
+    índice (indice.csv) com o intervalo de linhas [inicio, fim) de cada lote/plano.
+    As linhas de um lote ficam contíguas; dentro de um plano, parcelas e depois balões, como
+    no cronograma. Os valores são calculados como matrizes lotes x vencimentos, em blocos de
+    `lotes_por_bloco`, sem montar dicts por linha, e só uma vez por valor financiado distinto:
+    lotes de mesmo preço recebem cópias das mesmas linhas.
+    Cada gravação é um conjunto próprio em `diretorio`: os arquivos são escritos num diretório
+    temporário, renomeado ao final para "<data-hora>-<sufixo>", de modo que leitores e outras
+    gravações nunca veem um conjunto pela metade. Retorna (diretório do conjunto, índice).
+    """
+    config = PERFIS_CALCULO[perfil]
+    lotes = catalogo[catalogo['status'].str.startswith('dispon')] if somente_disponiveis else catalogo
+    valores_totais = lotes['valor_total'].to_numpy(dtype=float)
+    financiados = np.round(valores_totais - np.round(valores_totais * percentual_entrada / 100, 2), 2)
+    distintos, repeticao = np.unique(financiados, return_inverse=True)
+    datas, _, preparados = preparar_planos(planos, data_entrada, taxa_mensal, perfil, dias_uteis)
+    datas = np.array(datas, dtype='datetime64[D]')
+    tamanhos = [len(p['meses_p']) + len(p['meses_b']) for p in preparados]
+    deslocamentos = np.concatenate([[0], np.cumsum(tamanhos)]).astype(np.int64)
+
+    os.makedirs(diretorio, exist_ok=True)
+    temporario = tempfile.mkdtemp(prefix=".gravando-", dir=diretorio)
+    try: indice = escrever_cronogramas(temporario, lotes, financiados, distintos, repeticao, datas, preparados, tamanhos, deslocamentos, config, lotes_por_bloco)
+    except BaseException: shutil.rmtree(temporario, ignore_errors=True); raise
+    destino = os.path.join(diretorio, datetime.now().strftime("%Y%m%d-%H%M%S-") + os.path.basename(temporario).removeprefix(".gravando-"))
+    os.replace(temporario, destino)
+    return destino, indice
+
+def escrever_cronogramas(diretorio, lotes, financiados, distintos, repeticao, datas, preparados, tamanhos, deslocamentos, config, lotes_por_bloco):
+    """Escreve as colunas e o índice de `gravar_cronogramas_catalogo` em um diretório vazio."""
+    qtd_distintos, qtd_lotes, largura = len(distintos), len(lotes), int(deslocamentos[-1])
+    colunas = {nome: np.lib.format.open_memmap(os.path.join(diretorio, f"{nome}.npy"), mode='w+', dtype=tipo, shape=(qtd_lotes * largura,)) for nome, tipo in COLUNAS_BINARIAS.items()}
+    matrizes = {nome: coluna.reshape(qtd_lotes, largura) for nome, coluna in colunas.items()}
+    indices = []
+    for j, p in enumerate(preparados):
+        qtd_p = len(p['meses_p']); meses = np.asarray(p['meses_p'] + p['meses_b'], dtype=np.int64)
+        tipos = np.repeat(np.array([0, 1], dtype=np.int8), [qtd_p, len(p['meses_b'])])
+        ordem = np.lexsort((meses, tipos)); potencias = p['potencias'][meses[ordem] - 1]
+        cronologica = np.argsort(p['dias'][meses[ordem] - 1], kind='stable'); inversa = np.argsort(cronologica)
+        bloco_linhas = slice(deslocamentos[j], deslocamentos[j + 1])
+        for nome, valor in (('tipo', tipos[ordem]), ('mes', meses[ordem]), ('data', datas[meses[ordem] - 1]), ('dias', p['dias'][meses[ordem] - 1])):
+            matrizes[nome][:, bloco_linhas] = valor
+
+        # Valores resolvidos por valor financiado distinto; `repeticao` leva cada lote ao seu cenário
+        v_p, v_b = np.full(qtd_distintos, np.nan), np.full(qtd_distintos, np.nan); ajuste_p, ajuste_b = v_p.copy(), v_b.copy(); erros = [""] * qtd_distintos
+        parcelas_sistema = None
+        if p['sistema'] != "price":
+            try: parcelas_sistema = resolver_parcelas_sistema(distintos, p['coeficientes'], p['plano'].get('valor_parcela', 0.0), config['ajuste_arredondamento'])
+            except ValueError as e: erros = [str(e)] * qtd_distintos
+            else: v_p, v_b = parcelas_sistema[:, 0], np.zeros(qtd_distintos)
+        for i, valor_financiado in enumerate(distintos.tolist() if p['sistema'] == "price" else []):
+            try: resolvidos = resolver_valores(valor_financiado, p['modalidade'], p['qtd_parcelas'], p['qtd_baloes'], p['taxa'], p['fator_vp_p'], p['fator_vp_b'], p['plano'].get('valor_parcela', 0.0), p['plano'].get('valor_balao', 0.0))
+            except ValueError as e: erros[i] = str(e); continue
+            v_p[i], v_b[i] = resolvidos[0], resolvidos[1]
+            ajuste_p[i] = resolvidos[0] if resolvidos[2] is None else resolvidos[2]; ajuste_b[i] = resolvidos[1] if resolvidos[3] is None else resolvidos[3]
+
+        posicao = 0 if config['ajuste_arredondamento'] == "primeira" else -1; juros_totais, amortizacoes_totais, cets = np.zeros(qtd_lotes), np.zeros(qtd_lotes), np.full(qtd_lotes, np.nan)
+        for ini in range(0, qtd_lotes, lotes_por_bloco):
+            lotes_bloco = slice(ini, min(ini + lotes_por_bloco, qtd_lotes))
+            cenarios, expandir = np.unique(repeticao[lotes_bloco], return_inverse=True) # calcula os distintos do bloco e replica por lote
+            valores = np.where(tipos == 0, v_p[cenarios, None], v_b[cenarios, None])
+            if qtd_p: valores[:, np.arange(qtd_p)[posicao]] = ajuste_p[cenarios]
+            if len(p['meses_b']): valores[:, qtd_p + np.arange(len(p['meses_b']))[posicao]] = ajuste_b[cenarios]
+            if parcelas_sistema is not None: valores[:, :qtd_p] = parcelas_sistema[cenarios]
+            valores = np.round(valores[:, ordem], 2)
+            juros, amortizacao, saldo = (m[:, inversa] for m in calcular_amortizacao(valores[:, cronologica], 0, distintos[cenarios], 0.0, np.broadcast_to(potencias[cronologica], valores.shape)))
+            juros_totais[lotes_bloco], amortizacoes_totais[lotes_bloco] = juros.sum(axis=1).round(2)[expandir], amortizacao.sum(axis=1).round(2)[expandir]
+            cets[lotes_bloco] = calcular_cet(valores, p['dias'][meses[ordem] - 1], distintos[cenarios])[0].round(4)[expandir]
+            matrizes['valor'][lotes_bloco, bloco_linhas] = valores[expandir]
+            matrizes['valor_presente'][lotes_bloco, bloco_linhas] = np.where(potencias != 1.0, np.round(valores / potencias, 2), valores)[expandir]
+            matrizes['juros_periodo'][lotes_bloco, bloco_linhas] = np.round(juros, 2)[expandir]; matrizes['amortizacao'][lotes_bloco, bloco_linhas] = np.round(amortizacao, 2)[expandir]
+            matrizes['saldo_devedor'][lotes_bloco, bloco_linhas] = np.round(saldo, 2)[expandir] + 0.0
+
+        valores_presentes = matrizes['valor_presente'][:, bloco_linhas].sum(axis=1).round(2) if tamanhos[j] else np.zeros(qtd_lotes)
+        indices.append(pd.DataFrame({'quadra': lotes.index.get_level_values('quadra'), 'lote': lotes.index.get_level_values('lote'), 'plano': j, 'modalidade': p['modalidade'],
+                                     'qtd_parcelas': p['qtd_parcelas'], 'qtd_baloes': p['qtd_baloes'], 'taxa_mensal': p['taxa'], 'valor_financiado': financiados, 'valor_parcela': v_p[repeticao], 'valor_balao': v_b[repeticao],
+                                     'valor_presente_total': financiados if config['vp_total'] == "financiado" else valores_presentes, 'juros_total': juros_totais, 'amortizacao_total': amortizacoes_totais, 'cet_anual': cets,
+                                     'inicio': np.arange(qtd_lotes, dtype=np.int64) * largura + deslocamentos[j], 'fim': np.arange(qtd_lotes, dtype=np.int64) * largura + deslocamentos[j + 1], 'erro': [erros[k] for k in repeticao.tolist()]}))
+
+    for coluna in colunas.values(): coluna.flush()
+    matrizes.clear(); colunas.clear() # libera os mmaps antes de renomear o diretório
+    indice = pd.concat(indices, ignore_index=True).sort_values(['inicio'], kind='stable').reset_index(drop=True) if indices else pd.DataFrame()
+    indice.to_csv(os.path.join(diretorio, "indice.csv"), index=False)
+    return indice
+
+def listar_conjuntos_cronogramas(diretorio=DIRETORIO_CRONOGRAMAS):
+    """Conjuntos completos gravados por `gravar_cronogramas_catalogo`, do mais recente ao mais antigo."""
+    if not os.path.isdir(diretorio): return []
+    return [os.path.join(diretorio, nome) for nome in sorted(os.listdir(diretorio), reverse=True) if not nome.startswith(".") and os.path.exists(os.path.join(diretorio, nome, "indice.csv"))]
+
+def abrir_cronogramas(diretorio):
+    """
+    Abre um conjunto gravado por `gravar_cronogramas_catalogo` sem ler as colunas: cada uma
+    vira um np.memmap somente leitura e só as fatias acessadas saem do disco.
+    Retorna (indice, colunas).
+    """
+    indice = pd.read_csv(os.path.join(diretorio, "indice.csv"), dtype={'quadra': str, 'lote': str, 'erro': str}, keep_default_na=False)
+    return indice, {nome: np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode='r') for nome in COLUNAS_BINARIAS}
+
+def cronograma_do_lote(indice, colunas, quadra, lote, plano=0):
+    """
+    Lê do formato binário o cronograma de um lote/plano no mesmo formato de lista de dicts
+    (com a linha TOTAL) usado na tela e nas exportações, copiando só as linhas dele.
+    """
+    selecao = indice[(indice['quadra'] == str(quadra)) & (indice['lote'] == str(lote)) & (indice['plano'] == plano)]
+    if selecao.empty: raise ValueError(f"Lote {quadra}/{lote} não encontrado para o plano {plano}.")
+    registro = selecao.iloc[0]
+    if registro['erro']: raise ValueError(registro['erro'])
+    fatia = {nome: np.asarray(coluna[int(registro['inicio']):int(registro['fim'])]).tolist() for nome, coluna in colunas.items()}
+    numeros, cronograma = [0, 0], []
+    for k in range(len(fatia['tipo'])):
+        tipo = fatia['tipo'][k]; numeros[tipo] += 1; valor = fatia['valor'][k]; vp = fatia['valor_presente'][k]
+        cronograma.append({"Item": f"{TIPOS_BINARIOS[tipo]} {numeros[tipo]}", "Tipo": TIPOS_BINARIOS[tipo], "Data_Vencimento": fatia['data'][k].strftime('%d/%m/%Y'), "Dias": fatia['dias'][k], "Valor": valor, "Valor_Presente": vp, "Desconto_Aplicado": round(valor - vp, 2),
+                           "Juros_Periodo": fatia['juros_periodo'][k], "Amortizacao": fatia['amortizacao'][k], "Saldo_Devedor": fatia['saldo_devedor'][k]})
+    if cronograma:
+        total_valor = round(sum(fatia['valor']), 2); valor_presente = float(registro['valor_presente_total'])
+        cronograma.append({"Item": "TOTAL", "Tipo": "", "Data_Vencimento": "", "Dias": "", "Valor": total_valor, "Valor_Presente": valor_presente, "Desconto_Aplicado": round(total_valor - valor_presente, 2),
+                           "Juros_Periodo": float(registro['juros_total']), "Amortizacao": float(registro['amortizacao_total']), "Saldo_Devedor": ""})
+    return cronograma
+
+def carteira_binaria(indice, colunas, plano=0):
+    """
+    Carteira ('Contrato', 'Data_Vencimento', 'Valor', 'Taxa_Mensal') de todos os lotes em um
+    plano, para `cotar_quitacao_carteira`, lendo do mmap apenas as colunas de data e valor.
+    """
+    selecao = indice[(indice['plano'] == plano) & (indice['erro'] == "")]
+    tamanhos = (selecao['fim'] - selecao['inicio']).to_numpy()
+    linhas = np.repeat(selecao['inicio'].to_numpy() - np.concatenate([[0], np.cumsum(tamanhos)[:-1]]), tamanhos) + np.arange(int(tamanhos.sum()))
+    return pd.DataFrame({'Contrato': np.repeat((selecao['quadra'] + "/" + selecao['lote']).to_numpy(), tamanhos), 'Data_Vencimento': pd.to_datetime(colunas['data'][linhas]),
+                         'Valor': colunas['valor'][linhas], 'Taxa_Mensal': np.repeat(selecao['taxa_mensal'].to_numpy(), tamanhos)})
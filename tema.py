@@ -0,0 +1,227 @@
+"""
+Tema escuro e logo dos simuladores (app.py e app2.py), preparados uma vez por processo.
+"""
+import streamlit as st
+from PIL import Image
+from io import BytesIO
+import os
+import re
+
+from motor import DIRETORIO_APP
+
+# --- Carregamento da Logo (Cacheado) ---
+CAMINHO_LOGO = os.path.join(DIRETORIO_APP, "JMD HAMOA HORIZONTAL - BRANCO.png")
+LARGURA_LOGO = 200
+
+@st.cache_resource
+def load_logo():
+    """
+    Carrega a logo uma única vez por processo, já redimensionada para a largura exibida e
+    codificada em PNG. Com os bytes prontos e sem exceder LARGURA_LOGO, `st.image` não
+    redimensiona nem recodifica a imagem a cada reexecução.
+    """
+    try:
+        logo = Image.open(CAMINHO_LOGO); logo.thumbnail((LARGURA_LOGO, LARGURA_LOGO))
+        buffer = BytesIO(); logo.save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+    except Exception as e:
+        st.warning(f"Não foi possível carregar a logo: {str(e)}.")
+        return None
+
+# --- Tema ---
+TEMA_CSS = """
+    <style>
+        /* Fundo principal */
+        .stApp {
+            background-color: #1E1E1E;
+        }
+        
+        /* Sidebar */
+        [data-testid="stSidebar"] {
+            background-color: #252526;
+        }
+        
+        /* Títulos */
+        h1, h2, h3, h4, h5, h6, .stMarkdown h1, .stMarkdown h2, .stMarkdown h3 {
+            color: #FFFFFF;
+        }
+        
+        /* Texto geral */
+        .stMarkdown p, .stMarkdown li, .stText, .stNumberInput label, .stSelectbox label {
+            color: #E0E0E0;
+        }
+        
+        /* Inputs */
+        .stTextInput input, .stNumberInput input, .stSelectbox select {
+            background-color: #333333;
+            color: #FFFFFF;
+            border-color: #555555;
+        }
+        
+        /* Botões padrão (não os customizados abaixo) */
+        .stButton button {
+            background-color: #0056b3;
+            color: white;
+            border: none;
+            border-radius: 4px;
+        }
+        
+        .stButton button:hover {
+            background-color: #003d82;
+        }
+        
+        /* Cards/metricas */
+        .stMetric {
+            background-color: #252526;
+            border-radius: 8px;
+            padding: 15px;
+            border-left: 4px solid #4D6BFE; /* Cor da borda alterada para combinar com os botões */
+        }
+        
+        .stMetric label {
+            color: #A0A0A0 !important;
+        }
+        
+        .stMetric div {
+            color: #FFFFFF !important;
+            font-size: 24px !important;
+        }
+        
+        /* Dataframe */
+        .dataframe {
+            background-color: #252526 !important;
+            color: #E0E0E0 !important;
+        }
+        
+        .dataframe th {
+            background-color: #4D6BFE !important; /* Cor da borda alterada */
+            color: white !important;
+        }
+        
+        .dataframe tr:nth-child(even) {
+            background-color: #333333 !important;
+        }
+        
+        .dataframe tr:hover {
+            background-color: #444444 !important;
+        }
+
+        /* ===== LAYOUT ===== */
+        /* Container principal */
+        .main .block-container {
+            padding: 2rem 1rem !important;
+        }
+
+        /* Colunas e alinhamento */
+        [data-testid="column"] {
+            display: flex !important;
+            align-items: center !important;
+            justify-content: flex-start !important;
+            padding: 0 !important;
+        }
+
+        /* Espaçamento entre botões */
+        .stButton:first-of-type {
+            margin-right: 8px !important;
+        }
+
+        /* ===== FLICKERING FIX ===== */
+        [data-testid="stDataFrame-container"] {
+            will-change: transform !important;
+            contain: strict !important;
+            min-height: 400px !important;
+            transform: translate3d(0, 0, 0) !important;
+            backface-visibility: hidden !important;
+            perspective: 1000px !important;
+        }
+
+        .stDataFrame-fullscreen {
+            position: fixed !important;
+            top: 0 !important;
+            left: 0 !important;
+            right: 0 !important;
+            bottom: 0 !important;
+            z-index: 9999 !important;
+            background-color: #0E1117 !important;
+            padding: 2rem !important;
+            overflow: auto !important;
+        }
+
+        /* Títulos específicos para cor branca */
+        h1, h2, h3, h4, h5, h6, 
+        .stMarkdown h1, .stMarkdown h2, .stMarkdown h3,
+        /* Textos de input/labels */
+        .stTextInput label, .stNumberInput label, 
+        .stSelectbox label, .stDateInput label,
+        /* Subtítulos das seções */
+        .stSubheader,
+        /* Botões de exportação (labels) */
+        .stDownloadButton label {
+            color: #FFFFFF !important;
+        }
+        
+        /* Labels específicos que não são capturados pelas regras acima */
+        div[data-testid="stForm"] label,
+        div[data-testid="stVerticalBlock"] > div > div > div > div > label {
+            color: #FFFFFF !important;
+        }
+
+        /* BOTÕES PRINCIPAIS - ESTADO NORMAL (Calcular/Reiniciar/Exportar) */
+        div[data-testid="stForm"] button[kind="secondaryFormSubmit"],
+        div[data-testid="stForm"] button[kind="secondary"],
+        .stDownloadButton button {
+            background-color: #4D6BFE !important; /* Azul vibrante */
+            color: white !important;
+            border: none !important;
+            border-radius: 12px !important; /* Bordas super arredondadas */
+            padding: 10px 24px !important;
+            font-weight: 600 !important;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1) !important;
+            transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1) !important;
+        }
+
+        /* EFEITO HOVER - VERMELHO INTENSO */
+        div[data-testid="stForm"] button[kind="secondaryFormSubmit"]:hover,
+        div[data-testid="stForm"] button[kind="secondary"]:hover,
+        .stDownloadButton button:hover {
+            background-color: #FF4D4D !important; /* Vermelho vibrante */
+            transform: translateY(-2px) !important;
+            box-shadow: 0 4px 8px rgba(255, 77, 77, 0.2) !important;
+        }
+
+        /* EFEITO CLIQUE */
+        div[data-testid="stForm"] button[kind="secondaryFormSubmit"]:active,
+        div[data-testid="stForm"] button[kind="secondary"]:active,
+        .stDownloadButton button:active {
+            transform: translateY(0) !important;
+            background-color: #E04444 !important; /* Vermelho mais escuro */
+        }
+
+        /* TEXTO DOS BOTÕES */
+        div[data-testid="stForm"] button > div > p,
+        .stDownloadButton button > div > p {
+            color: white !important;
+            font-size: 14px !important;
+            margin: 0 !important;
+        }
+    </style>
+"""
+
+@st.cache_resource
+def css_tema():
+    """
+    Minifica o CSS do tema uma vez por processo (sem comentários nem espaços supérfluos),
+    reduzindo o bloco reenviado ao navegador a cada reexecução.
+    """
+    css = re.sub(r'/\*.*?\*/', '', TEMA_CSS, flags=re.S)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    return re.sub(r'\s+', ' ', css).strip()
+
+def set_theme():
+    """
+    Aplica estilos CSS personalizados para um tema escuro
+    e aprimora a aparência dos componentes do Streamlit.
+    Inclui estilos para botões com efeitos de hover e clique.
+    """
+    st.markdown(css_tema(), unsafe_allow_html=True)
+    
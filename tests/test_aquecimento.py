@@ -0,0 +1,67 @@
+"""
+Aquecimento dos caches (ver "Aquecimento dos Caches" em motor.py): o calendário, as tabelas de
+desconto e os resultados aquecidos têm de ser os mesmos que uma simulação enviada pelos
+formulários consulta, sem serem calculados de novo.
+"""
+import datetime
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import motor
+
+DIRETORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_ENTRADA = datetime.date(2024, 1, 15)
+
+@pytest.fixture
+def calculos(monkeypatch, tmp_path):
+    """
+    Conta as execuções do kernel de calendário, das potências de desconto e de `comparar_planos`,
+    que só rodam quando `gerar_calendario`, `potencias_periodicas` e `simular_cenario` não acham a
+    chave no cache.
+    """
+    monkeypatch.setenv("SIMULADOR_AQUECIMENTO", "0"); monkeypatch.setenv("SIMULACOES_COMPARTILHADAS", str(tmp_path))
+    caches = (motor.gerar_calendario, motor.potencias_periodicas, motor.simular_cenario)
+    for cache in caches: cache.clear()
+    chamadas = {'calendarios': [], 'potencias': [], 'resultados': []}
+    kernel, potencias, comparar = motor.KERNELS_NUMPY['dias_calendario'], motor.calcular_potencias_desconto, motor.comparar_planos
+    monkeypatch.setitem(motor.KERNELS_NUMPY, 'dias_calendario', lambda *args: chamadas['calendarios'].append(args[3]) or kernel(*args))
+    monkeypatch.setattr(motor, "calcular_potencias_desconto", lambda dias, taxa: chamadas['potencias'].append((len(dias), taxa)) or potencias(dias, taxa))
+    monkeypatch.setattr(motor, "comparar_planos", lambda *args: chamadas['resultados'].append(args[3][0]['qtd_parcelas']) or comparar(*args))
+    yield chamadas
+    for cache in caches: cache.clear()
+
+def simular(prazo):
+    at = AppTest.from_file(os.path.join(DIRETORIO, "app.py"), default_timeout=120).run()
+    at.date_input(key="data_input").set_value(DATA_ENTRADA)
+    at.text_input(key="valor_total_str").set_value("150.000,00"); at.text_input(key="entrada_str").set_value("20.000,00")
+    at.number_input(key="qtd_parcelas").set_value(prazo); at.selectbox(key="modalidade").set_value("mensal")
+    at.button[0].click().run()
+    assert not at.exception and not at.error and len(at.dataframe)
+
+def simular_comercial(prazo):
+    at = AppTest.from_file(os.path.join(DIRETORIO, "app2.py"), default_timeout=120).run()
+    at.date_input(key="data_input").set_value(DATA_ENTRADA)
+    at.number_input(key="valor_total").set_value(150000.0); at.number_input(key="entrada").set_value(20000.0)
+    at.number_input(key="qtd_parcelas").set_value(prazo); at.selectbox(key="modalidade").set_value("mensal")
+    at.button[0].click().run()
+    assert not at.exception and not at.error
+
+def test_formulario_usa_o_calendario_aquecido(calculos):
+    assert motor.aquecer_caches([120, 180], [None], DATA_ENTRADA, ["mensal"], 130000.0) == {'calendarios': 2, 'tabelas': 8, 'resultados': 4}
+    assert calculos['calendarios'] == [120, 180]
+    simular(120)
+    assert calculos['calendarios'] == [120, 180] # a simulação de 120 meses achou o calendário aquecido
+    simular(60)
+    assert calculos['calendarios'] == [120, 180, 60] # prazo não aquecido: gerado na simulação
+
+def test_formularios_usam_tabelas_e_resultados_aquecidos(calculos):
+    motor.aquecer_caches([120, 180], [None], DATA_ENTRADA, ["mensal"], 130000.0)
+    taxa_comercial = motor.calcular_taxas(motor.obter_politica_taxas()['comercial']['taxa_padrao'], dias_mes=30)['diaria']
+    assert calculos['resultados'] == [120, 180, 120, 180] and (120, taxa_comercial) in calculos['potencias']
+    aquecidas = len(calculos['potencias'])
+    simular(120); simular_comercial(120)
+    assert calculos['resultados'] == [120, 180, 120, 180] and len(calculos['potencias']) == aquecidas # os dois formulários acharam o resultado aquecido
+    simular_comercial(60)
+    assert calculos['resultados'][-1] == 60 and calculos['potencias'][-1] == (60, taxa_comercial) # prazo não aquecido: tabela e resultado calculados na simulação
@@ -0,0 +1,41 @@
+"""
+Conciliação de pagamentos (ver "Conciliação de Pagamentos" em motor.py): atribuição de cada
+pagamento a um item da carteira, encargos de atraso e situação de cada item.
+"""
+import pandas as pd
+
+from motor import conciliar_pagamentos, resumir_conciliacao
+
+def carteira(*itens):
+    return pd.DataFrame([{'Contrato': contrato, 'Data_Vencimento': pd.Timestamp(data), 'Valor': valor} for contrato, data, valor in itens])
+
+def pagamentos(*registros):
+    return pd.DataFrame([{'Contrato': contrato, 'Data_Vencimento': pd.Timestamp(vencimento), 'Data_Pagamento': pd.Timestamp(pagamento), 'Valor_Pago': valor}
+                         for contrato, vencimento, pagamento, valor in registros])
+
+def test_pagamento_preterido_passa_ao_proximo_candidato():
+    # Parcela e balão no mesmo dia: os dois pagamentos preferem a parcela, mas só o mais
+    # próximo fica com ela; o outro recebe o balão em vez de ficar sem item.
+    itens, pagos = conciliar_pagamentos(carteira(("A/1", "2024-03-10", 1000.0), ("A/1", "2024-03-10", 1200.0)),
+                                        pagamentos(("A/1", "2024-03-10", "2024-03-10", 1000.0), ("A/1", "2024-03-10", "2024-03-10", 1050.0)), "2024-04-01")
+    assert pagos['Item'].tolist() == [0, 1] and (pagos['Situacao'] == 'conciliado').all()
+    assert itens['Situacao'].tolist() == ['pago', 'pago a menor'] and itens['Diferenca'].tolist() == [0.0, -150.0]
+
+def test_duplicidade_e_contrato_desconhecido_nao_identificados():
+    itens, pagos = conciliar_pagamentos(carteira(("A/1", "2024-03-10", 1000.0)),
+                                        pagamentos(("A/1", "2024-03-10", "2024-03-09", 1000.0), ("A/1", "2024-03-10", "2024-03-10", 1000.0), ("Z/9", "2024-03-10", "2024-03-10", 1000.0)), "2024-04-01")
+    assert pagos['Item'].tolist() == [0, -1, -1] and pagos['Situacao'].tolist() == ['conciliado', 'não identificado', 'não identificado']
+    assert itens['Data_Pagamento'].tolist() == [pd.Timestamp("2024-03-09")]
+
+def test_encargos_e_situacoes():
+    itens, _ = conciliar_pagamentos(carteira(("A/1", "2024-01-10", 1000.0), ("A/1", "2024-02-10", 1000.0), ("A/1", "2024-05-10", 1000.0)),
+                                    pagamentos(("A/1", "2024-01-10", "2024-01-20", 1023.33)), "2024-03-11")
+    assert itens['Situacao'].tolist() == ['pago', 'vencido', 'a vencer']
+    assert itens[['Dias_Atraso', 'Multa', 'Juros_Mora']].values.tolist() == [[10, 20.0, 3.33], [30, 20.0, 10.0], [0, 0.0, 0.0]]
+    resumo = resumir_conciliacao(itens).loc["A/1"]
+    assert (resumo['Pagos'], resumo['Vencidos'], resumo['Valor_Pago'], resumo['Encargos_Pagos'], resumo['Saldo_Vencido']) == (1, 1, 1023.33, 23.33, 1030.0)
+
+def test_vencimentos_anteriores_a_1970():
+    itens, pagos = conciliar_pagamentos(carteira(("A/1", "1969-12-31", 500.0), ("B/2", "1969-12-31", 700.0), ("B/2", "1965-06-30", 700.0)),
+                                        pagamentos(("B/2", "1969-12-31", "1969-12-31", 700.0), ("A/1", "1969-12-31", "1969-12-31", 500.0)), "1970-01-10")
+    assert pagos['Item'].tolist() == [1, 0] and itens['Situacao'].tolist() == ['pago', 'pago', 'vencido']
@@ -0,0 +1,192 @@
+"""
+Corpus de regressão do motor de cálculo (`comparar_planos`, `gerar_calendario`,
+`formatar_moeda` e as versões item a item `ajustar_data_vencimento` e
+`calcular_valor_presente`), que também serve de piso de desempenho:
+
+- dourado: CASOS_DOURADOS combinações sorteadas (datas de fim de mês, "Personalizado", taxa
+  zero, valores fixos, perfis e regras de dia não útil) com as saídas gravadas em
+  tests/dados/corpus_cronogramas.json.xz: por plano, os valores resolvidos (a centavo) e uma
+  impressão digital do cronograma inteiro, coluna a coluna, em centavos; mais os valores de
+  `formatar_moeda`, `ajustar_data_vencimento` e `calcular_valor_presente` numa varredura de
+  entradas de borda;
+- propriedades: nas mesmas combinações, vencimento igual ao de `ajustar_data_vencimento` (ou
+  no dia útil da regra) e dias corridos até ele, valor presente de cada item igual ao de
+  `calcular_valor_presente`, meses dos balões personalizados, linha TOTAL, desconto,
+  formatação dos valores e, com taxa zero, valor presente igual ao valor e total igual ao
+  financiado;
+- desempenho: planos por segundo de `comparar_planos` sobre o corpus dourado, com caches
+  vazios, contra o piso PISO_DESEMPENHO x o valor gravado junto com o corpus
+  (SIMULADOR_CORPUS_PLANOS_POR_SEGUNDO fixa outro piso, para máquinas mais lentas).
+
+As saídas foram gravadas com a implementação atual e sem arquivos de política de taxas e de
+feriados (valem os padrões):
+    PYTHONPATH=. python tests/test_corpus.py
+"""
+import calendar
+import datetime
+import hashlib
+import json
+import lzma
+import os
+import time
+
+import numpy as np
+import pytest
+
+import motor
+from motor import (
+    MODALIDADES, PERFIS_CALCULO, SISTEMAS_AMORTIZACAO, ajustar_data_vencimento, calcular_taxas, calcular_valor_presente, comparar_planos, formatar_moeda,
+    formatar_moedas, parse_currency
+)
+
+DIRETORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMINHO_CORPUS = os.path.join(DIRETORIO, "tests", "dados", "corpus_cronogramas.json.xz")
+CASOS_DOURADOS, SEMENTE_DOURADA = 20000, 2024
+PISO_DESEMPENHO = 0.5
+
+PRAZOS = [1, 2, 3, 6, 11, 12, 13, 24, 35, 36, 37, 48, 60, 120, 180, 240]
+TAXAS = [0.0, 0.01, 0.5, 0.79, 0.89, 1.15, 2.5]
+DIAS = [1, 15, 28, 29, 30, 31]
+AGENDAMENTOS = ["Padrão", "A partir do 1º Vencimento", "Personalizado (Mês a Mês)"]
+COLUNAS = ["Item", "Data_Vencimento", "Dias", "Valor", "Valor_Presente", "Desconto_Aplicado", "Juros_Periodo", "Amortizacao", "Saldo_Devedor"]
+MONETARIAS = {"Valor", "Valor_Presente", "Desconto_Aplicado", "Juros_Periodo", "Amortizacao", "Saldo_Devedor"}
+
+def gerar_casos(qtd, semente):
+    """
+    Combinações de entrada sorteadas: data (60% em dias de fim de mês), valor financiado (5%
+    abaixo de R$ 100), taxa, perfil, regra de dia não útil e de 1 a 3 planos.
+    """
+    sorteio = np.random.default_rng(semente); casos = []
+    for _ in range(qtd):
+        ano, mes = int(sorteio.integers(2019, 2031)), int(sorteio.integers(1, 13))
+        dia = min(int(sorteio.choice(DIAS)) if sorteio.random() < 0.6 else int(sorteio.integers(1, 32)), calendar.monthrange(ano, mes)[1])
+        planos = []
+        for _ in range(int(sorteio.integers(1, 4))):
+            modalidade, qtd_parcelas = str(sorteio.choice(MODALIDADES)), int(sorteio.choice(PRAZOS)); plano = {'modalidade': modalidade, 'qtd_parcelas': qtd_parcelas}
+            if modalidade == "mensal + balão":
+                plano.update({'tipo_balao': str(sorteio.choice(["anual", "semestral"])), 'agendamento_baloes': str(sorteio.choice(AGENDAMENTOS))})
+                if plano['agendamento_baloes'] == AGENDAMENTOS[2]: plano['meses_baloes'] = sorted(int(m) for m in sorteio.choice(np.arange(1, qtd_parcelas + 1), size=min(int(sorteio.integers(0, 6)), qtd_parcelas), replace=False))
+                if plano['agendamento_baloes'] == AGENDAMENTOS[1]: plano['mes_primeiro_balao'] = int(sorteio.integers(1, qtd_parcelas + 1))
+                fixo = str(sorteio.choice(["parcela", "balao", "ambos", "nenhum"], p=[0.45, 0.45, 0.05, 0.05]))
+                if fixo in ("parcela", "ambos"): plano['valor_parcela'] = round(float(sorteio.uniform(100, 5000)), 2)
+                if fixo in ("balao", "ambos"): plano['valor_balao'] = round(float(sorteio.uniform(1000, 50000)), 2)
+            elif modalidade not in SISTEMAS_AMORTIZACAO and sorteio.random() < 0.1: plano['valor_parcela'] = round(float(sorteio.uniform(100, 5000)), 2)
+            planos.append(plano)
+        valor = round(float(sorteio.uniform(5000, 800000)), 2) if sorteio.random() < 0.95 else round(float(sorteio.uniform(0.01, 100)), 2)
+        taxa = float(sorteio.choice(TAXAS)) if sorteio.random() < 0.8 else round(float(sorteio.uniform(0, 3)), 2)
+        casos.append({'valor_financiado': valor, 'data_entrada': f"{ano:04d}-{mes:02d}-{dia:02d}", 'taxa_mensal': taxa, 'perfil': str(sorteio.choice(list(PERFIS_CALCULO))),
+                      'dias_uteis': [None, None, "following", "modifiedfollowing"][int(sorteio.integers(0, 4))], 'planos': planos})
+    return casos
+
+def simular(caso):
+    return comparar_planos(caso['valor_financiado'], datetime.datetime.strptime(caso['data_entrada'], '%Y-%m-%d'), caso['taxa_mensal'], caso['planos'], caso['perfil'], caso['dias_uteis'])
+
+def em_centavos(valor):
+    return round(valor * 100) if isinstance(valor, (int, float)) and not isinstance(valor, bool) else valor
+
+def impressao_digital(dados):
+    return hashlib.blake2b(json.dumps(dados, ensure_ascii=False, separators=(',', ':')).encode("utf-8"), digest_size=8).hexdigest()
+
+def resumir(resultados):
+    """Saída de `comparar_planos` no formato gravado: valores monetários em centavos e a impressão digital do cronograma, por coluna."""
+    return [{'erro': r['erro'], 'taxa_mensal': round(r['taxa_mensal'], 4), 'qtd_baloes': r['qtd_baloes'], 'cet_anual': r['cet_anual'], 'cet_mensal': r['cet_mensal'],
+             **{campo: em_centavos(r[campo]) for campo in ('valor_parcela', 'valor_ultima_parcela', 'valor_balao')}, 'itens': len(r['cronograma']),
+             'cronograma': impressao_digital({coluna: [em_centavos(p[coluna]) if coluna in MONETARIAS else p[coluna] for p in r['cronograma']] for coluna in COLUNAS})} for r in resultados]
+
+def valores_moeda():
+    """Valores para `formatar_moeda`: centavos de borda, negativos e milhares."""
+    sorteio = np.random.default_rng(SEMENTE_DOURADA)
+    return [0.0, 0.01, 0.1, 0.29, 0.5, 0.99, 1.0, 1.005, 9.999, -0.01, -1234.56, 999.99, 1000.0, 1234567.89, -1000000.0] + np.round(sorteio.uniform(-1e6, 1e6, 200), 2).tolist()
+
+def entradas_datas():
+    """Entradas de `ajustar_data_vencimento`: fins de mês e 29/02 como base, os três períodos e dias de vencimento de borda."""
+    bases = [f"{ano:04d}-{mes:02d}-{dia:02d}" for ano in (2023, 2024) for mes in range(1, 13) for dia in sorted({1, 15, 28, 29, 30, 31}) if dia <= calendar.monthrange(ano, mes)[1]]
+    return [[base, periodo, n, dia] for base in bases for periodo in ("mensal", "semestral", "anual") for n in (0, 1, 2, 11, 13, 60, 239) for dia in (None, 28, 29, 30, 31)]
+
+def calcular_datas(entradas):
+    return [ajustar_data_vencimento(datetime.datetime.strptime(base, '%Y-%m-%d'), periodo, n, dia).strftime('%Y-%m-%d') for base, periodo, n, dia in entradas]
+
+def entradas_valores_presentes():
+    """Entradas de `calcular_valor_presente`: valores e prazos sorteados, taxas diárias das TAXAS e prazos e taxas sem desconto."""
+    sorteio = np.random.default_rng(SEMENTE_DOURADA)
+    taxas = [calcular_taxas(t)['diaria'] for t in TAXAS] + [-0.001]
+    return [[round(float(v), 2), t, int(d)] for v, d in zip(sorteio.uniform(0.01, 500000, 300), sorteio.integers(-30, 7300, 300)) for t in taxas]
+
+def calcular_valores_presentes(entradas):
+    return [em_centavos(calcular_valor_presente(valor, taxa, dias)) for valor, taxa, dias in entradas]
+
+@pytest.fixture(scope="module")
+def corpus():
+    for caminho in (motor.CAMINHO_POLITICA_TAXAS, motor.CAMINHO_FERIADOS):
+        if os.path.exists(caminho): pytest.skip(f"corpus gravado com os padrões; remova {caminho}")
+    with lzma.open(CAMINHO_CORPUS, "rt", encoding="utf-8") as f: return json.load(f)
+
+def simular_casos(casos):
+    """Simula os casos com os caches vazios; retorna (resultados, planos por segundo)."""
+    motor.gerar_calendario.clear(); motor.potencias_periodicas.clear()
+    inicio = time.perf_counter(); resultados = [simular(caso) for caso in casos]
+    return resultados, sum(len(caso['planos']) for caso in casos) / (time.perf_counter() - inicio)
+
+@pytest.fixture(scope="module")
+def simulados(corpus):
+    """Uma única passada pelo corpus dourado, aproveitada pelo confronto com o gravado, pelas propriedades e pelo piso de desempenho."""
+    casos = gerar_casos(CASOS_DOURADOS, SEMENTE_DOURADA)
+    assert impressao_digital(casos) == corpus['entradas'] # o gerador não mudou
+    return casos, *simular_casos(casos)
+
+def test_cronogramas_iguais_ao_gravado(corpus, simulados):
+    casos, resultados, _ = simulados
+    diferentes = [i for i, (resultado, saida) in enumerate(zip(resultados, corpus['saidas'])) if resumir(resultado) != saida]
+    assert not diferentes, f"{len(diferentes)} casos diferentes do gravado, por exemplo: {[casos[i] for i in diferentes[:3]]}"
+
+def test_funcoes_item_a_item_iguais_ao_gravado(corpus):
+    assert [formatar_moeda(v) for v in corpus['moedas']['valores']] == corpus['moedas']['formatados']
+    assert calcular_datas(entradas_datas()) == corpus['datas']
+    assert calcular_valores_presentes(entradas_valores_presentes()) == corpus['valores_presentes']
+
+def test_desempenho_minimo(corpus, simulados):
+    planos_por_segundo = simulados[2]
+    piso = float(os.environ.get("SIMULADOR_CORPUS_PLANOS_POR_SEGUNDO", PISO_DESEMPENHO * corpus['planos_por_segundo']))
+    assert planos_por_segundo >= piso, f"{planos_por_segundo:.0f} planos/s, abaixo do piso de {piso:.0f} (gravado: {corpus['planos_por_segundo']:.0f})"
+
+def conferir_plano(caso, plano, resultado):
+    """Propriedades de um plano sem erro; retorna a primeira violada ou None."""
+    entrada = datetime.datetime.strptime(caso['data_entrada'], '%Y-%m-%d'); calendario = PERFIS_CALCULO[caso['perfil']]['convencao'] == "calendario"
+    itens = [p for p in resultado['cronograma'] if p['Item'] != 'TOTAL']; total = resultado['cronograma'][-1]
+    parcelas = [p for p in itens if p['Item'].startswith("Parcela")]; baloes = [p for p in itens if p['Item'].startswith("Balão")]
+    meses_b = plano['meses_baloes'] if plano.get('agendamento_baloes') == AGENDAMENTOS[2] else None
+    if meses_b is not None and len(baloes) != len(meses_b): return "quantidade de balões personalizados"
+    vencimentos = [(p, i + 1) for i, p in enumerate(parcelas)] + ([(p, m) for p, m in zip(baloes, meses_b)] if meses_b is not None else [])
+    for p, mes in vencimentos:
+        texto = p['Data_Vencimento']; data, esperada = datetime.datetime(int(texto[6:]), int(texto[3:5]), int(texto[:2])), ajustar_data_vencimento(entrada, "mensal", mes)
+        if calendario and (data - entrada).days != p['Dias']: return f"{p['Item']}: dias corridos"
+        if caso['dias_uteis'] is None and data != esperada: return f"{p['Item']}: vencimento {data} em vez de {esperada}"
+        if caso['dias_uteis'] and (not np.is_busday(data.date()) or (data - esperada).days > 3 or (caso['dias_uteis'] == "modifiedfollowing" and data.month != esperada.month)): return f"{p['Item']}: dia útil {data} para {esperada}"
+    taxa_diaria = calcular_taxas(resultado['taxa_mensal'])['diaria']
+    if calendario and any(p['Valor_Presente'] != calcular_valor_presente(p['Valor'], taxa_diaria, p['Dias']) for p in itens): return "valor presente item a item"
+    if em_centavos(total['Valor']) != sum(em_centavos(p['Valor']) for p in itens): return "total dos valores"
+    if any(em_centavos(p['Desconto_Aplicado']) != em_centavos(p['Valor']) - em_centavos(p['Valor_Presente']) for p in itens): return "desconto aplicado"
+    if resultado['taxa_mensal'] == 0:
+        if any(p['Valor'] != p['Valor_Presente'] for p in itens): return "valor presente com taxa zero"
+        if not plano.get('valor_parcela') and not plano.get('valor_balao') and em_centavos(total['Valor']) != em_centavos(caso['valor_financiado']): return "total com taxa zero"
+    formatados = [formatar_moeda(p['Valor']) for p in itens]
+    if formatados != formatar_moedas([p['Valor'] for p in itens]): return "formatar_moeda"
+    if any(parse_currency(f) != p['Valor'] for p, f in zip(itens, formatados)): return "formatar_moeda/parse_currency"
+    return None
+
+def test_propriedades(simulados):
+    casos, resultados, _ = simulados; violacoes = []
+    for caso, resultados_caso in zip(casos, resultados):
+        for plano, resultado in zip(caso['planos'], resultados_caso):
+            if resultado['erro'] is None and (falha := conferir_plano(caso, plano, resultado)): violacoes.append((falha, caso))
+    assert not violacoes, f"{len(violacoes)} planos violam propriedades, por exemplo: {violacoes[:3]}"
+
+if __name__ == "__main__":
+    casos = gerar_casos(CASOS_DOURADOS, SEMENTE_DOURADA)
+    resultados, planos_por_segundo = simular_casos(casos)
+    valores = valores_moeda()
+    gravado = {'planos_por_segundo': round(planos_por_segundo), 'moedas': {'valores': valores, 'formatados': [formatar_moeda(v) for v in valores]},
+               'datas': calcular_datas(entradas_datas()), 'valores_presentes': calcular_valores_presentes(entradas_valores_presentes()),
+               'entradas': impressao_digital(casos), 'saidas': [resumir(resultado) for resultado in resultados]}
+    with lzma.open(CAMINHO_CORPUS, "wt", encoding="utf-8") as f: json.dump(gravado, f, ensure_ascii=False, separators=(',', ':'))
+    print(f"{len(casos)} casos gravados em {CAMINHO_CORPUS} ({gravado['planos_por_segundo']} planos/s)")
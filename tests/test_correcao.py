@@ -0,0 +1,52 @@
+"""
+Correção monetária (ver "Correção Monetária" em motor.py): a correção da carteira inteira de
+uma vez tem de dar, por contrato, os mesmos totais que a correção do cronograma de cada um.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from motor import carregar_indices, corrigir_carteira, corrigir_cronograma, cronograma_para_carteira, fatores_correcao, meses_de, simular_planos
+
+# (contrato, data de entrada, fim da obra, plano)
+CONTRATOS = [
+    ("A/1", datetime.datetime(2024, 1, 15), datetime.datetime(2025, 6, 30), {'modalidade': "mensal", 'qtd_parcelas': 60}),
+    ("A/2", datetime.datetime(2024, 3, 5), datetime.datetime(2024, 3, 5), {'modalidade': "mensal + balão", 'qtd_parcelas': 48, 'tipo_balao': "anual", 'valor_parcela': 2000.0}),
+    ("B/7", datetime.datetime(2023, 11, 20), datetime.datetime(2027, 1, 1), {'modalidade': "só balão semestral", 'qtd_parcelas': 60}),
+]
+
+@pytest.fixture
+def indices(tmp_path):
+    meses = pd.period_range("2023-01", "2024-12", freq="M").strftime("%m/%Y")
+    serie = pd.concat([pd.DataFrame({'mes': meses, 'indice': "INCC", 'variacao': [f"{0.3 + 0.05 * (i % 7):.2f}".replace(".", ",") for i in range(len(meses))]}),
+                       pd.DataFrame({'mes': meses, 'indice': "IPCA", 'variacao': [f"{0.2 + 0.04 * (i % 5):.2f}".replace(".", ",") for i in range(len(meses))]})])
+    caminho = tmp_path / "indices.csv"; serie.to_csv(caminho, sep=";", index=False)
+    carregar_indices.clear()
+    return carregar_indices(str(caminho), caminho.stat().st_mtime)
+
+def test_carteira_igual_aos_cronogramas(indices):
+    carteiras, bases, obras, totais = [], [], [], {}
+    for contrato, entrada, fim_obra, plano in CONTRATOS:
+        resultado = simular_planos(130000.0, entrada, 0.89, [plano])[0]
+        assert resultado['erro'] is None
+        carteira = cronograma_para_carteira(resultado['cronograma'], contrato, 0.89); carteiras.append(carteira)
+        bases.append(pd.Series(entrada, index=carteira.index)); obras.append(pd.Series(fim_obra, index=carteira.index))
+        totais[contrato] = corrigir_cronograma(resultado['cronograma'], entrada, fim_obra, indices)[-1]
+    resumo = corrigir_carteira(pd.concat(carteiras, ignore_index=True), pd.concat(bases, ignore_index=True), pd.concat(obras, ignore_index=True), indices)
+    assert list(resumo.index) == [c[0] for c in CONTRATOS]
+    for contrato, total in totais.items():
+        assert (resumo.loc[contrato, 'Valor_Nominal'], resumo.loc[contrato, 'Valor_Corrigido']) == (round(total['Valor'], 2), total['Valor_Corrigido'])
+        assert resumo.loc[contrato, 'Valor_Corrigido'] > resumo.loc[contrato, 'Valor_Nominal']
+
+def test_fator_incc_e_depois_ipca(indices):
+    base, fim_obra, vencimento = meses_de(["15/01/2024", "30/06/2024", "10/12/2024"])
+    incc = np.prod(1 + np.array([0.3 + 0.05 * (i % 7) for i in range(24)])[12:17] / 100) # variações de jan a mai/2024 (defasagem de 1 mês)
+    ipca = np.prod(1 + np.array([0.2 + 0.04 * (i % 5) for i in range(24)])[17:23] / 100) # de jun a nov/2024
+    assert fatores_correcao(indices, base, vencimento, fim_obra)[()] == pytest.approx(incc * ipca)
+    assert fatores_correcao(indices, base, base - 3, fim_obra)[()] == 1.0 # vencido antes da base: sem correção
+
+def test_serie_ausente_ou_curta(indices):
+    with pytest.raises(ValueError, match="IPCA"): fatores_correcao({'INCC': indices['INCC']}, *meses_de(["15/01/2024", "10/12/2024", "30/06/2024"]))
+    with pytest.raises(ValueError, match="começa em"): fatores_correcao(indices, *meses_de(["15/01/2020", "10/12/2024", "30/06/2024"]))
@@ -0,0 +1,52 @@
+"""
+Cronogramas do catálogo em formato binário (ver "Cronogramas em Lote" em motor.py): o que
+`cronograma_do_lote` lê de um conjunto gravado tem de coincidir, a centavo, com o cronograma
+de `simular_planos` (montado por `montar_cronograma`) para o mesmo lote e plano.
+"""
+import datetime
+import os
+
+import pandas as pd
+import pytest
+
+import motor
+from motor import abrir_cronogramas, cronograma_do_lote, gravar_cronogramas_catalogo, listar_conjuntos_cronogramas, simular_planos
+
+DATA_ENTRADA = datetime.datetime(2024, 1, 15)
+TAXA = 0.89
+PLANOS = [{'modalidade': "mensal", 'qtd_parcelas': 60}, {'modalidade': "só balão anual", 'qtd_parcelas': 120},
+          {'modalidade': "mensal + balão", 'qtd_parcelas': 48, 'tipo_balao': "semestral", 'valor_balao': 9000.0}]
+CAMPOS = ["Item", "Tipo", "Data_Vencimento", "Dias", "Valor", "Valor_Presente", "Desconto_Aplicado", "Juros_Periodo", "Amortizacao", "Saldo_Devedor"]
+
+@pytest.fixture
+def catalogo():
+    indice = pd.MultiIndex.from_tuples([("A", "1"), ("A", "2"), ("B", "1"), ("B", "7")], names=['quadra', 'lote'])
+    return pd.DataFrame({'valor_total': [150000.0, 150000.0, 212345.67, 98000.5], 'status': ["disponivel", "disponivel", "disponivel", "vendido"]}, index=indice)
+
+def centavos(valor):
+    return round(valor, 2) if isinstance(valor, float) else valor
+
+def test_cronograma_do_lote_igual_ao_simulado(catalogo, tmp_path):
+    conjunto, indice = gravar_cronogramas_catalogo(catalogo, DATA_ENTRADA, TAXA, PLANOS, str(tmp_path), percentual_entrada=10, lotes_por_bloco=2)
+    assert len(indice) == 3 * len(PLANOS) # o lote vendido fica de fora
+    indice, colunas = abrir_cronogramas(conjunto)
+    for (quadra, lote), valor_total in catalogo[catalogo['status'] == "disponivel"]['valor_total'].items():
+        esperados = simular_planos(round(valor_total - round(valor_total * 0.1, 2), 2), DATA_ENTRADA, TAXA, PLANOS)
+        for plano, esperado in enumerate(esperados):
+            assert esperado['erro'] is None
+            obtido = cronograma_do_lote(indice, colunas, quadra, lote, plano)
+            assert [{c: centavos(p[c]) for c in CAMPOS} for p in obtido] == [{c: centavos(p[c]) for c in CAMPOS} for p in esperado['cronograma']], (quadra, lote, plano)
+
+def test_cada_gravacao_e_um_conjunto_completo(catalogo, tmp_path):
+    primeiro, _ = gravar_cronogramas_catalogo(catalogo, DATA_ENTRADA, TAXA, PLANOS[:1], str(tmp_path))
+    segundo, _ = gravar_cronogramas_catalogo(catalogo, DATA_ENTRADA, TAXA, PLANOS[1:], str(tmp_path))
+    assert primeiro != segundo and sorted(listar_conjuntos_cronogramas(str(tmp_path))) == sorted([primeiro, segundo])
+    assert not [nome for nome in os.listdir(tmp_path) if nome.startswith(".")] # sem temporários restantes
+    assert len(abrir_cronogramas(primeiro)[0]) == 3 and len(abrir_cronogramas(segundo)[0]) == 6
+    with pytest.raises(ValueError): cronograma_do_lote(*abrir_cronogramas(primeiro), "B", "7")
+
+def test_falha_na_gravacao_nao_deixa_conjunto(catalogo, tmp_path, monkeypatch):
+    def falhar(*args, **kwargs): raise OSError("disco cheio")
+    monkeypatch.setattr(motor, "calcular_cet", falhar)
+    with pytest.raises(OSError): gravar_cronogramas_catalogo(catalogo, DATA_ENTRADA, TAXA, PLANOS, str(tmp_path))
+    assert listar_conjuntos_cronogramas(str(tmp_path)) == [] and not os.listdir(tmp_path)
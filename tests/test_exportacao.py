@@ -0,0 +1,42 @@
+"""
+Fila de exportações: geração em thread e em processo (o pool referencia o módulo exportacao,
+sem reexecutar o app) e registro das tarefas.
+"""
+from datetime import datetime
+
+import pytest
+
+import exportacao
+from exportacao import executar_exportacao, obter_fila_exportacoes, obter_processos_exportacao, status_exportacao
+from motor import simular_planos
+
+@pytest.fixture
+def fila(tmp_path, monkeypatch):
+    monkeypatch.setattr(exportacao, "DIRETORIO_EXPORTACOES", str(tmp_path))
+    obter_fila_exportacoes.clear(); obter_processos_exportacao.clear()
+    yield obter_fila_exportacoes()
+    obter_fila_exportacoes.clear(); obter_processos_exportacao.clear()
+
+def registrar(fila, job_id):
+    _, tarefas, trava = fila
+    with trava: tarefas[job_id] = {'status': 'pendente', 'progresso': 0.0, 'caminho': None, 'mime': "text/html", 'erro': None}
+
+CRONOGRAMA = simular_planos(130000.0, datetime(2024, 1, 15), 0.89, [{'modalidade': "mensal", 'qtd_parcelas': 24}])[0]['cronograma']
+DADOS = {'valor_total': 150000.0, 'entrada': 20000.0, 'valor_financiado': 130000.0, 'taxa_mensal': 0.89, 'quadra': "1", 'lote': "2", 'metragem': "360"}
+
+@pytest.mark.parametrize("em_processo", [False, True])
+def test_exportacao_concluida(fila, em_processo):
+    registrar(fila, "relatorio")
+    processos = obter_processos_exportacao(1) if em_processo else None
+    try: executar_exportacao("relatorio", "html", CRONOGRAMA, DADOS, processos)
+    finally:
+        if processos: processos.shutdown()
+    estado = status_exportacao("relatorio")
+    assert estado['status'] == 'concluido' and estado['progresso'] == 1.0, estado['erro']
+    with open(estado['caminho'], "rb") as f: assert f.read().startswith(b"<!DOCTYPE html>")
+
+def test_erro_do_gerador_fica_na_tarefa(fila):
+    registrar(fila, "sem_valores")
+    executar_exportacao("sem_valores", "pdf", CRONOGRAMA, {'quadra': "1"})
+    estado = status_exportacao("sem_valores")
+    assert estado['status'] == 'erro' and estado['caminho'] is None and estado['erro']
@@ -0,0 +1,41 @@
+"""
+Kernels compilados com o Numba contra as versões NumPy (a referência) em entradas sorteadas:
+os resultados arredondados a centavos (e as contagens de dias) devem coincidir.
+"""
+import os
+
+import numpy as np
+import pytest
+
+import motor
+
+numba = pytest.importorskip("numba")
+COMPILADOS = motor.compilar_kernels()
+sorteio = np.random.default_rng(20240115)
+
+def test_potencias_ficam_no_numpy():
+    # O laço compilado saiu mais lento que np.power em desempenho_kernels.py
+    assert COMPILADOS['potencias'] is motor.KERNELS_NUMPY['potencias']
+
+def test_dias_calendario():
+    for ano, mes, dia, qtd_meses in zip(sorteio.integers(1990, 2060, 300), sorteio.integers(1, 13, 300), sorteio.integers(1, 32, 300), sorteio.integers(0, 420, 300)):
+        dia = min(int(dia), 28 if mes == 2 else 30 if mes in (4, 6, 9, 11) else 31)
+        np.testing.assert_array_equal(COMPILADOS['dias_calendario'](ano, mes, dia, qtd_meses), motor.KERNELS_NUMPY['dias_calendario'](int(ano), int(mes), dia, int(qtd_meses)))
+
+@pytest.mark.parametrize("contratos, parcelas", [(1, 12), (250, 180), (7, 1)])
+def test_saldo(contratos, parcelas):
+    taxas = sorteio.uniform(0, 0.0006, size=(contratos, 1))
+    crescimento = np.power(1 + taxas, np.cumsum(sorteio.integers(28, 32, size=(contratos, parcelas)), axis=1))
+    valores = np.round(sorteio.uniform(500, 5000, size=(contratos, parcelas)), 2)
+    saldo_inicial = np.round(valores.sum(axis=1, keepdims=True) * sorteio.uniform(0.7, 0.95, size=(contratos, 1)), 2)
+    esperado, obtido = motor.KERNELS_NUMPY['saldo'](valores, crescimento, saldo_inicial), COMPILADOS['saldo'](valores, crescimento, saldo_inicial)
+    np.testing.assert_array_equal(np.round(obtido, 2), np.round(esperado, 2))
+
+def test_jit_desligado_por_padrao(monkeypatch):
+    monkeypatch.delenv("SIMULADOR_JIT", raising=False)
+    assert motor.obter_kernels() is motor.KERNELS_NUMPY
+    monkeypatch.setenv("SIMULADOR_JIT", "1")
+    assert motor.obter_kernels() is COMPILADOS
+
+def test_cache_da_compilacao_fora_do_codigo():
+    assert not os.path.abspath(numba.config.CACHE_DIR).startswith(motor.DIRETORIO_APP)
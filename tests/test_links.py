@@ -0,0 +1,53 @@
+"""
+Links de simulação (ver "Links de Simulação" em app.py): o diretório de resultados gravados só
+é escrito quando um link é compartilhado e só é lido quando um link é aberto.
+"""
+import datetime
+import json
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+DIRETORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMPOS = {"valor_total_str": "150.000,00", "entrada_str": "20.000,00", "qtd_parcelas": 120}
+
+@pytest.fixture
+def simulacoes(tmp_path, monkeypatch):
+    monkeypatch.setenv("SIMULADOR_AQUECIMENTO", "0"); monkeypatch.setenv("SIMULACOES_COMPARTILHADAS", str(tmp_path))
+    return tmp_path
+
+def abrir(query_params=None, campos=None):
+    at = AppTest.from_file(os.path.join(DIRETORIO, "app.py"), default_timeout=120)
+    at.query_params.update(query_params or {}); at.run()
+    if campos:
+        at.date_input(key="data_input").set_value(datetime.date(2024, 1, 15))
+        for chave, valor in campos.items(): (at.number_input if chave == "qtd_parcelas" else at.text_input)(key=chave).set_value(valor)
+        at.button[0].click().run()
+    assert not at.exception and not at.error
+    return at
+
+def parcela(at):
+    return next(m.value for m in at.metric if m.label == "Valor da Parcela")
+
+def test_so_grava_ao_compartilhar(simulacoes):
+    at = abrir(campos=CAMPOS)
+    assert not os.listdir(simulacoes) and not at.code
+    at.button(key="compartilhar_simulacao").click().run()
+    assert [nome for nome in os.listdir(simulacoes) if nome.endswith(".json")] and len(at.code) == 1
+    assert not [nome for nome in os.listdir(simulacoes) if nome.endswith(".tmp")]
+
+def test_link_aberto_le_o_gravado(simulacoes):
+    at = abrir(campos=CAMPOS); at.button(key="compartilhar_simulacao").click().run()
+    link, calculada = dict(at.query_params), parcela(at)
+    # Marca o resultado gravado para distinguir o lido do recalculado
+    (arquivo,) = [simulacoes / nome for nome in os.listdir(simulacoes)]
+    resultados = json.loads(arquivo.read_text(encoding="utf-8")); resultados[0]['valor_parcela'] = 1234.56
+    arquivo.write_text(json.dumps(resultados), encoding="utf-8")
+    assert parcela(abrir(link)) == "R$ 1.234,56" != calculada
+    assert parcela(abrir(campos=CAMPOS)) == calculada # o mesmo cálculo pelo formulário não lê o gravado
+
+def test_chave_ignora_identificacao_do_lote(simulacoes):
+    abrir(campos={**CAMPOS, "quadra": "15", "lote": "22"}).button(key="compartilhar_simulacao").click().run()
+    abrir(campos={**CAMPOS, "quadra": "3", "lote": "7"}).button(key="compartilhar_simulacao").click().run()
+    assert len(os.listdir(simulacoes)) == 1
@@ -0,0 +1,171 @@
+"""
+Funções do motor de cálculo (motor.py) conferidas contra contas feitas à mão ou por força
+bruta: comparação de planos, amortização, CET, SAC/misto, quitação e otimização dos balões.
+Correção monetária, conciliação e cronogramas binários têm arquivos próprios.
+"""
+import datetime
+import itertools
+
+import numpy as np
+import pytest
+
+from motor import (
+    calcular_amortizacao, calcular_cet, calcular_taxas, calcular_valor_presente, cet_cronogramas, coeficientes_parcelas, comparar_planos,
+    cotar_quitacao, cotar_quitacao_carteira, cronograma_para_carteira, melhores_conjuntos_baloes, otimizar_baloes, renegociar_saldo,
+    resolver_parcelas_sistema, tabela_comparativa
+)
+
+DATA_ENTRADA = datetime.datetime(2024, 1, 31)
+TAXA = 0.89
+
+def itens(cronograma):
+    return [p for p in cronograma if p['Item'] != 'TOTAL']
+
+# --- Comparação de planos ---
+PLANOS = [{'modalidade': "mensal", 'qtd_parcelas': 120}, {'modalidade': "mensal + balão", 'qtd_parcelas': 120, 'tipo_balao': "anual", 'valor_balao': 10000.0},
+          {'modalidade': "só balão anual", 'qtd_parcelas': 120}, {'modalidade': "mensal SAC", 'qtd_parcelas': 120}, {'modalidade': "mensal", 'qtd_parcelas': 120, 'valor_parcela': 1500.0}]
+
+def test_comparar_planos_igual_a_cada_plano_sozinho():
+    juntos = comparar_planos(130000.0, DATA_ENTRADA, TAXA, PLANOS)
+    assert juntos == [comparar_planos(130000.0, DATA_ENTRADA, TAXA, [plano])[0] for plano in PLANOS]
+    tabela = tabela_comparativa(juntos)
+    assert tabela['Modalidade'].tolist() == [p['modalidade'] for p in PLANOS] and tabela['Balões'].tolist() == [0, 10, 10, 0, 0]
+    assert tabela['Valor Total a Pagar'].tolist()[:4] == [r['cronograma'][-1]['Valor'] for r in juntos[:4]]
+    assert juntos[4]['erro'] is None and tabela['Observação'].tolist() == [""] * 5
+
+def test_agendamento_personalizado_so_vale_para_mensal_com_balao():
+    personalizado = {'agendamento_baloes': "Personalizado (Mês a Mês)", 'meses_baloes': [6, 18, 30], 'mes_primeiro_balao': 6}
+    planos = [{'modalidade': "mensal + balão", 'qtd_parcelas': 120, 'valor_balao': 20000.0, **personalizado}] + [{'modalidade': m, 'qtd_parcelas': 120, **personalizado} for m in ("só balão anual", "mensal")]
+    resultados = comparar_planos(130000.0, DATA_ENTRADA, TAXA, planos)
+    assert [r['qtd_baloes'] for r in resultados] == [len([p for p in itens(r['cronograma']) if p['Tipo'] == "Balão"]) for r in resultados] == [3, 10, 0]
+    assert [r['erro'] for r in resultados] == [None] * 3 and resultados[1:] == comparar_planos(130000.0, DATA_ENTRADA, TAXA, [{'modalidade': m, 'qtd_parcelas': 120} for m in ("só balão anual", "mensal")])
+    for r in resultados: assert abs(r['cronograma'][-1]['Valor_Presente'] - 130000.0) <= 1.0, r['modalidade']
+
+# --- Amortização ---
+def saldo_em_laco(valores, crescimento, saldo_inicial):
+    saldos, saldo, anterior = [], saldo_inicial, 1.0
+    for valor, g in zip(valores, crescimento): saldo = saldo * g / anterior - valor; anterior = g; saldos.append(saldo)
+    return np.array(saldos)
+
+def test_amortizacao_igual_a_recursao():
+    dias = np.array([31, 60, 91, 121, 152, 182], dtype=float); taxa_diaria = calcular_taxas(1.2)['diaria']; crescimento = (1 + taxa_diaria) ** dias
+    parcela = 60000.0 / np.sum(1 / crescimento) # Price sem arredondamento: quita exatamente
+    valores = np.vstack([np.full(6, parcela), np.array([5000.0, 0, 20000, 0, 10000, 1000])])
+    juros, amortizacao, saldo = calcular_amortizacao(valores, np.tile(dias, (2, 1)), np.array([60000.0, 40000.0]), taxa_diaria)
+    for k, inicial in enumerate([60000.0, 40000.0]): np.testing.assert_allclose(saldo[k], saldo_em_laco(valores[k], crescimento, inicial), atol=1e-6)
+    np.testing.assert_allclose(juros + amortizacao, valores); assert abs(saldo[0, -1]) < 1e-6 and amortizacao[0].sum() == pytest.approx(60000.0)
+    juros, amortizacao, _ = calcular_amortizacao(valores[1], dias, 40000.0, 0.0)
+    assert not juros.any() and (amortizacao == valores[1]).all()
+
+def test_cronograma_quita_o_financiado():
+    for plano in PLANOS[:4]:
+        cronograma = comparar_planos(130000.0, DATA_ENTRADA, TAXA, [plano])[0]['cronograma']
+        ultimo = itens(cronograma)[-1]
+        assert abs(ultimo['Saldo_Devedor']) <= 5.0 and abs(cronograma[-1]['Amortizacao'] - 130000.0) <= 5.0, plano # resíduo só do arredondamento a centavos
+        assert all(round(p['Juros_Periodo'] + p['Amortizacao'], 2) == p['Valor'] for p in itens(cronograma))
+
+# --- CET ---
+def test_cet_de_pagamento_unico():
+    anual, mensal = calcular_cet(np.array([[1100.0, 0.0], [0.0, 0.0]]), np.array([[365.0, 0.0], [0.0, 0.0]]), np.array([1000.0, 1000.0]))
+    assert anual[0] == pytest.approx(10.0) and mensal[0] == pytest.approx((1.1 ** (1 / 12) - 1) * 100) and np.isnan(anual[1])
+
+def test_cet_desconta_o_fluxo_ate_o_financiado():
+    resultado = comparar_planos(130000.0, DATA_ENTRADA, TAXA, [PLANOS[0]])[0]; lista = itens(resultado['cronograma'])
+    anual, _ = cet_cronogramas([resultado['cronograma']], np.array([130000.0]))
+    presente = sum(p['Valor'] / (1 + anual[0] / 100) ** (p['Dias'] / 365) for p in lista)
+    assert presente == pytest.approx(130000.0, abs=0.01) and round(anual[0], 4) == resultado['cet_anual']
+    assert resultado['cet_anual'] > ((1 + TAXA / 100) ** 12 - 1) * 100 - 0.01 # sem tarifas, o CET é a própria taxa anualizada
+
+# --- SAC e misto ---
+@pytest.mark.parametrize("sistema", ["price", "sac", "misto"])
+def test_coeficientes_tem_valor_presente_unitario(sistema):
+    crescimento = (1 + calcular_taxas(TAXA)['diaria']) ** np.cumsum(np.full(24, 30.4375))
+    coeficientes = coeficientes_parcelas(crescimento, 24, sistema)
+    assert np.sum(coeficientes / crescimento) == pytest.approx(1.0)
+    if sistema == "sac":
+        assert (np.diff(coeficientes) < 0).all()
+        _, amortizacao, _ = calcular_amortizacao(coeficientes, None, 1.0, None, crescimento)
+        np.testing.assert_allclose(amortizacao, 1 / 24)
+
+def test_sac_sem_juros_e_valor_informado():
+    parcelas = resolver_parcelas_sistema(np.array([1000.0, 100.01]), np.full(3, 1 / 3))
+    assert parcelas.tolist() == [[333.33, 333.33, 333.34], [33.34, 33.34, 33.33]]
+    assert resolver_parcelas_sistema(100.01, np.full(3, 1 / 3), ajuste_arredondamento="primeira").tolist() == [33.33, 33.34, 33.34]
+    with pytest.raises(ValueError, match="SAC"): resolver_parcelas_sistema(1000.0, np.full(3, 1 / 3), valor_parcela=10.0)
+
+def test_sac_na_comparacao():
+    sac, misto, price = comparar_planos(130000.0, DATA_ENTRADA, TAXA, [{'modalidade': m, 'qtd_parcelas': 120} for m in ("mensal SAC", "mensal misto (SAC/Price)", "mensal")])
+    assert sac['valor_parcela'] > misto['valor_parcela'] > price['valor_parcela'] and sac['valor_ultima_parcela'] < misto['valor_ultima_parcela'] < price['valor_ultima_parcela']
+    assert sac['cronograma'][-1]['Valor'] < misto['cronograma'][-1]['Valor'] < price['cronograma'][-1]['Valor'] # amortiza antes, paga menos juros
+    assert all(abs(p['Amortizacao'] - 130000.0 / 120) <= 0.01 for p in itens(sac['cronograma'])) # SAC: amortização constante
+
+def test_sac_curto_sem_juros_como_price():
+    planos = [{'modalidade': m, 'qtd_parcelas': 24} for m in ("mensal SAC", "mensal misto (SAC/Price)", "mensal")]
+    for r in comparar_planos(130000.0, DATA_ENTRADA, TAXA, planos):
+        assert r['taxa_mensal'] == 0.0 and r['cronograma'][-1]['Valor'] == 130000.0 and r['cet_anual'] == 0.0, r['modalidade']
+        assert [p['Valor'] for p in itens(r['cronograma'])] == [5416.67] * 23 + [5416.59]
+    assert comparar_planos(130000.0, DATA_ENTRADA, TAXA, [{'modalidade': "mensal SAC", 'qtd_parcelas': 37}])[0]['taxa_mensal'] == TAXA
+
+# --- Quitação ---
+def test_quitacao_traz_os_abertos_a_valor_presente():
+    cronograma = comparar_planos(130000.0, DATA_ENTRADA, TAXA, [PLANOS[1]])[0]['cronograma']
+    data_cotacao = datetime.datetime(2026, 3, 10)
+    abertos = [p for p in itens(cronograma) if datetime.datetime.strptime(p['Data_Vencimento'], '%d/%m/%Y') >= data_cotacao]
+    taxa_diaria = calcular_taxas(TAXA)['diaria']
+    esperado = round(sum(calcular_valor_presente(p['Valor'], taxa_diaria, (datetime.datetime.strptime(p['Data_Vencimento'], '%d/%m/%Y') - data_cotacao).days) for p in abertos), 2)
+    cotacao = cotar_quitacao(cronograma, data_cotacao, TAXA)
+    assert (cotacao['itens_restantes'], cotacao['valor_nominal'], cotacao['valor_quitacao']) == (len(abertos), round(sum(p['Valor'] for p in abertos), 2), esperado)
+    assert cotacao['desconto'] == round(cotacao['valor_nominal'] - cotacao['valor_quitacao'], 2) > 0
+    assert cotar_quitacao(cronograma, data_cotacao, 0.0)['desconto'] == 0.0
+    assert cotar_quitacao(cronograma, datetime.datetime(2040, 1, 1), TAXA) == {'itens_restantes': 0, 'valor_nominal': 0.0, 'valor_quitacao': 0.0, 'desconto': 0.0}
+
+def test_quitacao_da_carteira_igual_a_de_cada_contrato():
+    import pandas as pd
+    cronogramas = {f"Q{k}/L{k}": comparar_planos(valor, DATA_ENTRADA, TAXA, [plano])[0]['cronograma'] for k, (valor, plano) in enumerate(zip([130000.0, 87500.5, 240000.0], PLANOS[:3]))}
+    carteira = pd.concat([cronograma_para_carteira(c, contrato, TAXA) for contrato, c in cronogramas.items()], ignore_index=True)
+    resumo = cotar_quitacao_carteira(carteira, datetime.datetime(2027, 7, 1))
+    for contrato, cronograma in cronogramas.items():
+        assert resumo.loc[contrato, 'Valor_Quitacao'] == cotar_quitacao(cronograma, datetime.datetime(2027, 7, 1), TAXA)['valor_quitacao']
+
+def test_renegociacao_reparcela_o_valor_de_quitacao():
+    cronograma = comparar_planos(130000.0, DATA_ENTRADA, TAXA, [PLANOS[0]])[0]['cronograma']
+    cotacao, resultado = renegociar_saldo(cronograma, datetime.datetime(2028, 2, 15), TAXA, 36)
+    assert resultado['erro'] is None and resultado['qtd_parcelas'] == 36
+    assert abs(resultado['cronograma'][-1]['Amortizacao'] - cotacao['valor_quitacao']) <= 1.0
+    assert renegociar_saldo(cronograma, datetime.datetime(2040, 1, 1), TAXA, 36) == (cotar_quitacao(cronograma, datetime.datetime(2040, 1, 1), TAXA), None)
+
+# --- Otimização dos balões ---
+def forca_bruta(fatores, candidatos, intervalo, k):
+    validos = [c for c in itertools.combinations(candidatos, k) if all(b - a >= intervalo for a, b in zip(c, c[1:]))]
+    return max((sum(fatores[m - 1] for m in c), list(c)) for c in validos) if validos else None
+
+@pytest.mark.parametrize("intervalo", [1, 2, 4])
+def test_melhores_conjuntos_iguais_a_forca_bruta(intervalo):
+    sorteio = np.random.default_rng(intervalo); fatores = sorteio.uniform(0.5, 1.0, 14); candidatos = [1, 2, 3, 5, 6, 9, 10, 11, 13, 14]
+    somas, conjuntos = melhores_conjuntos_baloes(fatores, candidatos, intervalo)
+    for k, (soma, conjunto) in enumerate(zip(somas, conjuntos), start=1):
+        esperado = forca_bruta(fatores, candidatos, intervalo, k)
+        assert soma == pytest.approx(esperado[0]) and sum(fatores[m - 1] for m in conjunto) == pytest.approx(soma)
+        assert all(b - a >= intervalo for a, b in zip(conjunto, conjunto[1:]))
+    assert forca_bruta(fatores, candidatos, intervalo, len(somas) + 1) is None # parou quando não cabia mais balão
+
+def test_otimizar_baloes_respeita_restricoes_e_bate_com_o_plano():
+    resultado = otimizar_baloes(130000.0, DATA_ENTRADA, TAXA, 36, 15000.0, meses_do_ano=[6, 12], intervalo_minimo=5, qtd_maxima_baloes=4)
+    meses = resultado['meses_baloes']
+    assert 1 <= resultado['qtd_baloes'] == len(meses) <= 4 and all(b - a >= 5 for a, b in zip(meses, meses[1:])) and resultado['valor_balao'] == 15000.0
+    plano = {'modalidade': "mensal + balão", 'qtd_parcelas': 36, 'agendamento_baloes': "Personalizado (Mês a Mês)", 'meses_baloes': meses, 'valor_balao': resultado['valor_balao']}
+    simulado = comparar_planos(130000.0, DATA_ENTRADA, TAXA, [plano])[0]
+    assert simulado['valor_parcela'] == resultado['valor_parcela']
+    assert all(datetime.datetime.strptime(p['Data_Vencimento'], '%d/%m/%Y').month in (6, 12) for p in itens(simulado['cronograma']) if p['Tipo'] == "Balão")
+    # Nenhum outro conjunto permitido de junhos e dezembros dá parcela menor
+    permitidos = [m for m in range(1, 37) if (DATA_ENTRADA.month + m - 1) % 12 + 1 in (6, 12)]
+    for k in range(1, 5):
+        for conjunto in itertools.combinations(permitidos, k):
+            if all(b - a >= 5 for a, b in zip(conjunto, conjunto[1:])):
+                alternativa = comparar_planos(130000.0, DATA_ENTRADA, TAXA, [{**plano, 'meses_baloes': list(conjunto)}])[0]
+                assert alternativa['valor_parcela'] >= resultado['valor_parcela']
+
+def test_otimizar_baloes_erros():
+    with pytest.raises(ValueError, match="parcelas"): otimizar_baloes(130000.0, DATA_ENTRADA, TAXA, 0, 15000.0)
+    with pytest.raises(ValueError, match="máximo"): otimizar_baloes(130000.0, DATA_ENTRADA, TAXA, 36, 0)
+    with pytest.raises(ValueError, match="restrições"): otimizar_baloes(130000.0, DATA_ENTRADA, TAXA, 3, 15000.0, meses_do_ano=[12])
@@ -0,0 +1,110 @@
+"""
+Saídas dos dois apps (app.py e app2.py) comparadas com as da versão original, antes da
+extração do motor de cálculo: cada caso preenche o formulário, clica em Calcular e confere
+mensagens de erro, métricas e o cronograma exibido, célula a célula, com o que está gravado
+em tests/dados/saidas_app*.json.
+
+As saídas de referência foram gravadas a partir do commit original (2fd150a):
+    git show 2fd150a:app.py > /tmp/original/app.py; git show 2fd150a:app2.py > /tmp/original/app2.py
+    cp "JMD HAMOA HORIZONTAL - BRANCO.png" /tmp/original/
+    python tests/test_saidas.py /tmp/original
+Colunas e métricas novas (saldo devedor, CET, quitação...) não entram na comparação; as
+renomeadas são levadas ao nome original por RENOMEADAS.
+"""
+import datetime
+import json
+import os
+import sys
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from motor import calcular_meses_baloes, simular_planos
+
+DIRETORIO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DADOS = os.path.join(DIRETORIO, "tests", "dados")
+DATA_ENTRADA = datetime.date(2024, 1, 15)
+
+BASE = {"valor_total_str": "150.000,00", "entrada_str": "20.000,00"}
+CASOS_APP = {
+    "mensal_120": {**BASE, "qtd_parcelas": 120, "modalidade": "mensal"},
+    "mensal_180_taxa": {"valor_total_str": "320.500,50", "entrada_str": "32.050,05", "taxa_mensal_str": "1,15", "qtd_parcelas": 180, "modalidade": "mensal"},
+    "mensal_parcela_informada": {**BASE, "qtd_parcelas": 60, "modalidade": "mensal", "valor_parcela_str": "2.500,00"},
+    "balao_anual_parcela": {**BASE, "qtd_parcelas": 24, "modalidade": "mensal + balão", "tipo_balao": "anual", "valor_parcela_str": "3.000,00"},
+    "balao_semestral_balao": {**BASE, "qtd_parcelas": 60, "modalidade": "mensal + balão", "tipo_balao": "semestral", "valor_balao_str": "8.000,00"},
+    "balao_anual_sem_valores": {**BASE, "qtd_parcelas": 120, "modalidade": "mensal + balão", "tipo_balao": "anual"},
+    "balao_a_partir_do_1o": {**BASE, "qtd_parcelas": 48, "modalidade": "mensal + balão", "tipo_balao": "anual", "agendamento_baloes": "A partir do 1º Vencimento", "mes_primeiro_balao": 3, "valor_parcela_str": "1.500,00"},
+    "balao_personalizado": {**BASE, "qtd_parcelas": 36, "modalidade": "mensal + balão", "agendamento_baloes": "Personalizado (Mês a Mês)", "meses_baloes": [6, 18, 30], "valor_balao_str": "10.000,00"},
+    "so_balao_anual": {**BASE, "qtd_parcelas": 120, "modalidade": "só balão anual"},
+    "so_balao_semestral": {**BASE, "qtd_parcelas": 60, "modalidade": "só balão semestral"},
+    "entrada_invalida": {"valor_total_str": "100.000,00", "entrada_str": "100.000,00", "qtd_parcelas": 60, "modalidade": "mensal"},
+}
+CASOS_APP2 = {
+    "mensal_120": {"valor_total": 150000.0, "entrada": 20000.0, "qtd_parcelas": 120, "modalidade": "mensal"},
+    "mensal_180": {"valor_total": 320500.5, "entrada": 32050.05, "qtd_parcelas": 180, "modalidade": "mensal"},
+    "balao_anual_parcela": {"valor_total": 150000.0, "entrada": 20000.0, "qtd_parcelas": 60, "modalidade": "mensal + balão", "tipo_balao": "anual", "valor_parcela": 1500.0},
+    "balao_semestral_balao": {"valor_total": 150000.0, "entrada": 20000.0, "qtd_parcelas": 36, "modalidade": "mensal + balão", "tipo_balao": "semestral", "valor_balao": 12000.0},
+    "balao_sem_valores": {"valor_total": 150000.0, "entrada": 20000.0, "qtd_parcelas": 60, "modalidade": "mensal + balão"},
+    "so_balao_anual": {"valor_total": 150000.0, "entrada": 20000.0, "qtd_parcelas": 60, "modalidade": "só balão anual"},
+    "so_balao_semestral": {"valor_total": 150000.0, "entrada": 20000.0, "qtd_parcelas": 36, "modalidade": "só balão semestral"},
+}
+APPS = {"app.py": ("saidas_app.json", CASOS_APP), "app2.py": ("saidas_app2.json", CASOS_APP2)}
+# Nome atual -> nome original das colunas do cronograma
+RENOMEADAS = {"Data Venc.": "Data_Vencimento", "Valor Presente": "Valor_Presente"}
+
+def widget(at, chave):
+    for lista in (at.text_input, at.number_input, at.selectbox, at.multiselect, at.date_input):
+        for w in lista:
+            if w.key == chave: return w
+    return None
+
+def executar_caso(caminho, campos):
+    """
+    Preenche o formulário e clica em Calcular. Campos que só aparecem depois de um envio
+    (tipo e agendamento dos balões) são preenchidos nos envios seguintes, como na tela.
+    Retorna {'erros', 'metricas', 'cronograma'} com os textos exibidos.
+    """
+    at = AppTest.from_file(caminho, default_timeout=120).run()
+    at.date_input(key="data_input").set_value(DATA_ENTRADA)
+    pendentes = dict(campos)
+    while pendentes:
+        disponiveis = {chave: valor for chave, valor in pendentes.items() if widget(at, chave) is not None}
+        assert disponiveis, f"campos sem widget: {sorted(pendentes)}"
+        for chave, valor in disponiveis.items(): widget(at, chave).set_value(valor); del pendentes[chave]
+        at.button[0].click().run()
+        assert not at.exception, at.exception[0].value
+    cronograma = at.dataframe[0].value.rename(columns=RENOMEADAS) if len(at.dataframe) else None
+    return {'erros': [e.value for e in at.error], 'metricas': {m.label: m.value for m in at.metric},
+            'cronograma': cronograma.astype(str).to_dict('list') if cronograma is not None else None}
+
+@pytest.fixture(autouse=True)
+def sem_aquecimento(monkeypatch):
+    monkeypatch.setenv("SIMULADOR_AQUECIMENTO", "0")
+
+@pytest.mark.parametrize("app, caso", [(app, caso) for app, (_, casos) in APPS.items() for caso in casos])
+def test_saida_igual_a_original(app, caso):
+    arquivo, casos = APPS[app]
+    with open(os.path.join(DADOS, arquivo), encoding="utf-8") as f: esperado = json.load(f)[caso]
+    obtido = executar_caso(os.path.join(DIRETORIO, app), casos[caso])
+    assert obtido['erros'] == esperado['erros']
+    assert {rotulo: obtido['metricas'].get(rotulo) for rotulo in esperado['metricas']} == esperado['metricas']
+    if esperado['cronograma'] is None: assert obtido['cronograma'] is None; return
+    assert {coluna: obtido['cronograma'].get(coluna) for coluna in esperado['cronograma']} == esperado['cronograma']
+
+def test_a_partir_do_1o_vencimento_sem_baloes():
+    """
+    Diferença intencional em relação à versão original, que incluía um "Balão 1" em "A partir
+    do 1º Vencimento" mesmo sem balões (a tela não chega a esse caso: o mês do 1º balão não
+    cabe no prazo, então ele fica fora dos casos gravados).
+    """
+    assert calcular_meses_baloes("mensal + balão", 6, 0, "anual", "A partir do 1º Vencimento", None, 3) == []
+    plano = {'modalidade': "mensal + balão", 'qtd_parcelas': 6, 'tipo_balao': "anual", 'agendamento_baloes': "A partir do 1º Vencimento", 'mes_primeiro_balao': 3, 'valor_parcela': 20000.0}
+    resultado = simular_planos(130000.0, datetime.datetime(2024, 1, 15), 0.89, [plano])[0]
+    assert resultado['erro'] is None and resultado['qtd_baloes'] == 0
+    assert [p['Item'] for p in resultado['cronograma']] == [f"Parcela {i}" for i in range(1, 7)] + ["TOTAL"]
+
+if __name__ == "__main__":
+    origem = sys.argv[1] # diretório com o app.py e o app2.py originais
+    for app, (arquivo, casos) in APPS.items():
+        saidas = {caso: executar_caso(os.path.join(origem, app), campos) for caso, campos in casos.items()}
+        with open(os.path.join(DADOS, arquivo), "w", encoding="utf-8") as f: json.dump(saidas, f, ensure_ascii=False, indent=1)